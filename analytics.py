@@ -0,0 +1,190 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATASET_DIR, day_path, days, read_day
+from drift import zone_for_column
+from dwell import CAPTURE_HOURS
+
+# The per-day aggregates we've already computed, per market. A day is only recomputed when its file grows.
+ANALYTICS_CACHE_DIR = os.environ.get(
+    "ANALYTICS_CACHE_DIR", os.path.join("store", "analytics")
+)
+
+BREAKING_ZONES = ("breaking", "just_in")
+
+
+def day_aggregates(records):
+    """
+    This function computes the partial aggregates of a day of captures, which add up across days.
+    Every slot gets its number of filled captures, how many times a new story took it (run starts),
+    how many times it changed between captures, and its first and last URL (to stitch days together).
+    """
+    urls = pd.DataFrame([record["urls"] for record in records])
+    values = urls.fillna("").to_numpy(dtype=object)
+    filled = values != ""
+    changed = values[1:] != values[:-1]
+    starts = filled.copy()
+    starts[1:] &= changed
+
+    hours = pd.to_datetime(
+        pd.Series([record["time"] for record in records]), format="%I:%M %p"
+    ).dt.hour.to_numpy()
+    breaking = np.array([zone_for_column(slot) in BREAKING_ZONES for slot in urls.columns])
+
+    return {
+        "captures": len(records),
+        "slots": {
+            slot: {
+                "filled": int(filled[:, i].sum()),
+                "starts": int(starts[:, i].sum()),
+                "changes": int(changed[:, i].sum()),
+                "pairs": len(records) - 1,
+                "first": values[0, i],
+                "last": values[-1, i],
+            }
+            for i, slot in enumerate(urls.columns)
+        },
+        # Changes between captures by the hour of day (in the market's timezone) they happened in.
+        "changes_by_hour": np.bincount(
+            hours[1:], weights=changed.sum(axis=1), minlength=24
+        ).tolist(),
+        "slot_pairs_by_hour": (
+            np.bincount(hours[1:], minlength=24) * len(urls.columns)
+        ).tolist(),
+        "breaking_filled": int(filled[:, breaking].sum()),
+        "all_filled": int(filled.sum()),
+        "breaking_captures": int(filled[:, breaking].any(axis=1).sum()),
+    }
+
+
+def _load_cache(market_slug, cache_dir):
+    path = os.path.join(cache_dir, f"{market_slug}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_cache(market_slug, cache, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{market_slug}.json"), "w") as f:
+        json.dump(cache, f)
+
+
+def market_aggregates(
+    market_slug,
+    since=None,
+    until=None,
+    dataset_dir=DATASET_DIR,
+    cache_dir=ANALYTICS_CACHE_DIR,
+):
+    """
+    This function returns a market's per-day aggregates, oldest first. Days we've already computed
+    come from the cache, so a re-run only reads the days that are new (or grew) since the last one.
+    """
+    cache = _load_cache(market_slug, cache_dir)
+    aggregates, computed = [], 0
+    for day in days(market_slug, dataset_dir):
+        if (since and day < since) or (until and day >= until):
+            continue
+        size = os.path.getsize(day_path(market_slug, day, dataset_dir))
+        if cache.get(day, {}).get("size") != size:
+            records = read_day(market_slug, day, dataset_dir)
+            if not records:
+                continue
+            cache[day] = {"size": size, "aggregates": day_aggregates(records)}
+            computed += 1
+        aggregates.append(cache[day]["aggregates"])
+    if computed:
+        _save_cache(market_slug, cache, cache_dir)
+    return aggregates, computed
+
+
+def combine(aggregates):
+    """
+    This function adds up per-day aggregates into a market's metrics. A story that stays in a slot
+    past midnight is one run, not two.
+    """
+    slots = {}
+    changes_by_hour = np.zeros(24)
+    slot_pairs_by_hour = np.zeros(24)
+    breaking_filled = all_filled = breaking_captures = captures = 0
+
+    for day in aggregates:
+        for slot, today in day["slots"].items():
+            total = slots.setdefault(
+                slot, {"filled": 0, "starts": 0, "changes": 0, "pairs": 0, "last": None}
+            )
+            if total["last"] is not None:
+                total["pairs"] += 1
+                if total["last"] != today["first"]:
+                    total["changes"] += 1
+                elif today["first"]:
+                    total["starts"] -= 1
+            for key in ("filled", "starts", "changes", "pairs"):
+                total[key] += today[key]
+            total["last"] = today["last"]
+        changes_by_hour += day["changes_by_hour"]
+        slot_pairs_by_hour += day["slot_pairs_by_hour"]
+        breaking_filled += day["breaking_filled"]
+        all_filled += day["all_filled"]
+        breaking_captures += day["breaking_captures"]
+        captures += day["captures"]
+
+    slot_metrics = pd.DataFrame(
+        {
+            slot: {
+                "captures": total["filled"],
+                "average_dwell_hours": total["filled"] * CAPTURE_HOURS / total["starts"]
+                if total["starts"]
+                else np.nan,
+                "turnover_per_hour": total["changes"] / total["pairs"] / CAPTURE_HOURS
+                if total["pairs"]
+                else np.nan,
+            }
+            for slot, total in slots.items()
+        }
+    ).T
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        churn_by_hour = pd.Series(changes_by_hour / slot_pairs_by_hour, name="churn")
+
+    return {
+        "captures": captures,
+        "slots": slot_metrics,
+        "churn_by_hour": churn_by_hour,
+        "breaking_share": breaking_filled / all_filled if all_filled else np.nan,
+        "breaking_capture_share": breaking_captures / captures if captures else np.nan,
+    }
+
+
+def print_report(
+    markets, since=None, until=None, dataset_dir=DATASET_DIR, cache_dir=ANALYTICS_CACHE_DIR
+):
+    """
+    This function prints the churn and turnover report of every market.
+    """
+    for market in markets.values():
+        aggregates, computed = market_aggregates(
+            market["slug"], since, until, dataset_dir, cache_dir
+        )
+        if not aggregates:
+            print(f"🤷 No captures for {market['name']} yet")
+            continue
+        metrics = combine(aggregates)
+        print(
+            f"\n🏙️ {market['name']}: {metrics['captures']} captures over "
+            f"{len(aggregates)} days ({computed} new)"
+        )
+        print(metrics["slots"].round(2).to_string())
+        print(
+            f"📰 Breaking news held {metrics['breaking_share']:.1%} of the filled slots, "
+            f"and was up in {metrics['breaking_capture_share']:.1%} of captures"
+        )
+        churn = metrics["churn_by_hour"].dropna()
+        if len(churn):
+            print("🔄 Share of slots changing hands, by hour of day:")
+            print("   " + "  ".join(f"{hour:02d}h {value:.0%}" for hour, value in churn.items()))
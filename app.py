@@ -1,7 +1,13 @@
+import argparse
+import heapq
 import os
 import re
+import shutil
+import socket
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
 
 import gspread
 import pandas as pd
@@ -10,2120 +16,990 @@ import requests
 from bs4 import BeautifulSoup
 from gspread_dataframe import set_with_dataframe
 
-# We create a dictionary of the markets we want to track.
-markets = {
-    "San Antonio": {
-        "url": "https://www.expressnews.com",
-        "timezone": "US/Central",
-        "spreadsheet": "https://docs.google.com/spreadsheets/d/1F073i7iMDEU0q2B8K3nG881YDr-f1bCXzc2h24V_dOs/edit?usp=sharing",
-    },
-    "Houston": {
-        "url": "https://www.houstonchronicle.com",
-        "timezone": "US/Central",
-        "spreadsheet": "https://docs.google.com/spreadsheets/d/19IZkVDucvXYT2EyHQ-8Yu2MSrknYK3Co_HI3TAd_hBA/edit#gid=0",
-    },
-    "San Francisco": {
-        "url": "https://www.sfchronicle.com",
-        "timezone": "US/Pacific",
-        "spreadsheet": "https://docs.google.com/spreadsheets/d/1YhvmHOeT5RQLmoef6zZhWfwLD87JIAFiGqzS_llbTu8/edit#gid=0",
-    },
-    "Albany": {
-        "url": "https://www.timesunion.com",
-        "timezone": "US/Eastern",
-        "spreadsheet": "https://docs.google.com/spreadsheets/d/1NREkjXsMslgsl_8XaS-9W_3t3gU67jfmptoN9-9yt1k/edit#gid=1676782739",
-    },
-    "Connecticut Insider": {
-        "url": "https://www.ctinsider.com",
-        "timezone": "US/Eastern",
-        "spreadsheet": "https://docs.google.com/spreadsheets/d/10V626AzMp1NXaW4wOnUq_VArl79XpCdbJQkbIk9esGA/edit#gid=964675505",
-    },
-    "Connecticut Post": {
-        "url": "https://www.ctpost.com",
-        "timezone": "US/Eastern",
-        "spreadsheet": "https://docs.google.com/spreadsheets/d/1wMvD70EZO27TyzFY80cOxZPdFTCSqnB4YMarwuf-1vI/edit#gid=0",
-    },
-}
+import analytics
+import deadlines
+import store
+from archive import ARCHIVE_DIR, append_snapshot, compact, snapshot_table, write_compacted
+from clusters import print_cluster, update_clusters
+from collections_index import print_collection_spans, update_collection_spans
+from dataset import append_capture, captures
+from deadlines import Deadline, DeadlineExceeded
+from diffs import record_changes, save_snapshot
+from drift import check_drift, zone_for_column
+from dwell import print_dwell, update_dwell
+from enrich import ArticleEnricher
+from feeds import collect_feeds, discover_feeds, save_discovered_feeds
+from metrics import METRICS_TEXTFILE, write_metrics
+from migrate import PAGE_ROWS, export_archive, migrate
+from occupancy import print_occupancy, update_occupancy
+from profiling import Profiler
+from ratelimit import RateLimiter
+from registry import load_markets, load_rate_limits, select_shard, slot_names
+from rollups import print_rollups, update_rollups
+from search import index_headlines, print_search
+from snapshot import Snapshot
+from streaming import ZoneWatcher
+from syndication import print_syndication, update_syndication
+from synthetic import SyntheticServer, synthetic_registry, write_registry
+from telemetry import report
+from urls import canonicalize_all
+
+# We load the markets we want to track, and the layout templates they share, from markets.json.
+markets = load_markets()
+
+# Every host we talk to (the homepages and the Sheets API) gets its own requests per minute and concurrency.
+rate_limiter = RateLimiter(load_rate_limits())
+
+# How long we give a homepage to connect and to send each chunk, in seconds. Both are cut short by the market's deadline.
+FETCH_TIMEOUT = (10, 30)
 
 # We grab our service account from a Github secret
 SERVICE_ACCOUNT = os.environ.get("SERVICE_ACCOUNT")
 ACCESS_TOKEN = os.environ.get("ACCESS_TOKEN")
 
-# Create a temporary json file based on the SERVICE_ACCOUNT env variable
-with open("service_account.json", "w") as f:
-    f.write(SERVICE_ACCOUNT)
+# The gspread client. We authenticate when the run starts, in main().
+gc = None
 
-# We authenticate with Google using the service account json we created earlier.
-gc = gspread.service_account(filename="service_account.json")
 
+class RateLimitedClient(gspread.Client):
+    """
+    This class is a gspread client that waits for the Sheets API's rate limiter before every request.
+    A single gspread call can be several requests (set_with_dataframe gets the sheet, resizes it and
+    updates its cells), so we limit the requests rather than the calls.
+    """
 
-def remove_duplicate_prefix(url, prefix):
-    if url.startswith(prefix * 2):
-        url = url.replace(prefix, "", 1)
-    return url
+    def request(self, *args, **kwargs):
+        report.count("api_calls")
+        with rate_limiter.limit("sheets.googleapis.com") as waited:
+            record_rate_limit_wait("sheets.googleapis.com", waited)
+            return super().request(*args, **kwargs)
 
 
 # This handy dandy function will retry the api call if it fails.
 def api_call_handler(func):
     # Number of retries
     for i in range(0, 6):
+        # We don't start (or retry) a call once the market is out of time.
+        deadlines.current().check("calling the Sheets API")
         try:
             return func()
+        except DeadlineExceeded:
+            raise
         except Exception as e:
+            report.count("api_errors")
             print(f"🤦‍♂️ {e}")
             print(f"🤷‍♂️ Retrying in {2 ** i} seconds...")
-            time.sleep(2**i)
+            report.count("retries")
+            remaining = deadlines.current().remaining()
+            time.sleep(2**i if remaining is None else min(2**i, remaining))
     print("🤬 Giving up...")
     raise SystemError
 
 
-def getSoup(url):
+def record_rate_limit_wait(host, waited):
+    """
+    This function records how long the rate limiter held a request back, if it did.
+    """
+    if waited:
+        report.record("rate_limit_wait", seconds=round(waited, 6), host=host)
+
+
+def getSoup(url, zones=None):
     """
     This function takes a URL and returns a BeautifulSoup object.
+    If it's given the zones we track, it stops downloading the page as soon as all of them are in.
     """
     headers = {
         "x-px-access-token": ACCESS_TOKEN,
     }
-    page = requests.get(url, headers=headers)
-    soup = BeautifulSoup(page.content, "html.parser")
+    deadline = deadlines.current()
+    deadline.check(f"fetching {url}")
+
+    # We wait for our turn with the host, so we never go over its limits however many markets we fetch at once.
+    with rate_limiter.limit(url) as waited:
+        record_rate_limit_wait(urlsplit(url).hostname, waited)
+
+        # We time the DNS lookup on its own so a slow resolver doesn't look like a slow site.
+        with report.stage("dns"):
+            socket.getaddrinfo(urlsplit(url).hostname, 443)
+
+        # The time to first byte covers connecting and waiting on the server. The download is the rest.
+        with report.stage("fetch", url=url) as stage:
+            start = time.perf_counter()
+            page = requests.get(
+                url, headers=headers, stream=True, timeout=deadline.timeout(FETCH_TIMEOUT)
+            )
+            stage["ttfb"] = round(time.perf_counter() - start, 6)
+
+            # When we stream, the page is parsed as it comes in. Requests assumes ISO-8859-1 when
+            # the server doesn't name a charset, but the homepages are UTF-8.
+            watcher = None
+            if zones:
+                encoding = page.encoding
+                if not encoding or encoding.upper() == "ISO-8859-1":
+                    encoding = "utf-8"
+                watcher = ZoneWatcher(zones, encoding)
+
+            # We read the page in chunks so a homepage that trickles in can't run past the deadline.
+            chunks = []
+            for chunk in page.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                deadline.check(f"downloading all of {url}")
+                if watcher and watcher.feed_chunk(chunk):
+                    # Everything we track is in, so we hang up on the rest of the page.
+                    page.close()
+                    break
+            content = b"".join(chunks)
+            stage["download"] = round(time.perf_counter() - start - stage["ttfb"], 6)
+            stage["bytes"] = len(content)
+            stage["status"] = page.status_code
+            if watcher:
+                stage["stopped_early"] = watcher.done
+
+    with report.stage("parse"):
+        soup = BeautifulSoup(watcher.text() if watcher else content, "html.parser")
     return soup
 
 
-def get_san_antonio_headlines():
+def zone_matches(zone, elements):
     """
-    This function scrapes the San Antonio Express-News homepage
+    This function records how many elements a zone's selector matched and hands them back,
+    so we can spot a layout change before it breaks the scraper.
     """
-    print("📰 Scraping San Antonio Express-News...")
+    report.record("zone", zone=zone, matched=len(elements))
+    return elements
 
-    market_url = "https://www.expressnews.com"
-    wcm_url = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
 
-    # Get the HTML content of the homepage
-    soup = getSoup(market_url)
+def record_extraction(snapshot):
+    """
+    This function records how many slots of each zone we actually got a headline for.
+    """
+    extracted = {}
+    for slot, headline in zip(snapshot.slots, snapshot.headlines):
+        zone = zone_for_column(slot)
+        if zone:
+            extracted[zone] = extracted.get(zone, 0) + (headline is not None)
+    for zone, count in extracted.items():
+        report.record("zone", zone=zone, extracted=count)
 
-    ## --- CENTERPIECE HEADLINES --- ##
 
-    # Find all the divs with a class of "centerpiece-tab--main-headline"
-    cp_headlines = soup.find_all("div", class_="centerpiece-tab--main-headline")
+def get_collection_id(element):
+    """
+    This function gets the string of digits in a div's collection class, which is the collection's WCM ID.
+    Example input: class="hide-rss-link hdnce-e hdnce-collection-105803-dynamic_centerpiece_tab"
+    Example output: 105803
+    """
+    for class_name in element.get("class", []):
+        match = re.match(r"hdnce-collection-(\d+)-", class_name)
+        if match:
+            return int(match.group(1))
+    return 0
 
-    # We extract the text from the headlines and strip the whitespace.
-    cp_headline = cp_headlines[0].text.strip()
-    tab2_headline = cp_headlines[1].text.strip()
-    tab3_headline = cp_headlines[2].text.strip()
-    tab4_headline = cp_headlines[3].text.strip()
-    tab5_headline = cp_headlines[4].text.strip()
-    tab6_headline = cp_headlines[5].text.strip()
 
-    # We extract the URLs from the headlines and strip the whitespace. The href is in the a tag, so we need to use a for loop to extract the URLs.
-    cp_url = remove_duplicate_prefix(
-        market_url + cp_headlines[0].find("a")["href"], market_url
-    )
-    tab2_url = remove_duplicate_prefix(
-        market_url + cp_headlines[1].find("a")["href"], market_url
-    )
-    tab3_url = remove_duplicate_prefix(
-        market_url + cp_headlines[2].find("a")["href"], market_url
-    )
-    tab4_url = remove_duplicate_prefix(
-        market_url + cp_headlines[3].find("a")["href"], market_url
-    )
-    tab5_url = remove_duplicate_prefix(
-        market_url + cp_headlines[4].find("a")["href"], market_url
-    )
-    tab6_url = remove_duplicate_prefix(
-        market_url + cp_headlines[5].find("a")["href"], market_url
-    )
+def get_zone_collections(soup, zone, config, slots):
+    """
+    This function returns the WCM ID of the collection that fed each slot of a zone (0 if we can't tell).
+    """
+    # Some templates, like the Times Union's spotlight, always use the same collection.
+    if "collection_id" in config:
+        return [int(config["collection_id"])] * slots
 
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_centerpiece_tab"
+    # Some zones have a collection per slot, like the centerpiece tabs.
     # Example: class="hide-rss-link hdnce-e hdnce-collection-105803-dynamic_centerpiece_tab"
-    cp_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_centerpiece_tab")
-    )
-
-    cp_tab_id_list = []
-    for tab in cp_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        cp_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    (
-        cp_order,
-        tab2_order,
-        tab3_order,
-        tab4_order,
-        tab5_order,
-        tab6_order,
-    ) = cp_tab_id_list
-
-    ## --- BREAKING NEWS --- ##
-
-    # Find all the headlines in the breaking news bar.
-    breaking_headlines = soup.find_all("a", class_="breakingNow--item-headline")
-
-    # We extract the text from the breaking news headlines and strip the whitespace. There isn't always a breaking news bar, so we use a try/except block to handle the error.
-    try:
-        breaking1_headline = breaking_headlines[0].text.strip()
-        breaking1_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[0]["href"], market_url
-        )
-    except:
-        breaking1_headline = None
-        breaking1_url = None
-    try:
-        breaking2_headline = breaking_headlines[1].text.strip()
-        breaking2_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[1]["href"], market_url
+    if "collections" in config:
+        tabs = zone_matches(
+            f"{zone}_collections",
+            soup.find_all(
+                "div", class_=re.compile(f"hdnce-collection-.*-{config['collections']}")
+            ),
         )
-    except:
-        breaking2_headline = None
-        breaking2_url = None
-    try:
-        just_in_headline = soup.find(
-            "a", {"class": "justNow--item-headline"}
-        ).text.strip()
-
-        just_in_url = (
-            f'{market_url}{soup.find("a", {"class": "justNow--item-headline"})["href"]}'
-        )
-    except:
-        just_in_headline = None
-        just_in_url = None
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now_tab"
-    # Example: class="hdnce-collection-114722-dynamic_breaking_now_tab"
-    breaking_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now_tab")
-    )
-
-    breaking_tab_id_list = []
-    for tab in breaking_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        breaking_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    try:
-        breaking1_order = breaking_tab_id_list[0]
-    except:
-        breaking1_order = ""
-    try:
-        breaking2_order = breaking_tab_id_list[1]
-    except:
-        breaking2_order = ""
-
-    # Find the div on the page that has a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now" that resides inside of a div with an id of "zoneAL"
-    # Example: class="hdnce-collection-107158-dynamic_breaking_now"
-    try:
-        just_in_order = soup.find("div", id="zoneAL").find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now")
-        )
-        just_in_id = re.search(r"\d+", just_in_order["class"][2]).group()
-
-        just_in_order = f"{wcm_url}{just_in_id}"
-    except:
-        just_in_order = ""
+        collection_ids = [get_collection_id(tab) for tab in tabs][:slots]
+        return collection_ids + [0] * (slots - len(collection_ids))
 
-    ## --- TOP HEADLINES --- ##
-
-    # Find the top headlines list and extract the text from the headlines, stripping the whitespace.
-    top_headlines_list = soup.find("ul", class_="coreHeadlineList--items")
-
-    headline_list = top_headlines_list.find_all(
-        "div", class_="coreHeadlineList--item-headline"
-    )
-    top1 = headline_list[0].text.strip()
-    top2 = headline_list[1].text.strip()
-    top3 = headline_list[2].text.strip()
-    top4 = headline_list[3].text.strip()
-    top5 = headline_list[4].text.strip()
-
-    top1_url = remove_duplicate_prefix(
-        market_url + headline_list[0].find("a")["href"], market_url
-    )
-    top2_url = remove_duplicate_prefix(
-        market_url + headline_list[1].find("a")["href"], market_url
-    )
-    top3_url = remove_duplicate_prefix(
-        market_url + headline_list[2].find("a")["href"], market_url
-    )
-    top4_url = remove_duplicate_prefix(
-        market_url + headline_list[3].find("a")["href"], market_url
-    )
-    top5_url = remove_duplicate_prefix(
-        market_url + headline_list[4].find("a")["href"], market_url
-    )
-
-    # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
+    # And the rest have one collection for the whole zone, like the top headlines list.
     # Example: class="hdnce-collection-105799-dynamic_headline_list"
-    top_headline_order = soup.find(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_headline_list")
-    )
-
-    top_headline_id = re.search(r"\d+", top_headline_order["class"][2]).group()
-
-    top_headline_order = f"{wcm_url}{top_headline_id}"
-
-    # Create a new variable called date and store the current date in the following format: YYYY-MM-DD
-    date = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%Y-%m-%d"
-    )
-
-    # Create a new variable called time and store the current time in the appropriate timezone in a 12-hour format without a leading zero
-    time = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%-I:%M %p"
-    )
-
-    # Print out all the headlines in a formatted string.
-    # print(
-    #     f"""
-    # 📰 Breaking 1: {breaking1_headline}
-    # 📰 Breakinhg 2: {breaking2_headline}
-    # 📰 Just in: {just_in_headline}
-    # 📰 CP: {cp_headline}
-    # 📰 Tab 2: {tab2_headline}
-    # 📰 Tab 3: {tab3_headline}
-    # 📰 Tab 4: {tab4_headline}
-    # 📰 Tab 5: {tab5_headline}
-    # 📰 Tab 6: {tab6_headline}
-    # 📰 Headline 1: {top1}
-    # 📰 Headline 2: {top2}
-    # 📰 Headline 3: {top3}
-    # 📰 Headline 4: {top4}
-    # 📰 Headline 5: {top5}"""
-    # )
-
-    # # Print the tab order
-    # print(
-    #     f"""
-    #     🎌 Breaking 1 Order: {breaking1_order}
-    #     🎌 Breaking 2 Order: {breaking2_order}
-    #     🎌 Just In Order: {just_in_order}
-    #     🎌 CP Order: {cp_order}
-    #     🎌 Tab 2 Order: {tab2_order}
-    #     🎌 Tab 3 Order: {tab3_order}
-    #     🎌 Tab 4 Order: {tab4_order}
-    #     🎌 Tab 5 Order: {tab5_order}
-    #     🎌 Tab 6 Order: {tab6_order}
-    #     🎌 Top Headlines Order: {top_headline_order}
-    #       """
-    # )
-
-    # # Print out all the headlines
-    # print(
-    #     f"""
-    #     🔗 Breaking 1 URL: {breaking1_url}
-    #     🔗 Breaking 2 URL: {breaking2_url}
-    #     🔗 Just In URL: {just_in_url}
-    #     🔗 CP URL: {cp_url}
-    #     🔗 Tab 2 URL: {tab2_url}
-    #     🔗 Tab 3 URL: {tab3_url}
-    #     🔗 Tab 4 URL: {tab4_url}
-    #     🔗 Tab 5 URL: {tab5_url}
-    #     🔗 Tab 6 URL: {tab6_url}
-    #     🔗 Top 1 URL: {top1_url}
-    #     🔗 Top 2 URL: {top2_url}
-    #     🔗 Top 3 URL: {top3_url}
-    #     🔗 Top 4 URL: {top4_url}
-    #     🔗 Top 5 URL: {top5_url}
-    #     """
-    # )
-
-    # Create a dataframe out of the centerpiece headlines and the top headlines.
-    latest_headlines_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_headline,
-            "Breaking 2": breaking2_headline,
-            "Just In": just_in_headline,
-            "CP": cp_headline,
-            "Tab 2": tab2_headline,
-            "Tab 3": tab3_headline,
-            "Tab 4": tab4_headline,
-            "Tab 5": tab5_headline,
-            "Tab 6": tab6_headline,
-            "Top 1": top1,
-            "Top 2": top2,
-            "Top 3": top3,
-            "Top 4": top4,
-            "Top 5": top5,
-        },
-        index=[0],
-    )
-
-    latest_urls_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_url,
-            "Breaking 2": breaking2_url,
-            "Just In": just_in_url,
-            "CP": cp_url,
-            "Tab 2": tab2_url,
-            "Tab 3": tab3_url,
-            "Tab 4": tab4_url,
-            "Tab 5": tab5_url,
-            "Tab 6": tab6_url,
-            "Top 1": top1_url,
-            "Top 2": top2_url,
-            "Top 3": top3_url,
-            "Top 4": top4_url,
-            "Top 5": top5_url,
-        },
-        index=[0],
-    )
-
-    latest_tab_order_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_order,
-            "Breaking 2": breaking2_order,
-            "Just In": just_in_order,
-            "CP": cp_order,
-            "Tab 2": tab2_order,
-            "Tab 3": tab3_order,
-            "Tab 4": tab4_order,
-            "Tab 5": tab5_order,
-            "Tab 6": tab6_order,
-            "Top 1": top_headline_order,
-            "Top 2": top_headline_order,
-            "Top 3": top_headline_order,
-            "Top 4": top_headline_order,
-            "Top 5": top_headline_order,
-        },
-        index=[0],
-    )
+    if "collection" in config:
+        container = soup
+        if "collection_container" in config:
+            container = soup.select_one(config["collection_container"])
+        collection = None
+        if container is not None:
+            collection = container.find(
+                "div", class_=re.compile(f"hdnce-collection-.*-{config['collection']}")
+            )
+        collection_id = get_collection_id(collection) if collection else 0
+        return [collection_id] * slots
 
-    return latest_headlines_df, latest_urls_df, latest_tab_order_df
+    return [0] * slots
 
 
-def get_houston_headlines():
+def get_zone(soup, market, zone, config):
     """
-    This function scrapes the Houston Chronicle homepage
+    This function extracts the headlines, URLs and collections of a zone of the homepage.
     """
-    # Get the HTML content of the Houston Chronicle homepage
-    market_url = "https://www.houstonchronicle.com"
-    wcm_url = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
+    names = slot_names(zone, config["slots"])
 
-    soup = getSoup(market_url)
+    # Find the elements of the zone, inside its container if it has one.
+    container = soup
+    if "container" in config:
+        container = soup.select_one(config["container"])
+    elements = container.select(config["selector"]) if container is not None else []
 
-    ## --- CENTERPIECE HEADLINES --- ##
+    # Certain markets use a different template for some of their homepage. In this scenario, we need to use a different selector to find the headlines.
+    if not elements and "fallback_selector" in config:
+        elements = soup.select(config["fallback_selector"])
 
-    # Find all the divs with a class of "centerpiece-tab--main-headline"
-    cp_headlines = soup.find_all("div", class_="centerpiece-tab--main-headline")
+    zone_matches(zone, elements)
 
-    # We extract the text from the headlines and strip the whitespace.
-    cp_headline = cp_headlines[0].text.strip()
-    tab2_headline = cp_headlines[1].text.strip()
-    tab3_headline = cp_headlines[2].text.strip()
-    tab4_headline = cp_headlines[3].text.strip()
-    tab5_headline = cp_headlines[4].text.strip()
-    tab6_headline = cp_headlines[5].text.strip()
-
-    # We extract the URLs from the headlines and strip the whitespace. The href is in the a tag, so we need to use a for loop to extract the URLs.
-    cp_url = remove_duplicate_prefix(
-        market_url + cp_headlines[0].find("a")["href"], market_url
-    )
-    tab2_url = remove_duplicate_prefix(
-        market_url + cp_headlines[1].find("a")["href"], market_url
-    )
-    tab3_url = remove_duplicate_prefix(
-        market_url + cp_headlines[2].find("a")["href"], market_url
-    )
-    tab4_url = remove_duplicate_prefix(
-        market_url + cp_headlines[3].find("a")["href"], market_url
-    )
-    tab5_url = remove_duplicate_prefix(
-        market_url + cp_headlines[4].find("a")["href"], market_url
-    )
-    tab6_url = remove_duplicate_prefix(
-        market_url + cp_headlines[5].find("a")["href"], market_url
-    )
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_centerpiece_tab"
-    # Example: class="hide-rss-link hdnce-e hdnce-collection-105803-dynamic_centerpiece_tab"
-    cp_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_centerpiece_tab")
-    )
-
-    cp_tab_id_list = []
-    for tab in cp_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        cp_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    (
-        cp_order,
-        tab2_order,
-        tab3_order,
-        tab4_order,
-        tab5_order,
-        tab6_order,
-    ) = cp_tab_id_list
-
-    ## --- BREAKING NEWS --- ##
-
-    # Find all the headlines in the breaking news bar.
-    breaking_headlines = soup.find_all("a", class_="breakingNow--item-headline")
-
-    # We extract the text from the breaking news headlines and strip the whitespace. There isn't always a breaking news bar, so we use a try/except block to handle the error.
-    try:
-        breaking1_headline = breaking_headlines[0].text.strip()
-        breaking1_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[0]["href"], market_url
+    # There isn't always a breaking news bar, so optional zones can come up short. The others can't.
+    if len(elements) < len(names) and not config.get("optional"):
+        raise IndexError(
+            f"Expected {len(names)} {zone} headlines on {market['url']}, found {len(elements)}"
         )
-    except:
-        breaking1_headline = None
-        breaking1_url = None
-    try:
-        breaking2_headline = breaking_headlines[1].text.strip()
-        breaking2_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[1]["href"], market_url
-        )
-    except:
-        breaking2_headline = None
-        breaking2_url = None
-    try:
-        just_in_headline = soup.find(
-            "a", {"class": "justNow--item-headline"}
-        ).text.strip()
-
-        just_in_url = (
-            f'{market_url}{soup.find("a", {"class": "justNow--item-headline"})["href"]}'
-        )
-    except:
-        just_in_headline = None
-        just_in_url = None
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now_tab"
-    # Example: class="hdnce-collection-114722-dynamic_breaking_now_tab"
-    breaking_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now_tab")
-    )
-
-    breaking_tab_id_list = []
-    for tab in breaking_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        breaking_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    try:
-        breaking1_order = breaking_tab_id_list[0]
-    except:
-        breaking1_order = ""
-    try:
-        breaking2_order = breaking_tab_id_list[1]
-    except:
-        breaking2_order = ""
-
-    # Find the div on the page that has a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now" that resides inside of a div with an id of "zoneAL"
-    # Example: class="hdnce-collection-107158-dynamic_breaking_now"
-    try:
-        just_in_order = soup.find("div", id="zoneAL").find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now")
-        )
-        just_in_id = re.search(r"\d+", just_in_order["class"][2]).group()
-
-        just_in_order = f"{wcm_url}{just_in_id}"
-    except:
-        just_in_order = ""
-
-    ## --- TOP HEADLINES --- ##
-
-    # Find the top headlines list and extract the text from the headlines, stripping the whitespace.
-    top_headlines_list = soup.find("ul", class_="coreHeadlineList--items")
-
-    headline_list = top_headlines_list.find_all(
-        "div", class_="coreHeadlineList--item-headline"
-    )
-    top1 = headline_list[0].text.strip()
-    top2 = headline_list[1].text.strip()
-    top3 = headline_list[2].text.strip()
-    top4 = headline_list[3].text.strip()
-    top5 = headline_list[4].text.strip()
-
-    top1_url = remove_duplicate_prefix(
-        market_url + headline_list[0].find("a")["href"], market_url
-    )
-    top2_url = remove_duplicate_prefix(
-        market_url + headline_list[1].find("a")["href"], market_url
-    )
-    top3_url = remove_duplicate_prefix(
-        market_url + headline_list[2].find("a")["href"], market_url
-    )
-    top4_url = remove_duplicate_prefix(
-        market_url + headline_list[3].find("a")["href"], market_url
-    )
-    top5_url = remove_duplicate_prefix(
-        market_url + headline_list[4].find("a")["href"], market_url
-    )
 
-    # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-    # Example: class="hdnce-collection-105799-dynamic_headline_list"
-    top_headline_order = soup.find(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_headline_list")
-    )
-
-    top_headline_id = re.search(r"\d+", top_headline_order["class"][2]).group()
-
-    top_headline_order = f"{wcm_url}{top_headline_id}"
-
-    # Create a new variable called date and store the current date in the following format: YYYY-MM-DD
-    date = datetime.now(pytz.timezone(markets["Houston"]["timezone"])).strftime(
-        "%Y-%m-%d"
-    )
-
-    # Create a new variable called time and store the current time in the appropriate timezone in a 12-hour format without a leading zero
-    time = datetime.now(pytz.timezone(markets["Houston"]["timezone"])).strftime(
-        "%-I:%M %p"
-    )
+    headlines, hrefs = [], []
+    for element in elements[: len(names)]:
+        try:
+            # We extract the text from the headline and strip the whitespace. The href is either on the element or on the a tag inside of it.
+            link = element if element.name == "a" else element.find("a")
+            hrefs.append(link["href"])
+            headlines.append(element.text.strip())
+        except (KeyError, TypeError):
+            if not config.get("optional"):
+                raise
+            headlines.append(None)
+            hrefs.append(None)
+
+    # The zone's links are all cleaned up at once, into the URLs we log.
+    urls = canonicalize_all(market, hrefs)
+    headlines += [None] * (len(names) - len(headlines))
+    urls += [None] * (len(names) - len(urls))
+    collections = get_zone_collections(soup, zone, config, len(names))
+
+    return names, headlines, urls, collections
+
+
+def get_headlines(market, stream=False):
+    """
+    This function scrapes a market's homepage using its layout template and returns a Snapshot of it.
+    """
+    # Get the HTML content of the homepage, or only as much of it as the zones need if we stream it
+    soup = getSoup(market["url"], zones=market["zones"] if stream else None)
 
-    # Create a dataframe out of the centerpiece headlines and the top headlines.
-    latest_headlines_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_headline,
-            "Breaking 2": breaking2_headline,
-            "Just In": just_in_headline,
-            "CP": cp_headline,
-            "Tab 2": tab2_headline,
-            "Tab 3": tab3_headline,
-            "Tab 4": tab4_headline,
-            "Tab 5": tab5_headline,
-            "Tab 6": tab6_headline,
-            "Top 1": top1,
-            "Top 2": top2,
-            "Top 3": top3,
-            "Top 4": top4,
-            "Top 5": top5,
-        },
-        index=[0],
-    )
+    # Note the RSS/Atom feeds the homepage links to, for the feed collector.
+    feeds = discover_feeds(soup, market)
+    if feeds:
+        report.record("feeds_discovered", feeds=feeds)
 
-    latest_urls_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_url,
-            "Breaking 2": breaking2_url,
-            "Just In": just_in_url,
-            "CP": cp_url,
-            "Tab 2": tab2_url,
-            "Tab 3": tab3_url,
-            "Tab 4": tab4_url,
-            "Tab 5": tab5_url,
-            "Tab 6": tab6_url,
-            "Top 1": top1_url,
-            "Top 2": top2_url,
-            "Top 3": top3_url,
-            "Top 4": top4_url,
-            "Top 5": top5_url,
-        },
-        index=[0],
+    # Store the current date (YYYY-MM-DD) and time (12-hour format without a leading zero) in the market's timezone
+    now = datetime.now(pytz.timezone(market["timezone"]))
+    snapshot = Snapshot(
+        market["name"],
+        now.strftime("%Y-%m-%d"),
+        now.strftime("%-I:%M %p"),
+        now.astimezone(timezone.utc).isoformat(),
     )
 
-    latest_tab_order_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_order,
-            "Breaking 2": breaking2_order,
-            "Just In": just_in_order,
-            "CP": cp_order,
-            "Tab 2": tab2_order,
-            "Tab 3": tab3_order,
-            "Tab 4": tab4_order,
-            "Tab 5": tab5_order,
-            "Tab 6": tab6_order,
-            "Top 1": top_headline_order,
-            "Top 2": top_headline_order,
-            "Top 3": top_headline_order,
-            "Top 4": top_headline_order,
-            "Top 5": top_headline_order,
-        },
-        index=[0],
-    )
+    for zone, config in market["zones"].items():
+        snapshot.add_zone(*get_zone(soup, market, zone, config))
 
-    return latest_headlines_df, latest_urls_df, latest_tab_order_df
+    return snapshot
 
 
-def get_albany_headlines():
+def handle_spreadsheet_update(snapshot, market):
     """
-    This function scrapes the Albany Times Union homepage
+    This function handles updating the market's spreadsheet with the new data.
     """
-    market_url = "https://www.timesunion.com"
-    wcm_url = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
-    # Get the HTML content of the page
-    soup = getSoup(market_url)
-
-    ## --- CENTERPIECE HEADLINES --- ##
-
-    # Find the headlines in the "Capital Region News" section
-    cp_headlines = soup.find_all("a", class_="dynamicSpotlight--item-header")
-
-    # Extract the text from the headlines and strip the whitespace
-    cp_headline = cp_headlines[0].text.strip()
-    tab2_headline = cp_headlines[1].text.strip()
-    tab3_headline = cp_headlines[2].text.strip()
-    tab4_headline = cp_headlines[3].text.strip()
-    tab5_headline = cp_headlines[4].text.strip()
-    tab6_headline = cp_headlines[5].text.strip()
-    tab7_headline = cp_headlines[6].text.strip()
-
-    # We extract the URLs from the headlines and strip the whitespace. The href is in the a tag, so we need to use a for loop to extract the URLs.
-    cp_headlines = soup.find_all("a", class_="dynamicSpotlight--item-header")
-    cp_url = remove_duplicate_prefix(market_url + cp_headlines[0]["href"], market_url)
-    tab2_url = remove_duplicate_prefix(market_url + cp_headlines[1]["href"], market_url)
-    tab3_url = remove_duplicate_prefix(market_url + cp_headlines[2]["href"], market_url)
-    tab4_url = remove_duplicate_prefix(market_url + cp_headlines[3]["href"], market_url)
-    tab5_url = remove_duplicate_prefix(market_url + cp_headlines[4]["href"], market_url)
-    tab6_url = remove_duplicate_prefix(market_url + cp_headlines[5]["href"], market_url)
-    tab7_url = remove_duplicate_prefix(market_url + cp_headlines[6]["href"], market_url)
-
-    # Replace "?IPID=Times-Union-HP-spotlight" with an empty string.
-    cp_url = cp_url.replace("?IPID=Times-Union-HP-spotlight", "")
-    tab2_url = tab2_url.replace("?IPID=Times-Union-HP-spotlight", "")
-    tab3_url = tab3_url.replace("?IPID=Times-Union-HP-spotlight", "")
-    tab4_url = tab4_url.replace("?IPID=Times-Union-HP-spotlight", "")
-    tab5_url = tab5_url.replace("?IPID=Times-Union-HP-spotlight", "")
-    tab6_url = tab6_url.replace("?IPID=Times-Union-HP-spotlight", "")
-    tab7_url = tab7_url.replace("?IPID=Times-Union-HP-spotlight", "")
-
-    cp_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
-    tab2_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
-    tab3_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
-    tab4_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
-    tab5_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
-    tab6_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
-    tab7_order = (
-        "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=116614"
-    )
+    # This is the only place the snapshot becomes DataFrames.
+    latest_headlines_df, latest_urls_df, latest_tab_order_df = snapshot.to_frames()
 
-    ## --- BREAKING NEWS --- ##
-
-    # Find all the headlines in the breaking news bar
-    breaking_headlines = soup.find_all("a", class_="breakingNow--item-headline")
-
-    # We extract the text from the breaking news headlines and strip the whitespace. There isn't always a breaking news bar, so we use a try/except block to handle the error.
-    try:
-        breaking1_headline = breaking_headlines[0].text.strip()
-        breaking1_url = f'{market_url}{breaking_headlines[0]["href"]}'
-        breaking1_url = breaking1_url.replace("?IPID=Times-Union-HP-breaking-bar", "")
-        breaking1_url = remove_duplicate_prefix(breaking1_url, market_url)
-    except:
-        breaking1_headline = None
-        breaking1_url = None
-    try:
-        breaking2_headline = breaking_headlines[1].text.strip()
-        breaking2_url = f'{market_url}{breaking_headlines[1]["href"]}'
-        breaking2_url = breaking2_url.replace("?IPID=Times-Union-HP-breaking-bar", "")
-        breaking2_url = remove_duplicate_prefix(breaking2_url, market_url)
-    except:
-        breaking2_headline = None
-        breaking2_url = None
-    try:
-        just_in_headline = soup.find(
-            "a", {"class": "justNow--item-headline"}
-        ).text.strip()
-
-        just_in_url = (
-            f'{market_url}{soup.find("a", {"class": "justNow--item-headline"})["href"]}'
-        )
-        # Remove "?IPID=Times-Union-HP-just-in" from the URL
-        just_in_url = just_in_url.replace("?IPID=Times-Union-HP-just-in", "")
-
-        just_in_url = remove_duplicate_prefix(just_in_url, market_url)
-    except:
-        just_in_headline = None
-        just_in_url = None
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now_tab"
-    # Example: class="hdnce-collection-114722-dynamic_breaking_now_tab"
-    breaking_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now_tab")
-    )
-
-    breaking_tab_id_list = []
-    for tab in breaking_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        breaking_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    try:
-        breaking1_order = breaking_tab_id_list[0]
-    except:
-        breaking1_order = ""
-    try:
-        breaking2_order = breaking_tab_id_list[1]
-    except:
-        breaking2_order = ""
-
-    # Find the div on the page that has a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now" that resides inside of a div with an id of "zoneAL"
-    # Example: class="hdnce-collection-107158-dynamic_breaking_now"
-    try:
-        just_in_order = soup.find("div", id="zoneAL").find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now")
+    market_spreadsheet_url = markets[market]["spreadsheet"]
+    deadline = deadlines.current()
+
+    with report.stage("sheets_read") as stage:
+        # Open the spreadsheet by its URL using gspread
+        sh = api_call_handler(lambda: gc.open_by_url(market_spreadsheet_url))
+
+        # In one go, I want to store the first, second and third sheets in the spreadsheet in three separate dataframes
+        # The names of the sheets are "Headline log", "URL log" and "Tab order log"
+        historic_headline_log_df, historic_url_log_df, historic_tab_url_log_df = (
+            pd.DataFrame(),
+            pd.DataFrame(),
+            pd.DataFrame(),
+        )
+
+        # We loop through the sheets in the spreadsheet
+        for sheet in api_call_handler(sh.worksheets):
+            # If the sheet is called "Headline log"
+            if sheet.title == "Headline log":
+                # We store the sheet in the historic_headline_log_df dataframe
+                historic_headline_log_df = pd.DataFrame(
+                    api_call_handler(sheet.get_all_records)
+                )
+            # If the sheet is called "URL log"
+            elif sheet.title == "URL log":
+                # We store the sheet in the historic_url_log_df dataframe
+                historic_url_log_df = pd.DataFrame(api_call_handler(sheet.get_all_records))
+            # If the sheet is called "Tab order log"
+            elif sheet.title == "Tab order log":
+                # We store the sheet in the historic_tab_url_log_df dataframe
+                historic_tab_url_log_df = pd.DataFrame(
+                    api_call_handler(sheet.get_all_records)
+                )
+
+        stage["rows"] = (
+            len(historic_headline_log_df)
+            + len(historic_url_log_df)
+            + len(historic_tab_url_log_df)
         )
-        just_in_id = re.search(r"\d+", just_in_order["class"][2]).group()
-
-        just_in_order = f"{wcm_url}{just_in_id}"
-    except:
-        just_in_order = ""
-
-    ## --- TOP HEADLINES --- ##
-
-    # Find the top headlines in the "Capital Region News" section
-    top_headlines_list = soup.find("div", class_="thumbnail-list-wrapper")
-    top_headlines_list = top_headlines_list.find_all("li")
-
-    # Extract the text from the top headlines and strip the whitespace
-    top1 = top_headlines_list[0].text.strip()
-    top2 = top_headlines_list[1].text.strip()
-    top3 = top_headlines_list[2].text.strip()
-    top4 = top_headlines_list[3].text.strip()
-    top5 = top_headlines_list[4].text.strip()
-
-    top1_url = remove_duplicate_prefix(
-        market_url + top_headlines_list[0].find("a")["href"], market_url
-    )
-    top2_url = remove_duplicate_prefix(
-        market_url + top_headlines_list[1].find("a")["href"], market_url
-    )
-    top3_url = remove_duplicate_prefix(
-        market_url + top_headlines_list[2].find("a")["href"], market_url
-    )
-    top4_url = remove_duplicate_prefix(
-        market_url + top_headlines_list[3].find("a")["href"], market_url
-    )
-    top5_url = remove_duplicate_prefix(
-        market_url + top_headlines_list[4].find("a")["href"], market_url
-    )
-
-    # Replace "?IPID=Times-Union-HP-latest-news" with an empty string.
-    top1_url = top1_url.replace("?IPID=Times-Union-HP-latest-news", "")
-    top2_url = top2_url.replace("?IPID=Times-Union-HP-latest-news", "")
-    top3_url = top3_url.replace("?IPID=Times-Union-HP-latest-news", "")
-    top4_url = top4_url.replace("?IPID=Times-Union-HP-latest-news", "")
-    top5_url = top5_url.replace("?IPID=Times-Union-HP-latest-news", "")
 
-    # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-    # Example: class="hdnce-collection-105799-dynamic_headline_list"
-    top_headline_order = soup.find(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_thumbnail_list")
-    )
-
-    top_headline_id = re.search(r"\d+", top_headline_order["class"][2]).group()
-
-    top_headline_order = f"{wcm_url}{top_headline_id}"
-
-    # Create a new variable called date and store the current date in the following format: YYYY-MM-DD
-    date = datetime.now(pytz.timezone(markets["Albany"]["timezone"])).strftime(
-        "%Y-%m-%d"
-    )
-
-    # Create a new variable called time and store the current time in the appropriate timezone in a 12-hour format without a leading zero
-    time = datetime.now(pytz.timezone(markets["Albany"]["timezone"])).strftime(
-        "%-I:%M %p"
-    )
-
-    # Create a dataframe out of the centerpiece headlines and the top headlines.
-    latest_headlines_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_headline,
-            "Breaking 2": breaking2_headline,
-            "Just In": just_in_headline,
-            "CP": cp_headline,
-            "Tab 2": tab2_headline,
-            "Tab 3": tab3_headline,
-            "Tab 4": tab4_headline,
-            "Tab 5": tab5_headline,
-            "Tab 6": tab6_headline,
-            "Tab 7": tab7_headline,
-            "Top 1": top1,
-            "Top 2": top2,
-            "Top 3": top3,
-            "Top 4": top4,
-            "Top 5": top5,
-        },
-        index=[0],
-    )
+    # Concatenate the latest dataframes with the historic dataframes.
+    # The latest dataframes are first in the list so they will be on top
+    # The historic dataframes are second in the list so they will be on the bottom
+    updated_headline_log_df = pd.concat([latest_headlines_df, historic_headline_log_df])
 
-    latest_urls_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_url,
-            "Breaking 2": breaking2_url,
-            "Just In": just_in_url,
-            "CP": cp_url,
-            "Tab 2": tab2_url,
-            "Tab 3": tab3_url,
-            "Tab 4": tab4_url,
-            "Tab 5": tab5_url,
-            "Tab 6": tab6_url,
-            "Tab 7": tab7_url,
-            "Top 1": top1_url,
-            "Top 2": top2_url,
-            "Top 3": top3_url,
-            "Top 4": top4_url,
-            "Top 5": top5_url,
-        },
-        index=[0],
-    )
+    updated_url_log_df = pd.concat([latest_urls_df, historic_url_log_df])
 
-    latest_tab_order_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_order,
-            "Breaking 2": breaking2_order,
-            "Just In": just_in_order,
-            "CP": cp_order,
-            "Tab 2": tab2_order,
-            "Tab 3": tab3_order,
-            "Tab 4": tab4_order,
-            "Tab 5": tab5_order,
-            "Tab 6": tab6_order,
-            "Tab 7": tab7_order,
-            "Top 1": top_headline_order,
-            "Top 2": top_headline_order,
-            "Top 3": top_headline_order,
-            "Top 4": top_headline_order,
-            "Top 5": top_headline_order,
-        },
-        index=[0],
-    )
+    updated_tab_url_log_df = pd.concat([latest_tab_order_df, historic_tab_url_log_df])
 
-    # # Print the headlines
-    # print(
-    #     f"""
-    # 📰 Breaking 1: {breaking1_headline}
-    # 📰 Breaking 2: {breaking2_headline}
-    # 📰 Just in: {just_in_headline}
-    # 📰 CP: {cp_headline}
-    # 📰 Tab 2: {tab2_headline}
-    # 📰 Tab 3: {tab3_headline}
-    # 📰 Tab 4: {tab4_headline}
-    # 📰 Tab 5: {tab5_headline}
-    # 📰 Tab 6: {tab6_headline}
-    # 📰 Tab 7: {tab7_headline}
-    # 📰 Headline 1: {top1}
-    # 📰 Headline 2: {top2}
-    # 📰 Headline 3: {top3}
-    # 📰 Headline 4: {top4}
-    # 📰 Headline 5: {top5}"""
-    # )
-
-    # # Print out all the headlines
-    # print(
-    #     f"""
-    #     🔗 Breaking 1 URL: {breaking1_url}
-    #     🔗 Breaking 2 URL: {breaking2_url}
-    #     🔗 Just In URL: {just_in_url}
-    #     🔗 CP URL: {cp_url}
-    #     🔗 Tab 2 URL: {tab2_url}
-    #     🔗 Tab 3 URL: {tab3_url}
-    #     🔗 Tab 4 URL: {tab4_url}
-    #     🔗 Tab 5 URL: {tab5_url}
-    #     🔗 Tab 6 URL: {tab6_url}
-    #     🔗 Tab 7 URL: {tab7_url}
-    #     🔗 Top 1 URL: {top1_url}
-    #     🔗 Top 2 URL: {top2_url}
-    #     🔗 Top 3 URL: {top3_url}
-    #     🔗 Top 4 URL: {top4_url}
-    #     🔗 Top 5 URL: {top5_url}
-    #     """
-    # )
-
-    # # Print the tab order
-    # print(
-    #     f"""
-    #     🎌 Breaking 1 Order: {breaking1_order}
-    #     🎌 Breaking 2 Order: {breaking2_order}
-    #     🎌 Just In Order: {just_in_order}
-    #     🎌 CP Order: {cp_order}
-    #     🎌 Tab 2 Order: {tab2_order}
-    #     🎌 Tab 3 Order: {tab3_order}
-    #     🎌 Tab 4 Order: {tab4_order}
-    #     🎌 Tab 5 Order: {tab5_order}
-    #     🎌 Tab 6 Order: {tab6_order}
-    #     🎌 Tab 7 Order: {tab7_order}
-    #     🎌 Top Headlines Order: {top_headline_order}
-    #       """
-    # )
-
-    return latest_headlines_df, latest_urls_df, latest_tab_order_df
-
-
-def get_san_francisco_headlines():
+    # Now we write the dataframes to the spreadsheet using the set_with_dataframe method.
+    # We only check the deadline before the first write. Once one sheet is written, the other two
+    # have to be too, or the three logs would be a row out of line.
+    deadline.check("setting the logs")
+    with deadlines.scope(Deadline(label="sheets write")):
+        for sheet_name, updated_df in [
+            ("Headline log", updated_headline_log_df),
+            ("URL log", updated_url_log_df),
+            ("Tab order log", updated_tab_url_log_df),
+        ]:
+            print(f"Setting the {sheet_name}")
+            with report.stage("sheets_write", sheet=sheet_name, rows=len(updated_df)):
+                api_call_handler(
+                    lambda: set_with_dataframe(
+                        sh.worksheet(sheet_name), updated_df, include_index=False
+                    )
+                )
+
+    # We note that the market was captured, which is what "seconds since last success" is based on.
+    report.record("captured")
+
+
+def index_capture(info, snapshot, skip=()):
     """
-    This function scrapes the San Francisco Chronicle homepage
+    This function feeds a capture to the change log and the indexes, except the ones in skip.
+    A broken index is reported, but it never keeps the capture from going to the spreadsheet.
     """
-    market_url = "https://www.sfchronicle.com"
-    wcm_url = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
-    # Get the HTML content of the page
-    soup = getSoup(market_url)
-
-    ## --- CENTERPIECE HEADLINES --- ##
-
-    # Find all the divs with a class of "centerpiece-tab--main-headline"
-    cp_headlines = soup.find_all("div", class_="centerpiece-tab--main-headline")
-
-    # Certain markets, like the Albany Times Union, use a different template for their homepage. In this scenario, we need to use a different class to find the headlines.
-    if cp_headlines == []:
-        cp_headlines = soup.find_all("a", class_="dynamicSpotlight--item-header")
-
-    # We extract the text from the headlines and strip the whitespace.
-    cp_headline = cp_headlines[0].text.strip()
-    tab2_headline = cp_headlines[1].text.strip()
-    tab3_headline = cp_headlines[2].text.strip()
-    tab4_headline = cp_headlines[3].text.strip()
-    tab5_headline = cp_headlines[4].text.strip()
-    tab6_headline = cp_headlines[5].text.strip()
-
-    # We extract the URLs from the headlines and strip the whitespace. The href is in the a tag, so we need to use a for loop to extract the URLs.
-    cp_url = remove_duplicate_prefix(
-        market_url + cp_headlines[0].find("a")["href"], market_url
-    )
-    tab2_url = remove_duplicate_prefix(
-        market_url + cp_headlines[1].find("a")["href"], market_url
-    )
-    tab3_url = remove_duplicate_prefix(
-        market_url + cp_headlines[2].find("a")["href"], market_url
-    )
-    tab4_url = remove_duplicate_prefix(
-        market_url + cp_headlines[3].find("a")["href"], market_url
-    )
-    tab5_url = remove_duplicate_prefix(
-        market_url + cp_headlines[4].find("a")["href"], market_url
-    )
-    tab6_url = remove_duplicate_prefix(
-        market_url + cp_headlines[5].find("a")["href"], market_url
-    )
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_centerpiece_tab"
-    # Example: class="hide-rss-link hdnce-e hdnce-collection-105803-dynamic_centerpiece_tab"
-    cp_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_centerpiece_tab")
-    )
-
-    cp_tab_id_list = []
-    for tab in cp_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        cp_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    (
-        cp_order,
-        tab2_order,
-        tab3_order,
-        tab4_order,
-        tab5_order,
-        tab6_order,
-    ) = cp_tab_id_list
-
-    ## --- BREAKING NEWS --- ##
-
-    # Find all the headlines in the breaking news bar.
-    breaking_headlines = soup.find_all("a", class_="breakingNow--item-headline")
-
-    # We extract the text from the breaking news headlines and strip the whitespace. There isn't always a breaking news bar, so we use a try/except block to handle the error.
-    try:
-        breaking1_headline = breaking_headlines[0].text.strip()
-        breaking1_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[0]["href"], market_url
-        )
-    except:
-        breaking1_headline = None
-        breaking1_url = None
-    try:
-        breaking2_headline = breaking_headlines[1].text.strip()
-        breaking2_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[1]["href"], market_url
-        )
-    except:
-        breaking2_headline = None
-        breaking2_url = None
-    try:
-        just_in_headline = soup.find(
-            "a", {"class": "justNow--item-headline"}
-        ).text.strip()
-
-        just_in_url = (
-            f'{market_url}{soup.find("a", {"class": "justNow--item-headline"})["href"]}'
-        )
-    except:
-        just_in_headline = None
-        just_in_url = None
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now_tab"
-    # Example: class="hdnce-collection-114722-dynamic_breaking_now_tab"
-    breaking_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now_tab")
-    )
-
-    breaking_tab_id_list = []
-    for tab in breaking_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        breaking_tab_id_list.append(f"{wcm_url}{tab_id}")
+    slots = snapshot.to_slots()
+    captured_at = snapshot.captured_at
+
+    for index, update in [
+        # We compare the homepage with the last run's, slot by slot, and log what changed.
+        ("diff", lambda: record_changes(info, slots, report, captured_at=captured_at)),
+        # Every story on the homepage gets another hour in the dwell index.
+        ("dwell", lambda: update_dwell(info, slots, captured_at)),
+        # And every headline goes into the full-text search index.
+        ("search", lambda: index_headlines(info, slots, captured_at)),
+        # We link stories that ran on other markets too, by article ID or headline.
+        ("syndication", lambda: update_syndication(info, slots, captured_at)),
+        # And near-duplicate headlines (rewrites, related stories) are clustered.
+        ("clusters", lambda: update_clusters(info, slots, captured_at)),
+        # The capture goes on the end of the market's file for the day, which is committed.
+        ("dataset", lambda: append_capture(info, snapshot)),
+        # And it's archived as Parquet for analysis.
+        ("archive", lambda: append_snapshot(info, snapshot)),
+        # And into the occupancy matrix, which says what URL held every slot at every hour.
+        ("occupancy", lambda: update_occupancy(info, snapshot)),
+        # And the daily and hourly rollups the dashboards read are brought up to date.
+        ("rollups", lambda: update_rollups(info, snapshot)),
+        # And we note which WCM collection fed every slot, and when that changed.
+        ("collections", lambda: update_collection_spans(info, snapshot)),
+    ]:
+        if index in skip:
+            continue
+        try:
+            with report.stage(index):
+                update()
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"🤦‍♂️ Couldn't update the {index} index for {info['name']}: {e!r}")
+            report.record("index_failed", index=index, error=repr(e))
 
-    try:
-        breaking1_order = breaking_tab_id_list[0]
-    except:
-        breaking1_order = ""
-    try:
-        breaking2_order = breaking_tab_id_list[1]
-    except:
-        breaking2_order = ""
 
-    # Find the div on the page that has a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now" that resides inside of a div with an id of "zoneAL"
-    # Example: class="hdnce-collection-107158-dynamic_breaking_now"
+def enrich_market(enricher, info, snapshot):
+    """
+    This function fetches the byline, section and so on of the stories on the homepage we haven't seen yet.
+    It runs after the market is captured, so a slow article page never costs us a row in the logs.
+    """
     try:
-        just_in_order = soup.find("div", id="zoneAL").find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now")
-        )
-        just_in_id = re.search(r"\d+", just_in_order["class"][2]).group()
-
-        just_in_order = f"{wcm_url}{just_in_id}"
-    except:
-        just_in_order = ""
+        with report.stage("enrich"):
+            enricher.enrich(info, snapshot.urls)
+    except DeadlineExceeded as e:
+        print(f"⏱️ Stopped enriching {info['name']}: {e}")
+    except Exception as e:
+        print(f"🤦‍♂️ Couldn't enrich {info['name']}: {e!r}")
+        report.record("enrich_failed", error=repr(e))
 
-    ## --- TOP HEADLINES --- ##
-
-    # Find the top headlines list and extract the text from the headlines
-    top_headlines_list = soup.find("ul", class_="coreHeadlineList--items")
-    headline_list = top_headlines_list.find_all(
-        "div", class_="coreHeadlineList--item-headline"
-    )
-    top1 = headline_list[0].text.strip()
-    top2 = headline_list[1].text.strip()
-    top3 = headline_list[2].text.strip()
-    top4 = headline_list[3].text.strip()
-    top5 = headline_list[4].text.strip()
-
-    top1_url = remove_duplicate_prefix(
-        market_url + headline_list[0].find("a")["href"], market_url
-    )
-    top2_url = remove_duplicate_prefix(
-        market_url + headline_list[1].find("a")["href"], market_url
-    )
-    top3_url = remove_duplicate_prefix(
-        market_url + headline_list[2].find("a")["href"], market_url
-    )
-    top4_url = remove_duplicate_prefix(
-        market_url + headline_list[3].find("a")["href"], market_url
-    )
-    top5_url = remove_duplicate_prefix(
-        market_url + headline_list[4].find("a")["href"], market_url
-    )
 
-    # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-    # Example: class="hdnce-collection-105799-dynamic_headline_list"
-    top_headline_order = soup.find(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_headline_list")
+def log_market(
+    market, info, profiler, run_deadline, market_timeout, enricher=None, stream=False
+):
+    """
+    This function scrapes a market's homepage and adds it to the market's spreadsheet.
+    The market has to be done by its own deadline or the run's, whichever comes first.
+    """
+    print(f"🏙️ Logging headlines for {market}...")
+    print(f"--- {info['paper']} ---")
+    report.start_market(market)
+    deadline = Deadline.earliest(
+        run_deadline, Deadline(market_timeout, label="market deadline")
     )
+    with profiler.market(market), deadlines.scope(deadline):
+        try:
+            print("📰 Scraping homepage...")
+            # We scrape the homepage using the market's layout template
+            with report.stage("extract"):
+                snapshot = get_headlines(info, stream)
 
-    top_headline_id = re.search(r"\d+", top_headline_order["class"][2]).group()
-
-    top_headline_order = f"{wcm_url}{top_headline_id}"
-
-    # Create a new variable called date and store the current date in the following format: YYYY-MM-DD
-    date = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%Y-%m-%d"
-    )
+            record_extraction(snapshot)
 
-    # Create a new variable called time and store the current time in the appropriate timezone in a 12-hour format without a leading zero
-    time = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%-I:%M %p"
-    )
+            index_capture(info, snapshot)
 
-    # Create a dataframe out of the centerpiece headlines and the top headlines.
-    latest_headlines_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_headline,
-            "Breaking 2": breaking2_headline,
-            "Just In": just_in_headline,
-            "CP": cp_headline,
-            "Tab 2": tab2_headline,
-            "Tab 3": tab3_headline,
-            "Tab 4": tab4_headline,
-            "Tab 5": tab5_headline,
-            "Tab 6": tab6_headline,
-            "Top 1": top1,
-            "Top 2": top2,
-            "Top 3": top3,
-            "Top 4": top4,
-            "Top 5": top5,
-        },
-        index=[0],
-    )
+            handle_spreadsheet_update(snapshot, market)
 
-    latest_urls_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_url,
-            "Breaking 2": breaking2_url,
-            "Just In": just_in_url,
-            "CP": cp_url,
-            "Tab 2": tab2_url,
-            "Tab 3": tab3_url,
-            "Tab 4": tab4_url,
-            "Tab 5": tab5_url,
-            "Tab 6": tab6_url,
-            "Top 1": top1_url,
-            "Top 2": top2_url,
-            "Top 3": top3_url,
-            "Top 4": top4_url,
-            "Top 5": top5_url,
-        },
-        index=[0],
-    )
+            if enricher:
+                enrich_market(enricher, info, snapshot)
+        except DeadlineExceeded as e:
+            # A slow market is cut off, and whatever it didn't write yet is skipped.
+            print(f"⏱️ Cut off {market}: {e}")
+            report.record("timed_out", error=str(e))
+        except Exception as e:
+            # One broken homepage shouldn't cost us the rest of the markets.
+            print(f"💥 Couldn't log {market}: {e!r}")
+            report.record("failed", error=repr(e))
 
-    latest_tab_order_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_order,
-            "Breaking 2": breaking2_order,
-            "Just In": just_in_order,
-            "CP": cp_order,
-            "Tab 2": tab2_order,
-            "Tab 3": tab3_order,
-            "Tab 4": tab4_order,
-            "Tab 5": tab5_order,
-            "Tab 6": tab6_order,
-            "Top 1": top_headline_order,
-            "Top 2": top_headline_order,
-            "Top 3": top_headline_order,
-            "Top 4": top_headline_order,
-            "Top 5": top_headline_order,
-        },
-        index=[0],
-    )
 
-    return latest_headlines_df, latest_urls_df, latest_tab_order_df
-
-    # # Print the headlines
-    # print(
-    #     f"""
-    # 📰 Breaking 1: {breaking1_headline}
-    # 📰 Breakinhg 2: {breaking2_headline}
-    # 📰 Just in: {just_in_headline}
-    # 📰 CP: {cp_headline}
-    # 📰 Tab 2: {tab2_headline}
-    # 📰 Tab 3: {tab3_headline}
-    # 📰 Tab 4: {tab4_headline}
-    # 📰 Tab 5: {tab5_headline}
-    # 📰 Tab 6: {tab6_headline}
-    # 📰 Headline 1: {top1}
-    # 📰 Headline 2: {top2}
-    # 📰 Headline 3: {top3}
-    # 📰 Headline 4: {top4}
-    # 📰 Headline 5: {top5}"""
-    # )
-
-    # # Print the tab order
-    # print(
-    #     f"""
-    #     🎌 Breaking 1 Order: {breaking1_order}
-    #     🎌 Breaking 2 Order: {breaking2_order}
-    #     🎌 Just In Order: {just_in_order}
-    #     🎌 CP Order: {cp_order}
-    #     🎌 Tab 2 Order: {tab2_order}
-    #     🎌 Tab 3 Order: {tab3_order}
-    #     🎌 Tab 4 Order: {tab4_order}
-    #     🎌 Tab 5 Order: {tab5_order}
-    #     🎌 Tab 6 Order: {tab6_order}
-    #     🎌 Top Headlines Order: {top_headline_order}
-    #       """
-    # )
-
-    # # Print out all the headlines
-    # print(
-    #     f"""
-    #     🔗 Breaking 1 URL: {breaking1_url}
-    #     🔗 Breaking 2 URL: {breaking2_url}
-    #     🔗 Just In URL: {just_in_url}
-    #     🔗 CP URL: {cp_url}
-    #     🔗 Tab 2 URL: {tab2_url}
-    #     🔗 Tab 3 URL: {tab3_url}
-    #     🔗 Tab 4 URL: {tab4_url}
-    #     🔗 Tab 5 URL: {tab5_url}
-    #     🔗 Tab 6 URL: {tab6_url}
-    #     🔗 Top 1 URL: {top1_url}
-    #     🔗 Top 2 URL: {top2_url}
-    #     🔗 Top 3 URL: {top3_url}
-    #     🔗 Top 4 URL: {top4_url}
-    #     🔗 Top 5 URL: {top5_url}
-    #     """
-    # )
-
-
-def get_connnecticut_insider_headlines():
+def parse_args():
     """
-    This function scrapes the Connecticut Insider homepage
+    This function reads the command line options.
     """
-    market_url = "https://www.ctinsider.com"
-    wcm_url = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
-
-    # Get the HTML content of the Houston Chronicle homepage
-    soup = getSoup(market_url)
-
-    ## --- CENTERPIECE HEADLINES --- ##
-
-    # Find all the divs with a class of "centerpiece-tab--main-headline"
-    cp_headlines = soup.find_all("div", class_="centerpiece-tab--main-headline")
-
-    # We extract the text from the headlines and strip the whitespace.
-    cp_headline = cp_headlines[0].text.strip()
-    tab2_headline = cp_headlines[1].text.strip()
-    tab3_headline = cp_headlines[2].text.strip()
-    tab4_headline = cp_headlines[3].text.strip()
-    tab5_headline = cp_headlines[4].text.strip()
-    tab6_headline = cp_headlines[5].text.strip()
-
-    # We extract the URLs from the headlines and strip the whitespace. The href is in the a tag, so we need to use a for loop to extract the URLs.
-    cp_url = remove_duplicate_prefix(
-        market_url + cp_headlines[0].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    # Subcommands have a --market of their own, so --market can't be taken for --markets or --market-timeout.
+    parser = argparse.ArgumentParser(
+        description="Log what headlines are where on Hearst newspaper home pages.",
+        allow_abbrev=False,
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Wrap every market in cProfile and write a .pstats file per market to DIR.",
+    )
+    parser.add_argument(
+        "--trace-malloc",
+        metavar="DIR",
+        help="Trace memory with tracemalloc and write the peak and top allocation sites per stage to DIR.",
+    )
+    parser.add_argument(
+        "--metrics-textfile",
+        metavar="PATH",
+        default=METRICS_TEXTFILE,
+        help="Where to write the Prometheus textfile with the run's metrics.",
+    )
+    parser.add_argument(
+        "--markets",
+        metavar="PATH",
+        help="Read the markets and their layout templates from PATH instead of markets.json.",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="Only log the markets in shard I of N (for example 2/4), so several workers can split the list.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=50 * 60,
+        metavar="SECONDS",
+        help="How long the whole run can take. Markets that aren't done by then are cut off.",
+    )
+    parser.add_argument(
+        "--market-timeout",
+        type=float,
+        default=5 * 60,
+        metavar="SECONDS",
+        help="How long a single market can take before it's cut off.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="How many markets to log at once.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Parse homepages as they download and stop as soon as every zone we track is in.",
+    )
+    parser.add_argument(
+        "--no-enrich",
+        action="store_true",
+        help="Don't fetch the byline, section, publish time and paywall status of new stories.",
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser(
+        "feeds",
+        help="Only collect the markets' RSS/Atom feeds, which is cheap enough to run between homepage scrapes.",
+    )
+    dwell_parser = subparsers.add_parser(
+        "dwell",
+        help="Show how long a story was on the homepage, and in which slots.",
+    )
+    dwell_parser.add_argument("url")
+    dwell_parser.add_argument("--market", help="Only show this market.")
+    search_parser = subparsers.add_parser(
+        "search",
+        help="Search every headline we've captured, for example: search '\"city council\" AND budget'.",
+    )
+    search_parser.add_argument("query", help="An SQLite FTS5 query.")
+    search_parser.add_argument("--market", help="Only search this market.")
+    search_parser.add_argument(
+        "--slot", help="Only search this slot, like CP or \"Top 1\"."
+    )
+    search_parser.add_argument(
+        "--since", metavar="DATE", help="Only search captures from DATE on (YYYY-MM-DD)."
+    )
+    search_parser.add_argument(
+        "--until", metavar="DATE", help="Only search captures before DATE (YYYY-MM-DD)."
+    )
+    search_parser.add_argument(
+        "--limit", type=int, default=50, help="How many stories to show."
+    )
+    syndication_parser = subparsers.add_parser(
+        "syndication", help="Show the stories that ran on more than one market."
+    )
+    syndication_parser.add_argument("--market", help="Only show this market's stories.")
+    syndication_parser.add_argument(
+        "--since", metavar="DATE", help="Only show stories first seen from DATE on."
+    )
+    syndication_parser.add_argument(
+        "--limit", type=int, default=50, help="How many stories to show."
+    )
+    cluster_parser = subparsers.add_parser(
+        "cluster",
+        help="Show a story's headline rewrites and the near-duplicate headlines on other URLs and markets.",
+    )
+    cluster_parser.add_argument("url")
+    occupancy_parser = subparsers.add_parser(
+        "occupancy",
+        help="Show which URLs held a slot, hour by hour, and how often it changed hands.",
+    )
+    occupancy_parser.add_argument("market", help="The market's name, like \"San Antonio\".")
+    occupancy_parser.add_argument("slot", help="The slot, like CP or \"Top 1\".")
+    occupancy_parser.add_argument(
+        "--since", metavar="DATE", help="Start at DATE (YYYY-MM-DD, UTC)."
+    )
+    occupancy_parser.add_argument(
+        "--until", metavar="DATE", help="Stop before DATE (YYYY-MM-DD, UTC)."
+    )
+    analytics_parser = subparsers.add_parser(
+        "analytics",
+        help="Report dwell time, turnover, churn by hour of day and breaking news share per market and slot.",
+    )
+    analytics_parser.add_argument("--market", help="Only report this market.")
+    analytics_parser.add_argument(
+        "--since", metavar="DATE", help="Start at DATE (YYYY-MM-DD, the market's timezone)."
+    )
+    analytics_parser.add_argument(
+        "--until", metavar="DATE", help="Stop before DATE (YYYY-MM-DD, the market's timezone)."
+    )
+    rollups_parser = subparsers.add_parser(
+        "rollups",
+        help="Show a market's daily rollups and the stories that spent the longest on its homepage.",
+    )
+    rollups_parser.add_argument("market", help="The market's name, like \"San Antonio\".")
+    rollups_parser.add_argument(
+        "--since", metavar="DATE", help="Start at DATE (YYYY-MM-DD, the market's timezone)."
     )
-    tab2_url = remove_duplicate_prefix(
-        market_url + cp_headlines[1].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    collections_parser = subparsers.add_parser(
+        "collections",
+        help="Show which WCM collections fed a market's slots, or where a collection showed up.",
     )
-    tab3_url = remove_duplicate_prefix(
-        market_url + cp_headlines[2].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    collections_parser.add_argument("--market", help="Only show this market.")
+    collections_parser.add_argument("--slot", help="Only show this slot, like CP or \"Tab 3\".")
+    collections_parser.add_argument(
+        "--collection", type=int, metavar="ID", help="Only show this collection."
     )
-    tab4_url = remove_duplicate_prefix(
-        market_url + cp_headlines[3].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    collections_parser.add_argument(
+        "--since", metavar="DATE", help="Only show spans that lasted until DATE or later (UTC)."
     )
-    tab5_url = remove_duplicate_prefix(
-        market_url + cp_headlines[4].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    collections_parser.add_argument(
+        "--until", metavar="DATE", help="Only show spans that started before DATE (UTC)."
     )
-    tab6_url = remove_duplicate_prefix(
-        market_url + cp_headlines[5].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    migrate_parser = subparsers.add_parser(
+        "migrate",
+        help="Copy the history in the markets' spreadsheets into the store, a page of rows at a time. Resumes where it left off.",
     )
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_centerpiece_tab"
-    # Example: class="hide-rss-link hdnce-e hdnce-collection-105803-dynamic_centerpiece_tab"
-    cp_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_centerpiece_tab")
+    migrate_parser.add_argument("--market", help="Only migrate this market.")
+    migrate_parser.add_argument(
+        "--page-rows", type=int, default=PAGE_ROWS, help="How many rows to read per request."
     )
-
-    cp_tab_id_list = []
-    for tab in cp_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        cp_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    (
-        cp_order,
-        tab2_order,
-        tab3_order,
-        tab4_order,
-        tab5_order,
-        tab6_order,
-    ) = cp_tab_id_list
-
-    ## --- BREAKING NEWS --- ##
-
-    # Find all the headlines in the breaking news bar
-    breaking_headlines = soup.find_all("a", class_="breakingNow--item-headline")
-
-    # We extract the text from the breaking news headlines and strip the whitespace. There isn't always a breaking news bar, so we use a try/except block to handle the error.
-    try:
-        breaking1_headline = breaking_headlines[0].text.strip()
-        breaking1_url = remove_duplicate_prefix(
-            market + breaking_headlines[0]["href"], market_url
-        )
-    except:
-        breaking1_headline = None
-        breaking1_url = None
-    try:
-        breaking2_headline = breaking_headlines[1].text.strip()
-        breaking2_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[1]["href"], market_url
-        )
-    except:
-        breaking2_headline = None
-        breaking2_url = None
-    try:
-        just_in_headline = soup.find(
-            "a", {"class": "justNow--item-headline"}
-        ).text.strip()
-
-        just_in_url = (
-            f'{market_url}{soup.find("a", {"class": "justNow--item-headline"})["href"]}'
-        )
-    except:
-        just_in_headline = None
-        just_in_url = None
-
-    trending_now_bar = soup.find("section", class_="fourPack-breaking")
-
-    # Find all the headlines in the trending now bar
-    trending_headlines = trending_now_bar.find_all(
-        "a", class_="fourPack--item-headline"
-    )
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now_tab"
-    # Example: class="hdnce-collection-114722-dynamic_breaking_now_tab"
-    breaking_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now_tab")
-    )
-
-    breaking_tab_id_list = []
-    for tab in breaking_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        breaking_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    try:
-        breaking1_order = breaking_tab_id_list[0]
-    except:
-        breaking1_order = ""
-    try:
-        breaking2_order = breaking_tab_id_list[1]
-    except:
-        breaking2_order = ""
-
-    # Find the div on the page that has a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now" that resides inside of a div with an id of "zoneAL"
-    # Example: class="hdnce-collection-107158-dynamic_breaking_now"
-    try:
-        just_in_order = soup.find("div", id="zoneAL").find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now")
-        )
-        just_in_id = re.search(r"\d+", just_in_order["class"][2]).group()
-
-        just_in_order = f"{wcm_url}{just_in_id}"
-    except:
-        just_in_order = ""
-
-    # We extract the text from the trending now headlines and strip the whitespace.
-    try:
-        trending1_headline = trending_headlines[0].text.strip()
-        trending1_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[0]["href"].replace("?src=ctipromostrip", ""),
-            market_url,
-        )
-    except:
-        trending1_headline = None
-        trending1_url = None
-    try:
-        trending2_headline = trending_headlines[1].text.strip()
-        trending2_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[1]["href"].replace("?src=ctipromostrip", ""),
-            market_url,
-        )
-    except:
-        trending2_headline = None
-        trending2_url = None
-    try:
-        trending3_headline = trending_headlines[2].text.strip()
-        trending3_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[2]["href"].replace("?src=ctipromostrip", ""),
-            market_url,
-        )
-    except:
-        trending3_headline = None
-        trending3_url = None
-    try:
-        trending4_headline = trending_headlines[3].text.strip()
-        trending4_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[2]["href"].replace("?src=ctipromostrip", ""),
-            market_url,
-        )
-    except:
-        trending4_headline = None
-        trending4_url = None
-    try:
-        # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-        # Example: class="hdnce-collection-105799-dynamic_headline_list"
-        trending_order = soup.find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_four_pack")
-        )
-
-        top_headline_id = re.search(r"\d+", trending_order["class"][2]).group()
-
-        trending_order = f"{wcm_url}{top_headline_id}"
-    except:
-        trending_order = ""
-
-    ## --- TOP HEADLINES --- ##
-
-    # Find the top headlines list and extract the text from the headlines, stripping the whitespace.
-    top_headlines_list = soup.find("ul", class_="coreHeadlineList--items")
-
-    headline_list = top_headlines_list.find_all(
-        "div", class_="coreHeadlineList--item-headline"
+    migrate_parser.add_argument(
+        "--export",
+        action="store_true",
+        help="Then write the migrated captures into the Parquet archive.",
     )
-
-    top1 = headline_list[0].text.strip()
-    top2 = headline_list[1].text.strip()
-    top3 = headline_list[2].text.strip()
-    top4 = headline_list[3].text.strip()
-    top5 = headline_list[4].text.strip()
-
-    top1_url = remove_duplicate_prefix(
-        market_url + headline_list[0].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    synthetic_parser = subparsers.add_parser(
+        "synthetic",
+        help="Serve synthetic homepages locally, or benchmark fetching and parsing them, for load testing.",
     )
-    top2_url = remove_duplicate_prefix(
-        market_url + headline_list[1].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    synthetic_parser.add_argument(
+        "action",
+        choices=["serve", "bench"],
+        help="serve the homepages until stopped, or bench the scraper against them.",
     )
-    top3_url = remove_duplicate_prefix(
-        market_url + headline_list[2].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    synthetic_parser.add_argument(
+        "--count", type=int, default=60, help="How many synthetic markets to make up."
     )
-    top4_url = remove_duplicate_prefix(
-        market_url + headline_list[3].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    synthetic_parser.add_argument(
+        "--size", type=int, default=500_000, help="About how many bytes every homepage is."
     )
-    top5_url = remove_duplicate_prefix(
-        market_url + headline_list[4].find("a")["href"].replace("?src=ctipdensecp", ""),
-        market_url,
+    synthetic_parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.2,
+        metavar="SECONDS",
+        help="How long a homepage takes to start coming back, give or take half of it.",
     )
-
-    # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-    # Example: class="hdnce-collection-105799-dynamic_headline_list"
-    top_headline_order = soup.find(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_headline_list")
+    synthetic_parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="The share of requests that fail with a 503, from 0 to 1.",
     )
-
-    top_headline_id = re.search(r"\d+", top_headline_order["class"][2]).group()
-
-    top_headline_order = f"{wcm_url}{top_headline_id}"
-
-    # Create a new variable called date and store the current date in the following format: YYYY-MM-DD
-    date = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%Y-%m-%d"
+    synthetic_parser.add_argument(
+        "--port", type=int, default=8000, help="The port to serve on (bench picks a free one)."
     )
-
-    # Create a new variable called time and store the current time in the appropriate timezone in a 12-hour format without a leading zero
-    time = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%-I:%M %p"
+    synthetic_parser.add_argument(
+        "--registry-out",
+        metavar="PATH",
+        default="synthetic_markets.json",
+        help="Where to write the synthetic markets, for --markets.",
     )
-
-    # Create a dataframe out of the centerpiece headlines and the top headlines.
-    latest_headlines_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_headline,
-            "Breaking 2": breaking2_headline,
-            "Just In": just_in_headline,
-            "Trending 1": trending1_headline,
-            "Trending 2": trending2_headline,
-            "Trending 3": trending3_headline,
-            "Trending 4": trending4_headline,
-            "CP": cp_headline,
-            "Tab 2": tab2_headline,
-            "Tab 3": tab3_headline,
-            "Tab 4": tab4_headline,
-            "Tab 5": tab5_headline,
-            "Tab 6": tab6_headline,
-            "Top 1": top1,
-            "Top 2": top2,
-            "Top 3": top3,
-            "Top 4": top4,
-            "Top 5": top5,
-        },
-        index=[0],
+    subparsers.add_parser(
+        "compact",
+        help="Compact every month of the Parquet archive into one file per market, however few captures it has.",
     )
-
-    latest_urls_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_url,
-            "Breaking 2": breaking2_url,
-            "Just In": just_in_url,
-            "Trending 1": trending1_url,
-            "Trending 2": trending2_url,
-            "Trending 3": trending3_url,
-            "Trending 4": trending4_url,
-            "CP": cp_url,
-            "Tab 2": tab2_url,
-            "Tab 3": tab3_url,
-            "Tab 4": tab4_url,
-            "Tab 5": tab5_url,
-            "Tab 6": tab6_url,
-            "Top 1": top1_url,
-            "Top 2": top2_url,
-            "Top 3": top3_url,
-            "Top 4": top4_url,
-            "Top 5": top5_url,
-        },
-        index=[0],
+    rebuild_parser = subparsers.add_parser(
+        "rebuild",
+        help="Rebuild the indexes and the Parquet archive in store/ from the captures in data/captures.",
     )
-
-    latest_tab_order_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_order,
-            "Breaking 2": breaking2_order,
-            "Just In": just_in_order,
-            "Trending 1": trending_order,
-            "Trending 2": trending_order,
-            "Trending 3": trending_order,
-            "Trending 4": trending_order,
-            "CP": cp_order,
-            "Tab 2": tab2_order,
-            "Tab 3": tab3_order,
-            "Tab 4": tab4_order,
-            "Tab 5": tab5_order,
-            "Tab 6": tab6_order,
-            "Top 1": top_headline_order,
-            "Top 2": top_headline_order,
-            "Top 3": top_headline_order,
-            "Top 4": top_headline_order,
-            "Top 5": top_headline_order,
-        },
-        index=[0],
+    rebuild_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Throw away the indexes and the archive that are already there and start over.",
     )
+    return parser.parse_args()
 
-    return latest_headlines_df, latest_urls_df, latest_tab_order_df
 
-
-def get_connnecticut_post_headlines():
+def run_feeds(args):
     """
-    This function scrapes the Connecticut post homepage
+    This function collects the new entries of every market's feeds. It doesn't touch the spreadsheets.
     """
-    market_url = "https://www.ctpost.com"
-    wcm_url = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
-
-    # Get the HTML content of the Houston Chronicle homepage
-    soup = getSoup(market_url)
-
-    ## --- CENTERPIECE HEADLINES --- ##
-
-    # Find all the divs with a class of "centerpiece-tab--main-headline"
-    cp_headlines = soup.find_all("div", class_="centerpiece-tab--main-headline")
-
-    # We extract the text from the headlines and strip the whitespace.
-    cp_headline = cp_headlines[0].text.strip()
-    tab2_headline = cp_headlines[1].text.strip()
-    tab3_headline = cp_headlines[2].text.strip()
-    tab4_headline = cp_headlines[3].text.strip()
-    tab5_headline = cp_headlines[4].text.strip()
-    tab6_headline = cp_headlines[5].text.strip()
-
-    # We extract the URLs from the headlines and strip the whitespace. The href is in the a tag, so we need to use a for loop to extract the URLs.
-    cp_url = remove_duplicate_prefix(
-        market_url + cp_headlines[0].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    tab2_url = remove_duplicate_prefix(
-        market_url + cp_headlines[1].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    tab3_url = remove_duplicate_prefix(
-        market_url + cp_headlines[2].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    tab4_url = remove_duplicate_prefix(
-        market_url + cp_headlines[3].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    tab5_url = remove_duplicate_prefix(
-        market_url + cp_headlines[4].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-
-    tab6_url = remove_duplicate_prefix(
-        market_url + cp_headlines[5].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_centerpiece_tab"
-    # Example: class="hide-rss-link hdnce-e hdnce-collection-105803-dynamic_centerpiece_tab"
-    cp_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_centerpiece_tab")
-    )
-
-    cp_tab_id_list = []
-    for tab in cp_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        cp_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    (
-        cp_order,
-        tab2_order,
-        tab3_order,
-        tab4_order,
-        tab5_order,
-        tab6_order,
-    ) = cp_tab_id_list
-
-    ## --- BREAKING NEWS --- ##
-
-    # Find all the headlines in the breaking news bar
-    breaking_headlines = soup.find_all("a", class_="breakingNow--item-headline")
-
-    # We extract the text from the breaking news headlines and strip the whitespace. There isn't always a breaking news bar, so we use a try/except block to handle the error.
-    try:
-        breaking1_headline = breaking_headlines[0].text.strip()
-        breaking1_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[0]["href"], market_url
-        )
-    except:
-        breaking1_headline = None
-        breaking1_url = None
-    try:
-        breaking2_headline = breaking_headlines[1].text.strip()
-        breaking2_url = remove_duplicate_prefix(
-            market_url + breaking_headlines[1]["href"], market_url
-        )
-    except:
-        breaking2_headline = None
-        breaking2_url = None
-    try:
-        just_in_headline = soup.find(
-            "a", {"class": "justNow--item-headline"}
-        ).text.strip()
-
-        just_in_url = (
-            f'{market_url}{soup.find("a", {"class": "justNow--item-headline"})["href"]}'
-        )
-    except:
-        just_in_headline = None
-        just_in_url = None
-
-    trending_now_bar = soup.find("section", class_="fourPack-breaking")
-
-    # Find all the headlines in the trending now bar
-    trending_headlines = trending_now_bar.find_all(
-        "a", class_="fourPack--item-headline"
-    )
-
-    # Find all the divs on the page that have a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now_tab"
-    # Example: class="hdnce-collection-114722-dynamic_breaking_now_tab"
-    breaking_tabs = soup.find_all(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now_tab")
-    )
-
-    breaking_tab_id_list = []
-    for tab in breaking_tabs:
-        # Get the string of digits in the collection
-        # Example input: hdnce-collection-111490-dynamic_centerpiece_tab
-        # Example output: 111490
-        tab_id = re.search(r"\d+", tab["class"][2]).group()
-        breaking_tab_id_list.append(f"{wcm_url}{tab_id}")
-
-    try:
-        breaking1_order = breaking_tab_id_list[0]
-    except:
-        breaking1_order = ""
-    try:
-        breaking2_order = breaking_tab_id_list[1]
-    except:
-        breaking2_order = ""
-
-    # Find the div on the page that has a class that contains the strings "hdnce-collection-" AND "-dynamic_breaking_now" that resides inside of a div with an id of "zoneAL"
-    # Example: class="hdnce-collection-107158-dynamic_breaking_now"
-    try:
-        just_in_order = soup.find("div", id="zoneAL").find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_breaking_now")
-        )
-        just_in_id = re.search(r"\d+", just_in_order["class"][2]).group()
-
-        just_in_order = f"{wcm_url}{just_in_id}"
-    except:
-        just_in_order = ""
-
-    # We extract the text from the trending now headlines and strip the whitespace.
-    try:
-        trending1_headline = trending_headlines[0].text.strip()
-        trending1_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[0]["href"].replace("?src=rdctppromostrip", ""),
-            market_url,
-        )
-    except:
-        trending1_headline = None
-        trending1_url = None
-    try:
-        trending2_headline = trending_headlines[1].text.strip()
-        trending2_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[1]["href"].replace("?src=rdctppromostrip", ""),
-            market_url,
-        )
-    except:
-        trending2_headline = None
-        trending2_url = None
-    try:
-        trending3_headline = trending_headlines[2].text.strip()
-        trending3_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[2]["href"].replace("?src=rdctppromostrip", ""),
-            market_url,
-        )
-    except:
-        trending3_headline = None
-        trending3_url = None
     try:
-        trending4_headline = trending_headlines[3].text.strip()
-        trending4_url = remove_duplicate_prefix(
-            market_url
-            + trending_headlines[3]["href"].replace("?src=rdctppromostrip", ""),
-            market_url,
+        collect_feeds(
+            select_shard(markets, args.shard),
+            rate_limiter,
+            report,
+            headers={"x-px-access-token": ACCESS_TOKEN},
+            workers=args.workers,
         )
-    except:
-        trending4_headline = None
-        trending4_url = None
-    try:
-        # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-        # Example: class="hdnce-collection-105799-dynamic_headline_list"
-        trending_order = soup.find(
-            "div", class_=re.compile("hdnce-collection-.*-dynamic_four_pack")
-        )
-
-        top_headline_id = re.search(r"\d+", trending_order["class"][2]).group()
-
-        trending_order = f"{wcm_url}{top_headline_id}"
-    except:
-        trending_order = ""
-
-    ## --- TOP HEADLINES --- ##
-
-    # Find the top headlines list and extract the text from the headlines, stripping the whitespace.
-    top_headlines_list = soup.find("ul", class_="coreHeadlineList--items")
-
-    headline_list = top_headlines_list.find_all(
-        "div", class_="coreHeadlineList--item-headline"
-    )
-
-    top1 = headline_list[0].text.strip()
-    top2 = headline_list[1].text.strip()
-    top3 = headline_list[2].text.strip()
-    top4 = headline_list[3].text.strip()
-    top5 = headline_list[4].text.strip()
-
-    top1_url = remove_duplicate_prefix(
-        market_url
-        + headline_list[0].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    top2_url = remove_duplicate_prefix(
-        market_url
-        + headline_list[1].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    top3_url = remove_duplicate_prefix(
-        market_url
-        + headline_list[2].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    top4_url = remove_duplicate_prefix(
-        market_url
-        + headline_list[3].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-    top5_url = remove_duplicate_prefix(
-        market_url
-        + headline_list[4].find("a")["href"].replace("?src=rdctpdensecp", ""),
-        market_url,
-    )
-
-    # Find the div on the page that has a class that contains the strings hdnce-collection" AND "-dynamic_headline_list"
-    # Example: class="hdnce-collection-105799-dynamic_headline_list"
-    top_headline_order = soup.find(
-        "div", class_=re.compile("hdnce-collection-.*-dynamic_headline_list")
-    )
-
-    top_headline_id = re.search(r"\d+", top_headline_order["class"][2]).group()
-
-    top_headline_order = f"{wcm_url}{top_headline_id}"
-
-    # Create a new variable called date and store the current date in the following format: YYYY-MM-DD
-    date = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%Y-%m-%d"
-    )
-
-    # Create a new variable called time and store the current time in the appropriate timezone in a 12-hour format without a leading zero
-    time = datetime.now(pytz.timezone(markets["San Antonio"]["timezone"])).strftime(
-        "%-I:%M %p"
-    )
-
-    # Create a dataframe out of the centerpiece headlines and the top headlines.
-    latest_headlines_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_headline,
-            "Breaking 2": breaking2_headline,
-            "Just In": just_in_headline,
-            "Trending 1": trending1_headline,
-            "Trending 2": trending2_headline,
-            "Trending 3": trending3_headline,
-            "Trending 4": trending4_headline,
-            "CP": cp_headline,
-            "Tab 2": tab2_headline,
-            "Tab 3": tab3_headline,
-            "Tab 4": tab4_headline,
-            "Tab 5": tab5_headline,
-            "Tab 6": tab6_headline,
-            "Top 1": top1,
-            "Top 2": top2,
-            "Top 3": top3,
-            "Top 4": top4,
-            "Top 5": top5,
-        },
-        index=[0],
-    )
-
-    latest_urls_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_url,
-            "Breaking 2": breaking2_url,
-            "Just In": just_in_url,
-            "Trending 1": trending1_url,
-            "Trending 2": trending2_url,
-            "Trending 3": trending3_url,
-            "Trending 4": trending4_url,
-            "CP": cp_url,
-            "Tab 2": tab2_url,
-            "Tab 3": tab3_url,
-            "Tab 4": tab4_url,
-            "Tab 5": tab5_url,
-            "Tab 6": tab6_url,
-            "Top 1": top1_url,
-            "Top 2": top2_url,
-            "Top 3": top3_url,
-            "Top 4": top4_url,
-            "Top 5": top5_url,
-        },
-        index=[0],
-    )
-
-    latest_tab_order_df = pd.DataFrame(
-        {
-            "Date": date,
-            "Time": time,
-            "Breaking 1": breaking1_order,
-            "Breaking 2": breaking2_order,
-            "Just In": just_in_order,
-            "Trending 1": trending_order,
-            "Trending 2": trending_order,
-            "Trending 3": trending_order,
-            "Trending 4": trending_order,
-            "CP": cp_order,
-            "Tab 2": tab2_order,
-            "Tab 3": tab3_order,
-            "Tab 4": tab4_order,
-            "Tab 5": tab5_order,
-            "Tab 6": tab6_order,
-            "Top 1": top_headline_order,
-            "Top 2": top_headline_order,
-            "Top 3": top_headline_order,
-            "Top 4": top_headline_order,
-            "Top 5": top_headline_order,
-        },
-        index=[0],
-    )
-
-    return latest_headlines_df, latest_urls_df, latest_tab_order_df
+    finally:
+        report.write_jsonl()
+        write_metrics(report, textfile=args.metrics_textfile)
 
 
-def handle_spreadsheet_update(
-    latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-):
+def run_migrate(args):
     """
-    This function handles updating the market's spreadsheet with the new data.
+    This function copies the markets' spreadsheets into the store, and into the archive if asked to.
     """
-    market_spreadsheet_url = markets[market]["spreadsheet"]
-
-    # Open the spreadsheet by its URL using gspread
-    sh = gc.open_by_url(market_spreadsheet_url)
-
-    # In one go, I want to store the first, second and third sheets in the spreadsheet in three separate dataframes
-    # The names of the sheets are "Headline log", "URL log" and "Tab order log"
-    historic_headline_log_df, historic_url_log_df, historic_tab_url_log_df = (
-        pd.DataFrame(),
-        pd.DataFrame(),
-        pd.DataFrame(),
-    )
-
-    # We loop through the sheets in the spreadsheet
-    for sheet in sh.worksheets():
-        # If the sheet is called "Headline log"
-        if sheet.title == "Headline log":
-            # We store the sheet in the historic_headline_log_df dataframe
-            historic_headline_log_df = pd.DataFrame(sheet.get_all_records())
-        # If the sheet is called "URL log"
-        elif sheet.title == "URL log":
-            # We store the sheet in the historic_url_log_df dataframe
-            historic_url_log_df = pd.DataFrame(sheet.get_all_records())
-        # If the sheet is called "Tab order log"
-        elif sheet.title == "Tab order log":
-            # We store the sheet in the historic_tab_url_log_df dataframe
-            historic_tab_url_log_df = pd.DataFrame(sheet.get_all_records())
-
-    # Concatenate the latest dataframes with the historic dataframes.
-    # The latest dataframes are first in the list so they will be on top
-    # The historic dataframes are second in the list so they will be on the bottom
-    updated_headline_log_df = pd.concat([latest_headlines_df, historic_headline_log_df])
-
-    updated_url_log_df = pd.concat([latest_urls_df, historic_url_log_df])
-
-    updated_tab_url_log_df = pd.concat([latest_tab_order_df, historic_tab_url_log_df])
-
-    print("Setting the headline log")
-    # Now we write the dataframes to the spreadsheet using the set_with_dataframe method
-    set_with_dataframe(
-        sh.worksheet("Headline log"), updated_headline_log_df, include_index=False
-    )
-
-    print("Setting the URL log")
-    set_with_dataframe(sh.worksheet("URL log"), updated_url_log_df, include_index=False)
-
-    print("Setting the tab order log")
-    set_with_dataframe(
-        sh.worksheet("Tab order log"), updated_tab_url_log_df, include_index=False
-    )
-
-
-# We loop through the markets dictionary
-for market, info in markets.items():
-    print(f"🏙️ Logging headlines for {market}...")
-    if market == "San Antonio":
-        print("--- San Antonio Express-News ---")
-        print("📰 Scraping homepage...")
-        # We call the function that scrapes the San Antonio Express-News homepage
-        (
-            latest_headlines_df,
-            latest_urls_df,
-            latest_tab_order_df,
-        ) = get_san_antonio_headlines()
-
-        # api_call_handler(
-        #     handle_spreadsheet_update(
-        #         latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-        #     )
-        # )
-        handle_spreadsheet_update(
-            latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-        )
-
-    elif market == "Houston":
-        print("--- Houston Chronicle ---")
-        # We call the function that scrapes the Houston Chronicle homepage
-        (
-            latest_headlines_df,
-            latest_urls_df,
-            latest_tab_order_df,
-        ) = get_houston_headlines()
-
-        handle_spreadsheet_update(
-            latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-        )
-
-    elif market == "Albany":
-        print("--- Albany Times Union ---")
-        # We call the function that scrapes the Albany Times Union homepage
-        (
-            latest_headlines_df,
-            latest_urls_df,
-            latest_tab_order_df,
-        ) = get_albany_headlines()
-
-        handle_spreadsheet_update(
-            latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-        )
-    elif market == "San Francisco":
-        print("--- San Francisco Chronicle ---")
+    selected = select_shard(markets, args.shard)
+    if args.market:
+        selected = {args.market: markets[args.market]}
+    try:
+        migrate(
+            gc,
+            selected,
+            api_call_handler,
+            report,
+            workers=args.workers,
+            page_rows=args.page_rows,
+        )
+        if args.export:
+            for info in selected.values():
+                print(f"🗄️ Archived {export_archive(info)} captures from {info['name']}")
+    finally:
+        report.write_jsonl()
+
+
+def run_rebuild(args):
+    """
+    This function replays every market's captures (which are committed) through the indexes and into the
+    Parquet archive, so a store that was lost, or was never there (on your own machine, say), can be rebuilt.
+    The change log and the dataset itself already have every capture, so they're left alone.
+    """
+    existing = [
+        path
+        for path in [store.STORE_PATH, f"{store.STORE_PATH}-wal", f"{store.STORE_PATH}-shm"]
+        if os.path.exists(path)
+    ]
+    if (existing or os.path.isdir(ARCHIVE_DIR)) and not args.force:
+        print(
+            f"🛑 {store.STORE_PATH} or {ARCHIVE_DIR} is already there. Replaying onto it would count "
+            "every capture twice, so pass --force to start over."
+        )
+        return
+    for path in existing:
+        os.remove(path)
+    if os.path.isdir(ARCHIVE_DIR):
+        shutil.rmtree(ARCHIVE_DIR)
+
+    # We replay the markets together, in capture order, like the hourly runs saw them.
+    def market_captures(position, name):
+        for snapshot in captures(markets[name]):
+            yield snapshot.captured_at, position, name, snapshot
+
+    replay = heapq.merge(
+        *[market_captures(*market) for market in enumerate(markets)],
+        key=lambda item: item[:2],
+    )
+    # The archive is written a month at a time, rather than in a small file per capture.
+    months, replayed, last = {}, 0, {}
+    for _, _, name, snapshot in replay:
+        info = markets[name]
+        report.start_market(name)
+        index_capture(info, snapshot, skip=("diff", "dataset", "archive"))
+        month, tables = months.setdefault(name, (snapshot.captured_at[:7], []))
+        if month != snapshot.captured_at[:7]:
+            write_compacted(info["slug"], tables)
+            tables = []
+            months[name] = (snapshot.captured_at[:7], tables)
+        tables.append(snapshot_table(snapshot))
+        last[name] = snapshot
+        replayed += 1
+        if replayed % 1000 == 0:
+            print(f"⏪ Replayed {replayed} captures")
+
+    for name, (_, tables) in months.items():
+        write_compacted(markets[name]["slug"], tables)
+    # The next run's change log picks up from each market's last capture.
+    for name, snapshot in last.items():
+        save_snapshot(
+            markets[name],
+            {"captured_at": snapshot.captured_at, "slots": snapshot.to_slots()},
+        )
+    print(f"✅ Rebuilt the store from {replayed} captures of {len(last)} markets")
+
+
+def run_synthetic(args):
+    """
+    This function serves the synthetic homepages, or benchmarks extracting every synthetic market
+    from them the way a real run does (without the indexes or the spreadsheets).
+    """
+    global markets, rate_limiter
+    server = SyntheticServer(
+        args.port if args.action == "serve" else 0,
+        size=args.size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+    )
+    write_registry(synthetic_registry(args.count, server.url), args.registry_out)
+    markets = load_markets(args.registry_out)
+    rate_limiter = RateLimiter(load_rate_limits(args.registry_out))
+    server.add_markets(markets)
+
+    if args.action == "serve":
+        print(f"🧪 Serving {len(markets)} synthetic homepages at {server.url}")
+        print(f"🗺️ Their registry is in {args.registry_out}, for --markets")
+        server.serve_forever()
+        return
+
+    server.start()
+
+    def extract(info):
+        report.start_market(info["name"])
+        start = time.perf_counter()
+        with deadlines.scope(Deadline(args.market_timeout, label="market deadline")):
+            try:
+                with report.stage("extract"):
+                    record_extraction(get_headlines(info, args.stream))
+                return time.perf_counter() - start
+            except Exception as e:
+                report.record("failed", error=repr(e))
+                return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        timings = list(executor.map(extract, markets.values()))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    done = sorted(timing for timing in timings if timing is not None)
+    fetched = sum(
+        record.get("bytes", 0) for record in report.records if record["stage"] == "fetch"
+    )
+    print(
+        f"🏁 Extracted {len(done)} of {len(markets)} markets in {elapsed:.2f}s "
+        f"({len(done) / elapsed:.1f} markets/s) with {args.workers} workers"
+    )
+    if done:
+        print(
+            f"⏱️ Per market: median {done[len(done) // 2]:.3f}s, "
+            f"p95 {done[min(int(len(done) * 0.95), len(done) - 1)]:.3f}s, "
+            f"max {done[-1]:.3f}s"
+        )
+    print(f"📦 Read {fetched / 1e6:.1f} MB{' (streamed)' if args.stream else ''}")
+
+
+def main():
+    global gc, markets, rate_limiter
+    args = parse_args()
+    if args.markets:
+        markets = load_markets(args.markets)
+        rate_limiter = RateLimiter(load_rate_limits(args.markets))
+
+    if args.command == "feeds":
+        return run_feeds(args)
+    if args.command == "dwell":
+        return print_dwell(args.url, args.market)
+    if args.command == "search":
+        return print_search(
+            args.query,
+            market=args.market,
+            slot=args.slot,
+            since=args.since,
+            until=args.until,
+            limit=args.limit,
+        )
+    if args.command == "syndication":
+        return print_syndication(market=args.market, since=args.since, limit=args.limit)
+    if args.command == "cluster":
+        return print_cluster(args.url)
+    if args.command == "occupancy":
+        return print_occupancy(markets[args.market], args.slot, args.since, args.until)
+    if args.command == "analytics":
+        return analytics.print_report(
+            {args.market: markets[args.market]} if args.market else markets,
+            since=args.since,
+            until=args.until,
+        )
+    if args.command == "rollups":
+        return print_rollups(args.market, args.since)
+    if args.command == "collections":
+        return print_collection_spans(
+            market=args.market,
+            slot=args.slot,
+            collection_id=args.collection,
+            since=args.since,
+            until=args.until,
+        )
+    if args.command == "synthetic":
+        return run_synthetic(args)
+    if args.command == "rebuild":
+        return run_rebuild(args)
+    if args.command == "compact":
+        print(f"🗜️ Compacted {compact(min_parts=1)} files")
+        return
+
+    # Create a temporary json file based on the SERVICE_ACCOUNT env variable
+    with open("service_account.json", "w") as f:
+        f.write(SERVICE_ACCOUNT)
+
+    # We authenticate with Google using the service account json we created earlier.
+    # Every request it makes waits its turn with the Sheets API's rate limiter.
+    gc = gspread.service_account(
+        filename="service_account.json", client_factory=RateLimitedClient
+    )
+
+    if args.command == "migrate":
         try:
-            # We call the function that scrapes the San Francisco Chronicle homepage
-            (
-                latest_headlines_df,
-                latest_urls_df,
-                latest_tab_order_df,
-            ) = get_san_francisco_headlines()
-
-            handle_spreadsheet_update(
-                latest_headlines_df, latest_urls_df, latest_tab_order_df, market
+            return run_migrate(args)
+        finally:
+            # The hourly run's finally block doesn't cover us here, so we clean up the credentials ourselves.
+            os.remove("service_account.json")
+
+    profiler = Profiler(profile_dir=args.profile, trace_malloc_dir=args.trace_malloc)
+    profiler.start()
+    report.listeners.append(profiler)
+
+    # cProfile can only profile one thread at a time, and tracemalloc sees every thread's allocations,
+    # so profiled and memory-traced runs log one market at a time.
+    workers = 1 if args.profile or args.trace_malloc else args.workers
+
+    # We log the markets at once. The rate limiter keeps every host (and the Sheets API) within its limits.
+    # Every market gets its own deadline, and the whole run has one too, so one bad homepage can't eat the hour.
+    run_deadline = Deadline(args.deadline, label="run deadline")
+
+    # We only fetch the article pages of URLs that aren't in the article cache yet.
+    enricher = None
+    if not args.no_enrich:
+        enricher = ArticleEnricher(
+            rate_limiter, report, headers={"x-px-access-token": ACCESS_TOKEN}
+        )
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(
+                log_market,
+                market,
+                info,
+                profiler,
+                run_deadline,
+                args.market_timeout,
+                enricher,
+                args.stream,
+            ): market
+            for market, info in select_shard(markets, args.shard).items()
+        }
+        done, not_done = wait(futures, timeout=run_deadline.remaining())
+
+        # Whatever hasn't finished by the run's deadline is reported and left behind, and the rest is still written out.
+        for future in not_done:
+            future.cancel()
+            print(f"⏱️ Ran out of time before {futures[future]} was logged")
+            report.record(
+                "timed_out", market=futures[future], error="Hit the run deadline"
             )
-        except:
-            pass
-
-    elif market == "Connecticut Insider":
-        print("--- Connecticut Insider ---")
-        # We call the function that scrapes the Connecticut Insider homepage
-        (
-            latest_headlines_df,
-            latest_urls_df,
-            latest_tab_order_df,
-        ) = get_connnecticut_insider_headlines()
-
-        handle_spreadsheet_update(
-            latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-        )
-    elif market == "Connecticut Post":
-        print("--- Connecticut Post ---")
-        # We call the function that scrapes the Connecticut Post homepage
-        (
-            latest_headlines_df,
-            latest_urls_df,
-            latest_tab_order_df,
-        ) = get_connnecticut_post_headlines()
-
-        handle_spreadsheet_update(
-            latest_headlines_df, latest_urls_df, latest_tab_order_df, market
-        )
+        executor.shutdown(wait=False)
+
+        logged = [
+            record["market"] for record in report.records if record["stage"] == "captured"
+        ]
+        print(f"✅ Logged {len(logged)} of {len(futures)} markets")
+    finally:
+        # Compare the zone counts with the baseline before anything is written out.
+        check_drift(report, markets)
+        save_discovered_feeds(report, markets)
+        if enricher:
+            enricher.save()
+
+        # Months that piled up enough small Parquet files are compacted into one.
+        try:
+            compact()
+        except Exception as e:
+            print(f"🤦‍♂️ Couldn't compact the archive: {e!r}")
+
+        # Write the per-stage timings for this run and print a summary table.
+        # Markets cut off by the run deadline may still be going, so the report stops taking records first.
+        report.close()
+        report.write_jsonl()
+        print(report.summary_table())
+        write_metrics(report, textfile=args.metrics_textfile)
+        profiler.finish()
+
+        # Remove the temporary json file. We don't anyone to see our service account credentials!
+        os.remove("service_account.json")
 
-    time.sleep(70)
 
-# Remove the temporary json file. We don't anyone to see our service account credentials!
-os.remove("service_account.json")
+if __name__ == "__main__":
+    main()
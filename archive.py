@@ -0,0 +1,150 @@
+import glob
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# The three logs as Parquet, one row per slot per capture:
+# store/logs/market=<market>/year=<YYYY>/month=<MM>/*.parquet
+# Compaction rewrites whole files, so it lives in the store rather than in git, like the indexes.
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join("store", "logs"))
+
+# Every capture goes into a small file of its own. Once a month has this many, they're compacted into one.
+COMPACT_AFTER = 24
+
+COMPACTED_FILE = "compacted.parquet"
+
+_strings = pa.dictionary(pa.int32(), pa.string())
+
+# The headlines, URLs and so on repeat from hour to hour, so they're dictionary encoded,
+# in the files and in memory once they're loaded.
+SCHEMA = pa.schema(
+    [
+        ("captured_at", pa.timestamp("us", tz="UTC")),
+        ("date", _strings),
+        ("time", _strings),
+        ("slot", _strings),
+        ("position", pa.int16()),
+        ("headline", _strings),
+        ("url", _strings),
+        # Parquet dictionary encodes the collection IDs on disk too, but they load as plain integers (0 when a slot has none).
+        ("collection_id", pa.int64()),
+    ]
+)
+
+
+def partition_dir(market_slug, captured_at, archive_dir=ARCHIVE_DIR):
+    return os.path.join(
+        archive_dir,
+        f"market={market_slug}",
+        f"year={captured_at:%Y}",
+        f"month={captured_at:%m}",
+    )
+
+
+def snapshot_table(snapshot):
+    """
+    This function turns a Snapshot into a table with a row per slot.
+    """
+    slots = len(snapshot.slots)
+    captured_at = datetime.fromisoformat(snapshot.captured_at)
+    return pa.table(
+        {
+            "captured_at": pa.array([captured_at] * slots, pa.timestamp("us", tz="UTC")),
+            "date": pa.array([snapshot.date] * slots).dictionary_encode(),
+            "time": pa.array([snapshot.time] * slots).dictionary_encode(),
+            "slot": pa.array(snapshot.slots, pa.string()).dictionary_encode(),
+            "position": pa.array(range(slots), pa.int16()),
+            "headline": pa.array(snapshot.headlines, pa.string()).dictionary_encode(),
+            "url": pa.array(snapshot.urls, pa.string()).dictionary_encode(),
+            "collection_id": pa.array(snapshot.collections, pa.int64()),
+        },
+        schema=SCHEMA,
+    )
+
+
+def _write(table, path):
+    # We write to a hidden temporary file first, so a half-written file never ends up in the archive.
+    directory, name = os.path.split(path)
+    temporary = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, temporary, compression="zstd", use_dictionary=True)
+    os.replace(temporary, path)
+
+
+def append_snapshot(market, snapshot, archive_dir=ARCHIVE_DIR):
+    """
+    This function writes a capture to its own small file in its market's month.
+    """
+    captured_at = datetime.fromisoformat(snapshot.captured_at)
+    directory = partition_dir(market["slug"], captured_at, archive_dir)
+    os.makedirs(directory, exist_ok=True)
+    _write(
+        snapshot_table(snapshot),
+        os.path.join(directory, f"part-{captured_at:%Y%m%dT%H%M%S}.parquet"),
+    )
+    return directory
+
+
+def write_compacted(market_slug, tables, archive_dir=ARCHIVE_DIR):
+    """
+    This function writes a month of a market's captures (as snapshot tables, in capture order) straight
+    into the month's compacted file, which is how a rebuild fills the archive.
+    """
+    directory = partition_dir(market_slug, tables[0]["captured_at"][0].as_py(), archive_dir)
+    os.makedirs(directory, exist_ok=True)
+    _write(
+        pa.concat_tables(tables).unify_dictionaries().combine_chunks(),
+        os.path.join(directory, COMPACTED_FILE),
+    )
+    return directory
+
+
+def compact_partition(directory):
+    """
+    This function merges a month's small files (and what it had already compacted) into one file, in capture order.
+    """
+    parts = sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+    if not parts:
+        return 0
+    files = parts
+    compacted = os.path.join(directory, COMPACTED_FILE)
+    if os.path.exists(compacted):
+        files = [compacted] + parts
+
+    table = pa.concat_tables(pq.read_table(path, schema=SCHEMA) for path in files)
+    table = table.unify_dictionaries().combine_chunks()
+    table = table.take(
+        pc.sort_indices(
+            table, sort_keys=[("captured_at", "ascending"), ("position", "ascending")]
+        )
+    )
+    _write(table, compacted)
+    for path in parts:
+        os.remove(path)
+    return len(parts)
+
+
+def compact(archive_dir=ARCHIVE_DIR, min_parts=COMPACT_AFTER):
+    """
+    This function compacts every month that has piled up at least min_parts small files.
+    """
+    compacted = 0
+    partitions = glob.glob(os.path.join(archive_dir, "market=*", "year=*", "month=*"))
+    for directory in sorted(partitions):
+        if len(glob.glob(os.path.join(directory, "part-*.parquet"))) >= min_parts:
+            compacted += compact_partition(directory)
+    return compacted
+
+
+def load_logs(market_slug=None, archive_dir=ARCHIVE_DIR, columns=None):
+    """
+    This function loads the archive into a DataFrame, with a row per slot per capture.
+    The repeated strings come back as categoricals, so years of captures fit in little memory.
+    Example: load_logs("san-antonio").pivot(index="captured_at", columns="slot", values="headline")
+    """
+    filters = [("market", "=", market_slug)] if market_slug else None
+    return pq.read_table(
+        archive_dir, columns=columns, filters=filters, partitioning="hive"
+    ).to_pandas()
@@ -0,0 +1,282 @@
+import hashlib
+import random
+from array import array
+from contextlib import closing
+
+import store
+from syndication import MIN_HEADLINE_WORDS, normalize_headline
+
+# A MinHash signature is this many hashes, split into bands of BAND_SIZE hashes for LSH.
+# Headlines whose signatures share a band are compared, and they're near-duplicates if about
+# half their words (or more) are the same. With 32 bands of 4, two headlines that share half
+# their words are compared 87% of the time (and 99% at 60%), but two that only share one word
+# in ten almost never are, so a new headline is compared with a handful of others, not a slice of the corpus.
+SIGNATURE_SIZE = 128
+BAND_SIZE = 4
+MIN_SIMILARITY = 0.5
+
+# Words every other headline has. We sign a headline without them, or "the" and "to" alone would put
+# unrelated headlines in the same buckets.
+STOPWORDS = frozenset(
+    """
+    a about after against all amid an and are as at be been before but by can could did do does
+    for from had has have he her his how i if in into is it its just may more new no not now of
+    off on or our out over says she should so than that the their them they this to up was we
+    were what when where who why will with would you your
+    """.split()
+)
+
+# How the stored signatures were made. If it changes, they're redone from the headlines.
+LAYOUT = (SIGNATURE_SIZE, BAND_SIZE, "without stopwords")
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(20231)
+_PERMUTATIONS = [
+    (_random.randrange(1, _PRIME), _random.randrange(0, _PRIME))
+    for _ in range(SIGNATURE_SIZE)
+]
+
+# Every distinct headline with its signature and cluster, the LSH buckets it's in, and the
+# markets and URLs it ran under. Finding a new headline's neighbours only reads its buckets.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS headline_clusters (
+    headline_key TEXT PRIMARY KEY,
+    headline TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    cluster INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS headline_clusters_cluster ON headline_clusters (cluster);
+CREATE TABLE IF NOT EXISTS headline_buckets (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    headline_key TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, headline_key)
+);
+CREATE TABLE IF NOT EXISTS headline_urls (
+    headline_key TEXT NOT NULL,
+    market TEXT NOT NULL,
+    url TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (headline_key, market, url)
+);
+CREATE INDEX IF NOT EXISTS headline_urls_url ON headline_urls (url);
+CREATE TABLE IF NOT EXISTS headline_signature_layout (
+    signature_size INTEGER NOT NULL,
+    band_size INTEGER NOT NULL,
+    features TEXT NOT NULL
+);
+"""
+
+
+def _token_hash(token):
+    return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+
+
+def content_words(words):
+    """
+    This function drops the stopwords from a headline's words, unless that leaves nothing.
+    Example input: ["storm", "knocks", "out", "power", "to", "10000", "again"]
+    Example output: ["storm", "knocks", "power", "10000", "again"]
+    """
+    return [word for word in words if word not in STOPWORDS] or words
+
+
+def signature(words):
+    """
+    This function returns the MinHash signature of a set of words.
+    """
+    hashes = [_token_hash(word) for word in set(words)]
+    return array(
+        "I",
+        [
+            min((a * h + b) % _PRIME for h in hashes) & 0xFFFFFFFF
+            for a, b in _PERMUTATIONS
+        ],
+    )
+
+
+def similarity(signature_a, signature_b):
+    """
+    This function estimates how much two headlines' words overlap (their Jaccard similarity) from their signatures.
+    """
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+
+def buckets(signature):
+    for band in range(0, SIGNATURE_SIZE, BAND_SIZE):
+        yield band // BAND_SIZE, signature[band : band + BAND_SIZE].tobytes()
+
+
+def _resign(connection):
+    """
+    This function redoes the signatures and LSH buckets from the stored headlines if they were made
+    another way. The clusters stay as they are.
+    """
+    layout = connection.execute(
+        "SELECT signature_size, band_size, features FROM headline_signature_layout"
+    ).fetchone()
+    if layout and tuple(layout) == LAYOUT:
+        return
+    # Before the signatures had a layout of their own, only the band size was kept.
+    connection.execute("DROP TABLE IF EXISTS headline_bucket_layout")
+    connection.execute("DELETE FROM headline_buckets")
+    for row in connection.execute(
+        "SELECT headline_key, headline FROM headline_clusters"
+    ).fetchall():
+        new_signature = signature(content_words(normalize_headline(row["headline"]).split()))
+        connection.execute(
+            "UPDATE headline_clusters SET signature = ? WHERE headline_key = ?",
+            (new_signature.tobytes(), row["headline_key"]),
+        )
+        connection.executemany(
+            """
+            INSERT OR IGNORE INTO headline_buckets (band, bucket, headline_key)
+            VALUES (?, ?, ?)
+            """,
+            [(band, bucket, row["headline_key"]) for band, bucket in buckets(new_signature)],
+        )
+    connection.execute("DELETE FROM headline_signature_layout")
+    connection.execute(
+        """
+        INSERT INTO headline_signature_layout (signature_size, band_size, features)
+        VALUES (?, ?, ?)
+        """,
+        LAYOUT,
+    )
+
+
+def _add_headline(connection, headline_key, headline, words, url):
+    """
+    This function puts a headline we haven't seen into a cluster: the cluster of its URL's earlier
+    headlines (a rewrite is the same story, however different it reads) and of any close headline.
+    If that's several clusters, they're merged.
+    """
+    new_signature = signature(content_words(words))
+    new_buckets = list(buckets(new_signature))
+
+    clusters = {
+        row["cluster"]
+        for row in connection.execute(
+            """
+            SELECT c.cluster FROM headline_urls u
+            JOIN headline_clusters c ON c.headline_key = u.headline_key
+            WHERE u.url = ?
+            """,
+            (url,),
+        )
+    }
+    for band, bucket in new_buckets:
+        for row in connection.execute(
+            """
+            SELECT h.signature, h.cluster FROM headline_buckets b
+            JOIN headline_clusters h ON h.headline_key = b.headline_key
+            WHERE b.band = ? AND b.bucket = ?
+            """,
+            (band, bucket),
+        ):
+            other = array("I")
+            other.frombytes(row["signature"])
+            if similarity(new_signature, other) >= MIN_SIMILARITY:
+                clusters.add(row["cluster"])
+
+    if clusters:
+        cluster = min(clusters)
+        for other_cluster in clusters - {cluster}:
+            connection.execute(
+                "UPDATE headline_clusters SET cluster = ? WHERE cluster = ?",
+                (cluster, other_cluster),
+            )
+    else:
+        cluster = connection.execute(
+            "SELECT COALESCE(MAX(cluster), 0) + 1 FROM headline_clusters"
+        ).fetchone()[0]
+
+    connection.execute(
+        """
+        INSERT INTO headline_clusters (headline_key, headline, signature, cluster)
+        VALUES (?, ?, ?, ?)
+        """,
+        (headline_key, headline, new_signature.tobytes(), cluster),
+    )
+    connection.executemany(
+        "INSERT OR IGNORE INTO headline_buckets (band, bucket, headline_key) VALUES (?, ?, ?)",
+        [(band, bucket, headline_key) for band, bucket in new_buckets],
+    )
+
+
+def update_clusters(market, slots, captured_at, path=store.STORE_PATH):
+    """
+    This function clusters the headlines of a capture. Headlines we've already seen only get
+    their last seen time bumped; new ones are signed and compared with the headlines in their
+    LSH buckets, never with the whole corpus.
+    """
+    added = 0
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        # Markets are clustered at once, so we take the write lock before reading anything.
+        # Otherwise two of them could pick the same new cluster ID, or merge clusters the other just changed.
+        connection.execute("BEGIN IMMEDIATE")
+        _resign(connection)
+        for item in slots.values():
+            words = normalize_headline(item["headline"]).split()
+            if not item["url"] or len(words) < MIN_HEADLINE_WORDS:
+                continue
+            headline_key = hashlib.sha1(" ".join(words).encode()).hexdigest()[:16]
+
+            known = connection.execute(
+                "SELECT 1 FROM headline_clusters WHERE headline_key = ?", (headline_key,)
+            ).fetchone()
+            if not known:
+                _add_headline(
+                    connection, headline_key, item["headline"], words, item["url"]
+                )
+                added += 1
+
+            connection.execute(
+                """
+                INSERT INTO headline_urls (headline_key, market, url, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (headline_key, market, url) DO UPDATE SET last_seen = excluded.last_seen
+                """,
+                (headline_key, market["name"], item["url"], captured_at, captured_at),
+            )
+    return added
+
+
+def story_cluster(url, path=store.STORE_PATH):
+    """
+    This function returns every headline in the clusters of a URL: its own rewrites, and closely
+    related headlines under other URLs and on other markets.
+    """
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                """
+                SELECT h.cluster, h.headline, u.market, u.url, u.first_seen, u.last_seen
+                FROM headline_clusters h
+                JOIN headline_urls u ON u.headline_key = h.headline_key
+                WHERE h.cluster IN (
+                    SELECT c.cluster FROM headline_urls s
+                    JOIN headline_clusters c ON c.headline_key = s.headline_key
+                    WHERE s.url = ?
+                )
+                ORDER BY h.cluster, u.first_seen
+                """,
+                (url,),
+            )
+        ]
+
+
+def print_cluster(url, path=store.STORE_PATH):
+    results = story_cluster(url, path)
+    if not results:
+        print(f"🤷 {url} isn't in any cluster")
+        return
+    for result in results:
+        marker = "→" if result["url"] == url else " "
+        print(
+            f"{marker} [{result['cluster']}] {result['first_seen'][:16]} "
+            f"{result['market']}: {result['headline']}"
+        )
+        print(f"    {result['url']}")
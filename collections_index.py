@@ -0,0 +1,143 @@
+from contextlib import closing
+
+import store
+from drift import zone_for_column
+
+# Which WCM collection fed every slot, as spans of consecutive captures: a span is opened when a
+# slot's collection changes and stretched on every capture it stays the same.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wcm_collections (
+    collection_id INTEGER PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS collection_spans (
+    id INTEGER PRIMARY KEY,
+    market TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    zone TEXT,
+    collection_id INTEGER NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    open INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS collection_spans_slot ON collection_spans (market, slot, first_seen);
+CREATE INDEX IF NOT EXISTS collection_spans_collection
+    ON collection_spans (collection_id, first_seen);
+CREATE UNIQUE INDEX IF NOT EXISTS collection_spans_open ON collection_spans (market, slot)
+    WHERE open;
+"""
+
+
+def update_collection_spans(market, snapshot, path=store.STORE_PATH):
+    """
+    This function adds a capture to the collection index. It only touches the open span of each slot.
+    """
+    name, captured_at = market["name"], snapshot.captured_at
+    changed = 0
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        open_spans = {
+            row["slot"]: row
+            for row in connection.execute(
+                """
+                SELECT id, slot, collection_id FROM collection_spans
+                WHERE market = ? AND open
+                """,
+                (name,),
+            )
+        }
+        for slot, collection_id in zip(snapshot.slots, snapshot.collections):
+            span = open_spans.get(slot)
+            if span is not None and span["collection_id"] == collection_id:
+                connection.execute(
+                    "UPDATE collection_spans SET last_seen = ? WHERE id = ?",
+                    (captured_at, span["id"]),
+                )
+                continue
+
+            # The slot's collection changed (or it lost its collection), so its span is closed.
+            if span is not None:
+                connection.execute(
+                    "UPDATE collection_spans SET open = 0 WHERE id = ?", (span["id"],)
+                )
+            if collection_id:
+                connection.execute(
+                    """
+                    INSERT INTO collection_spans (
+                        market, slot, zone, collection_id, first_seen, last_seen
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        name,
+                        slot,
+                        zone_for_column(slot),
+                        collection_id,
+                        captured_at,
+                        captured_at,
+                    ),
+                )
+                changed += 1
+
+        connection.executemany(
+            """
+            INSERT INTO wcm_collections (collection_id, first_seen, last_seen) VALUES (?, ?, ?)
+            ON CONFLICT (collection_id) DO UPDATE SET last_seen = excluded.last_seen
+            """,
+            [
+                (collection_id, captured_at, captured_at)
+                for collection_id in set(snapshot.collections)
+                if collection_id
+            ],
+        )
+    return changed
+
+
+def collection_spans(
+    market=None,
+    slot=None,
+    collection_id=None,
+    since=None,
+    until=None,
+    path=store.STORE_PATH,
+):
+    """
+    This function returns the spans that overlap a period, for a market's slot or for a collection.
+    Example: collection_spans("San Antonio", "CP", since="2024-03-04", until="2024-03-11")
+    """
+    where, params = [], []
+    for condition, value in [
+        ("market = ?", market),
+        ("slot = ?", slot),
+        ("collection_id = ?", collection_id),
+        ("last_seen >= ?", since),
+        ("first_seen < ?", until),
+    ]:
+        if value is not None:
+            where.append(condition)
+            params.append(value)
+
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                f"""
+                SELECT market, slot, zone, collection_id, first_seen, last_seen
+                FROM collection_spans
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY first_seen
+                """,
+                params,
+            )
+        ]
+
+
+def print_collection_spans(**filters):
+    spans = collection_spans(**filters)
+    if not spans:
+        print("🤷 No collections match")
+        return
+    for span in spans:
+        print(
+            f"{span['first_seen'][:16]} → {span['last_seen'][:16]}  {span['market']} "
+            f"{span['slot']:<11} collection {span['collection_id']}"
+        )
@@ -0,0 +1,91 @@
+import json
+import os
+
+from snapshot import Snapshot
+
+# Every capture as a line of JSON, in a file per market per day: data/captures/<market>/<YYYY>/<MM>/<YYYY-MM-DD>.jsonl
+# Files are only ever appended to, so every hourly commit is a small diff.
+DATASET_DIR = os.environ.get("DATASET_DIR", os.path.join("data", "captures"))
+
+
+def day_path(market_slug, day, dataset_dir=DATASET_DIR):
+    """
+    This function returns the file a market's captures of a day (YYYY-MM-DD, in the market's timezone) go in.
+    Example input: san-antonio, 2024-03-05
+    Example output: data/captures/san-antonio/2024/03/2024-03-05.jsonl
+    """
+    return os.path.join(dataset_dir, market_slug, day[:4], day[5:7], f"{day}.jsonl")
+
+
+def capture_record(snapshot):
+    """
+    This function returns a capture as it's written to the dataset: the three logs' rows without
+    the repeated date and time, and collections as WCM IDs.
+    """
+    return {
+        "captured_at": snapshot.captured_at,
+        "date": snapshot.date,
+        "time": snapshot.time,
+        "headlines": dict(zip(snapshot.slots, snapshot.headlines)),
+        "urls": dict(zip(snapshot.slots, snapshot.urls)),
+        "collections": dict(zip(snapshot.slots, snapshot.collections)),
+    }
+
+
+def append_capture(market, snapshot, dataset_dir=DATASET_DIR):
+    """
+    This function appends a capture to its market's file for the day.
+    """
+    path = day_path(market["slug"], snapshot.date, dataset_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(capture_record(snapshot), ensure_ascii=False) + "\n")
+    return path
+
+
+def read_day(market_slug, day, dataset_dir=DATASET_DIR):
+    """
+    This function returns a market's captures of a day, oldest first.
+    """
+    path = day_path(market_slug, day, dataset_dir)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def days(market_slug, dataset_dir=DATASET_DIR):
+    """
+    This function returns the days (YYYY-MM-DD) we have captures of for a market, oldest first.
+    """
+    found = []
+    for root, _, files in os.walk(os.path.join(dataset_dir, market_slug)):
+        found.extend(name[: -len(".jsonl")] for name in files if name.endswith(".jsonl"))
+    return sorted(found)
+
+
+
+def capture_snapshot(market, record):
+    """
+    This function turns a line of the dataset back into the Snapshot it was written from.
+    """
+    snapshot = Snapshot(
+        market["name"], record["date"], record["time"], record["captured_at"]
+    )
+    slots = list(record["headlines"])
+    snapshot.add_zone(
+        slots,
+        [record["headlines"][slot] for slot in slots],
+        [record["urls"].get(slot) for slot in slots],
+        [record["collections"].get(slot) or 0 for slot in slots],
+    )
+    return snapshot
+
+
+def captures(market, dataset_dir=DATASET_DIR):
+    """
+    This function yields a market's captures as Snapshots, oldest first, reading a day at a time.
+    """
+    for day in days(market["slug"], dataset_dir):
+        for record in read_day(market["slug"], day, dataset_dir):
+            yield capture_snapshot(market, record)
@@ -0,0 +1,82 @@
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class DeadlineExceeded(Exception):
+    """
+    This exception is raised when a market (or the whole run) runs out of time.
+    """
+
+
+class Deadline:
+    """
+    This class is a point in time something has to be done by. A deadline of None never expires.
+    """
+
+    def __init__(self, seconds=None, label="deadline"):
+        self.label = label
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    @classmethod
+    def earliest(cls, *deadlines):
+        """
+        This function returns whichever of the deadlines expires first.
+        """
+        deadlines = [deadline for deadline in deadlines if deadline.expires is not None]
+        if not deadlines:
+            return cls()
+        return min(deadlines, key=lambda deadline: deadline.expires)
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self):
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def check(self, doing):
+        """
+        This function raises DeadlineExceeded if we've run out of time before doing something.
+        """
+        if self.expired():
+            raise DeadlineExceeded(
+                f"Hit the {self.label} ({self.seconds:g}s) before {doing}"
+            )
+
+    def timeout(self, timeout):
+        """
+        This function shortens a requests timeout (a number or a (connect, read) tuple) so it
+        can't go past the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        remaining = max(remaining, 0.001)
+        if isinstance(timeout, tuple):
+            return tuple(min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+
+def current():
+    """
+    This function returns the deadline of whatever this thread is working on.
+    """
+    return getattr(_local, "deadline", None) or Deadline()
+
+
+@contextmanager
+def scope(deadline):
+    """
+    This function sets the deadline for everything this thread does inside the block.
+    """
+    previous = getattr(_local, "deadline", None)
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# The last snapshot of every market's homepage, which the next run is compared with.
+SNAPSHOTS_DIR = os.environ.get("SNAPSHOTS_DIR", os.path.join("store", "snapshots"))
+
+# Where the change events go: data/events/<market>/<YYYY-MM>.jsonl
+EVENTS_DATA_DIR = os.environ.get("EVENTS_DATA_DIR", os.path.join("data", "events"))
+
+EVENT_TYPES = ("entered", "exited", "moved", "rewritten", "collection_changed")
+
+_lock = threading.Lock()
+
+
+def _slots_by_url(slots):
+    # A story can show up twice (say, in breaking news and the centerpiece). We follow its first slot.
+    by_url = OrderedDict()
+    for slot, item in slots.items():
+        if item["url"] and item["url"] not in by_url:
+            by_url[item["url"]] = slot
+    return by_url
+
+
+def diff_snapshots(previous, current):
+    """
+    This function compares two snapshots of a homepage and returns what changed, slot by slot.
+    It only looks at the two snapshots, so it costs the same no matter how long we've been logging.
+    """
+    events = []
+    previous_urls = _slots_by_url(previous)
+    current_urls = _slots_by_url(current)
+
+    for url, slot in current_urls.items():
+        item = current[slot]
+        if url not in previous_urls:
+            events.append(
+                {"type": "entered", "url": url, "slot": slot, "headline": item["headline"]}
+            )
+            continue
+
+        previous_slot = previous_urls[url]
+        if previous_slot != slot:
+            events.append(
+                {
+                    "type": "moved",
+                    "url": url,
+                    "slot": slot,
+                    "from_slot": previous_slot,
+                    "headline": item["headline"],
+                }
+            )
+        previous_headline = previous[previous_slot]["headline"]
+        if previous_headline != item["headline"]:
+            events.append(
+                {
+                    "type": "rewritten",
+                    "url": url,
+                    "slot": slot,
+                    "headline": item["headline"],
+                    "previous_headline": previous_headline,
+                }
+            )
+
+    for url, slot in previous_urls.items():
+        if url not in current_urls:
+            events.append(
+                {
+                    "type": "exited",
+                    "url": url,
+                    "slot": slot,
+                    "headline": previous[slot]["headline"],
+                }
+            )
+
+    for slot, item in current.items():
+        if slot not in previous:
+            continue
+        previous_collection = previous[slot]["collection"]
+        if previous_collection != item["collection"]:
+            events.append(
+                {
+                    "type": "collection_changed",
+                    "slot": slot,
+                    "collection": item["collection"],
+                    "previous_collection": previous_collection,
+                }
+            )
+
+    return events
+
+
+def load_snapshot(market, directory=SNAPSHOTS_DIR):
+    path = os.path.join(directory, f"{market['slug']}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def save_snapshot(market, snapshot, directory=SNAPSHOTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{market['slug']}.json")
+    with open(path, "w") as f:
+        json.dump(snapshot, f, indent=2)
+
+
+def record_changes(
+    market,
+    slots,
+    report,
+    captured_at=None,
+    snapshots_dir=SNAPSHOTS_DIR,
+    data_dir=EVENTS_DATA_DIR,
+):
+    """
+    This function compares a market's new snapshot with the last one, appends the changes to the
+    event log and keeps the new snapshot for next time. The first snapshot of a market has
+    nothing to compare with, so it only starts the chain.
+    """
+    captured_at = captured_at or datetime.now(timezone.utc).isoformat()
+    previous = load_snapshot(market, snapshots_dir)
+
+    events = []
+    if previous is not None:
+        for event in diff_snapshots(previous["slots"], slots):
+            events.append(
+                OrderedDict(
+                    [
+                        ("market", market["name"]),
+                        ("time", captured_at),
+                        ("previous_time", previous["captured_at"]),
+                    ]
+                    + list(event.items())
+                )
+            )
+
+    if events:
+        directory = os.path.join(data_dir, market["slug"])
+        os.makedirs(directory, exist_ok=True)
+        with _lock, open(os.path.join(directory, f"{captured_at[:7]}.jsonl"), "a") as f:
+            for event in events:
+                f.write(json.dumps(event) + "\n")
+
+    save_snapshot(market, {"captured_at": captured_at, "slots": slots}, snapshots_dir)
+
+    counts = {event_type: 0 for event_type in EVENT_TYPES}
+    for event in events:
+        counts[event["type"]] += 1
+    report.record("changes", **counts)
+    return events
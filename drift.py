@@ -0,0 +1,123 @@
+import json
+import os
+from statistics import median
+
+# The rolling baseline of how many elements every zone of every market matched.
+BASELINE_PATH = os.environ.get(
+    "SELECTOR_BASELINE_PATH", os.path.join("store", "selector_baseline.json")
+)
+
+# How many runs we keep in the baseline. At one run an hour, that's a week.
+BASELINE_WINDOW = 168
+
+# We don't compare against the baseline until we have a few runs to go on.
+MIN_HISTORY = 6
+
+# Which columns of the headline log belong to which zone. We use this to count how many
+# slots of each zone we managed to extract.
+COLUMN_ZONES = [
+    ("Breaking", "breaking"),
+    ("Just In", "just_in"),
+    ("Trending", "four_pack"),
+    ("CP", "centerpiece"),
+    ("Tab", "centerpiece"),
+    ("Top", "top_headlines"),
+]
+
+
+def zone_for_column(column):
+    for prefix, zone in COLUMN_ZONES:
+        if column.startswith(prefix):
+            return zone
+    return None
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(baseline, path=BASELINE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def latest_counts(report):
+    """
+    This function pulls the matched and extracted counts of every zone out of a run report.
+    If a zone was counted more than once (like SF's centerpiece fallback), the last count wins.
+    """
+    counts = {}
+    for record in report.records:
+        if record["stage"] != "zone":
+            continue
+        zone = counts.setdefault(record["market"], {}).setdefault(record["zone"], {})
+        for field in ("matched", "extracted"):
+            if field in record:
+                zone[field] = record[field]
+    return counts
+
+
+def optional_zones(market):
+    """
+    This function returns the zones of a market that come and go on their own (there isn't always
+    a breaking news bar), which are the ones marked optional in markets.json, along with their collections.
+    """
+    zones = [zone for zone, config in market["zones"].items() if config.get("optional")]
+    return set(zones) | {f"{zone}_collections" for zone in zones}
+
+
+def compare(zone, value, history, optional=False):
+    """
+    This function compares a count with its history and returns why it drifted, or None.
+    Optional zones are only flagged when they match a lot more than usual, never when they disappear.
+    """
+    if len(history) < MIN_HISTORY:
+        return None
+    typical = median(history)
+    if value > 2 * typical and value - typical >= 2:
+        return f"{value} vs. a typical {typical:g}, more than twice as many"
+    if optional:
+        return None
+    if typical > 0 and value == 0:
+        return f"nothing vs. a typical {typical:g}"
+    if value < typical / 2:
+        return f"{value} vs. a typical {typical:g}, less than half as many"
+    return None
+
+
+def check_drift(report, markets, path=BASELINE_PATH):
+    """
+    This function compares this run's zone counts with the rolling baseline, flags the zones
+    that drifted and adds this run to the baseline. It only uses what the scrapers already counted,
+    so it doesn't cost an extra fetch or parse.
+    """
+    baseline = load_baseline(path)
+    flagged = []
+
+    for market, zones in latest_counts(report).items():
+        optional = optional_zones(markets[market]) if market in markets else set()
+        for zone, counts in zones.items():
+            for field, value in counts.items():
+                history = (
+                    baseline.setdefault(market, {})
+                    .setdefault(zone, {})
+                    .setdefault(field, [])
+                )
+                reason = compare(zone, value, history, zone in optional)
+                if reason:
+                    print(f"🚨 Layout drift on {market}: {zone} {field} {reason}")
+                    report.record(
+                        "drift", market=market, zone=zone, field=field, reason=reason
+                    )
+                    flagged.append((market, zone, field))
+                history.append(value)
+                del history[:-BASELINE_WINDOW]
+
+    save_baseline(baseline, path)
+    return flagged
@@ -0,0 +1,96 @@
+from contextlib import closing
+
+import store
+
+# Every capture counts as this many hours on the homepage, since we capture once an hour.
+CAPTURE_HOURS = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dwell (
+    market TEXT NOT NULL,
+    url TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    hours REAL NOT NULL,
+    headline TEXT,
+    PRIMARY KEY (market, url)
+);
+CREATE TABLE IF NOT EXISTS dwell_slots (
+    market TEXT NOT NULL,
+    url TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (market, url, slot)
+);
+"""
+
+
+def update_dwell(market, slots, captured_at, path=store.STORE_PATH):
+    """
+    This function adds a capture to the dwell index: every story on the homepage gets another
+    hour, in total and in each slot it was in. It only touches the stories in this capture.
+    """
+    slots_by_url = {}
+    for slot, item in slots.items():
+        if item["url"]:
+            slots_by_url.setdefault(item["url"], []).append((slot, item["headline"]))
+
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        for url, seen in slots_by_url.items():
+            connection.execute(
+                """
+                INSERT INTO dwell (market, url, first_seen, last_seen, hours, headline)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (market, url) DO UPDATE SET
+                    last_seen = excluded.last_seen,
+                    hours = hours + excluded.hours,
+                    headline = excluded.headline
+                """,
+                (market["name"], url, captured_at, captured_at, CAPTURE_HOURS, seen[0][1]),
+            )
+            connection.executemany(
+                """
+                INSERT INTO dwell_slots (market, url, slot, hours) VALUES (?, ?, ?, ?)
+                ON CONFLICT (market, url, slot) DO UPDATE SET hours = hours + excluded.hours
+                """,
+                [(market["name"], url, slot, CAPTURE_HOURS) for slot, _ in seen],
+            )
+    return len(slots_by_url)
+
+
+def lookup_dwell(url, market=None, path=store.STORE_PATH):
+    """
+    This function returns how long a story was on the homepage of each market that ran it, and in which slots.
+    """
+    with closing(store.connect(SCHEMA, path)) as connection:
+        query = "SELECT * FROM dwell WHERE url = ?"
+        params = [url]
+        if market:
+            query += " AND market = ?"
+            params.append(market)
+
+        results = []
+        for row in connection.execute(query, params):
+            result = dict(row)
+            result["slots"] = {
+                slot["slot"]: slot["hours"]
+                for slot in connection.execute(
+                    "SELECT slot, hours FROM dwell_slots WHERE market = ? AND url = ? ORDER BY hours DESC, slot",
+                    (row["market"], url),
+                )
+            }
+            results.append(result)
+        return results
+
+
+def print_dwell(url, market=None, path=store.STORE_PATH):
+    results = lookup_dwell(url, market, path)
+    if not results:
+        print(f"🤷 {url} isn't in the dwell index")
+        return
+    for result in results:
+        print(f"🏙️ {result['market']}: {result['headline']}")
+        print(f"   First seen {result['first_seen']}, last seen {result['last_seen']}")
+        print(f"   {result['hours']:g} hours on the homepage")
+        for slot, hours in result["slots"].items():
+            print(f"   {slot:<12}{hours:g} hours")
@@ -0,0 +1,212 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from cachetools import TLRUCache
+
+import deadlines
+from urls import headers_for
+
+# The article metadata we've already fetched, keyed by URL. It's saved between runs so we only fetch a URL once.
+# It's rewritten on every run, so it's kept in the store rather than committed.
+ARTICLE_CACHE_PATH = os.environ.get(
+    "ARTICLE_CACHE_PATH", os.path.join("store", "article_cache.json")
+)
+
+# Where the metadata of every article we fetch goes: data/articles/<market>/<YYYY-MM>.jsonl
+ARTICLES_DATA_DIR = os.environ.get("ARTICLES_DATA_DIR", os.path.join("data", "articles"))
+
+# Stories stay on the homepage for hours, sometimes days. A week later we fetch them again (bylines and paywalls change).
+ARTICLE_TTL = 7 * 24 * 60 * 60
+
+# A page we couldn't fetch is tried again after a few hours instead of every run.
+FAILED_TTL = 6 * 60 * 60
+
+# The most URLs we keep. The least recently used ones go first.
+ARTICLE_CACHE_SIZE = 20000
+
+# How many articles a market fetches at once, and at most per run. Whatever is left waits for the next run.
+ENRICH_WORKERS = 4
+MAX_FETCHES_PER_MARKET = 25
+
+ARTICLE_TIMEOUT = (10, 20)
+
+
+def _expires(url, metadata, now):
+    return metadata["fetched"] + (FAILED_TTL if "error" in metadata else ARTICLE_TTL)
+
+
+def _json_ld(soup):
+    """
+    This function yields every object in the page's JSON-LD scripts.
+    """
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        for item in data if isinstance(data, list) else [data]:
+            if isinstance(item, dict):
+                yield from item.get("@graph", [item])
+
+
+def _meta(soup, *names):
+    for name in names:
+        tag = soup.find("meta", attrs={"property": name}) or soup.find(
+            "meta", attrs={"name": name}
+        )
+        if tag and tag.get("content"):
+            return tag["content"].strip()
+    return None
+
+
+def parse_article(content):
+    """
+    This function pulls the byline, section, publish and update time and paywall status out of an article page.
+    We only parse the <meta> and <script> tags, which is all of it we need.
+    """
+    soup = BeautifulSoup(content, "html.parser", parse_only=SoupStrainer(["meta", "script"]))
+
+    article = {}
+    for item in _json_ld(soup):
+        if "Article" in str(item.get("@type", "")):
+            article = item
+            break
+
+    authors = article.get("author") or []
+    if isinstance(authors, dict):
+        authors = [authors]
+    byline = ", ".join(
+        author.get("name", "") if isinstance(author, dict) else str(author)
+        for author in authors
+    ) or _meta(soup, "author", "article:author")
+
+    free = article.get("isAccessibleForFree")
+    if isinstance(free, str):
+        free = free.lower() == "true"
+
+    return {
+        "byline": byline or None,
+        "section": article.get("articleSection") or _meta(soup, "article:section"),
+        "published": article.get("datePublished")
+        or _meta(soup, "article:published_time"),
+        "updated": article.get("dateModified") or _meta(soup, "article:modified_time"),
+        "paywalled": None if free is None else not free,
+    }
+
+
+class ArticleEnricher:
+    """
+    This class fetches the metadata of the articles on the homepages. Only URLs that aren't in
+    the cache are fetched, so once a story has been seen it costs nothing until it expires.
+    """
+
+    def __init__(
+        self,
+        rate_limiter,
+        report,
+        headers=None,
+        cache_path=ARTICLE_CACHE_PATH,
+        data_dir=ARTICLES_DATA_DIR,
+    ):
+        self.rate_limiter = rate_limiter
+        self.report = report
+        self.headers = headers or {}
+        self.cache_path = cache_path
+        self.data_dir = data_dir
+        self.cache = TLRUCache(ARTICLE_CACHE_SIZE, ttu=_expires, timer=time.time)
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        with open(self.cache_path) as f:
+            entries = json.load(f)
+        # Oldest first, so the least recently fetched are the first to go.
+        for url, metadata in sorted(entries.items(), key=lambda item: item[1]["fetched"]):
+            if _expires(url, metadata, None) > time.time():
+                self.cache[url] = metadata
+
+    def save(self):
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            self.cache.expire()
+            entries = dict(self.cache.items())
+        with open(self.cache_path, "w") as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+
+    def fetch(self, url, headers=None):
+        deadline = deadlines.current()
+        deadline.check(f"fetching {url}")
+        with self.rate_limiter.limit(url):
+            with self.report.stage("article_fetch", url=url) as stage:
+                response = requests.get(
+                    url, headers=headers, timeout=deadline.timeout(ARTICLE_TIMEOUT)
+                )
+                stage["status"] = response.status_code
+                stage["bytes"] = len(response.content)
+        response.raise_for_status()
+        with self.report.stage("article_parse"):
+            metadata = parse_article(response.content)
+        metadata["url"] = url
+        metadata["fetched"] = time.time()
+        return metadata
+
+    def enrich(self, market, urls):
+        """
+        This function returns the metadata of a market's URLs, fetching the ones we haven't seen.
+        """
+        urls = [url for url in dict.fromkeys(urls) if url]
+        with self.lock:
+            known = {url: self.cache[url] for url in urls if url in self.cache}
+        missing = [url for url in urls if url not in known][:MAX_FETCHES_PER_MARKET]
+        self.report.record(
+            "article_cache", cached=len(known), fetching=len(missing), urls=len(urls)
+        )
+        if not missing:
+            return known
+
+        market_name = self.report.current_market
+        deadline = deadlines.current()
+
+        def fetch(url):
+            # The worker threads work for the same market, under the same deadline.
+            self.report.start_market(market_name)
+            with deadlines.scope(deadline):
+                try:
+                    # The homepages link to other sites too, which don't get our access token.
+                    return self.fetch(url, headers_for(market, url, self.headers))
+                except deadlines.DeadlineExceeded:
+                    return None
+                except Exception as e:
+                    self.report.record("article_failed", url=url, error=repr(e))
+                    return {"url": url, "fetched": time.time(), "error": repr(e)}
+
+        with ThreadPoolExecutor(max_workers=ENRICH_WORKERS) as executor:
+            fetched = [metadata for metadata in executor.map(fetch, missing) if metadata]
+
+        with self.lock:
+            for metadata in fetched:
+                self.cache[metadata["url"]] = metadata
+                known[metadata["url"]] = metadata
+
+        self._append(market, [metadata for metadata in fetched if "error" not in metadata])
+        return known
+
+    def _append(self, market, fetched):
+        if not fetched:
+            return
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        directory = os.path.join(self.data_dir, market["slug"])
+        os.makedirs(directory, exist_ok=True)
+        with self.lock, open(os.path.join(directory, f"{month}.jsonl"), "a") as f:
+            for metadata in fetched:
+                f.write(json.dumps(dict(metadata, market=market["name"])) + "\n")
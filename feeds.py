@@ -0,0 +1,212 @@
+import calendar
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urljoin
+
+import feedparser
+import requests
+
+from urls import canonicalize, headers_for
+
+# The validators for conditional GETs and the entries we've already logged, which only the feed collector writes.
+FEEDS_STATE_PATH = os.environ.get(
+    "FEEDS_STATE_PATH", os.path.join("store", "feeds.json")
+)
+
+# The feeds we found on each market's homepage, which only the homepage scrape writes. The two runs
+# keep separate files, so neither can overwrite what the other saved while it was running.
+DISCOVERED_FEEDS_PATH = os.environ.get(
+    "DISCOVERED_FEEDS_PATH", os.path.join("store", "feeds_discovered.json")
+)
+
+# Where the feed entries go: data/feeds/<market>/<YYYY-MM-DD>.jsonl
+FEEDS_DATA_DIR = os.environ.get("FEEDS_DATA_DIR", os.path.join("data", "feeds"))
+
+# How many entry IDs we remember per market, so an entry is only logged the first time we see it.
+SEEN_ENTRIES = 2000
+
+FEED_TYPES = ("application/rss+xml", "application/atom+xml")
+
+FEED_TIMEOUT = (10, 30)
+
+_lock = threading.Lock()
+
+
+def discover_feeds(soup, market):
+    """
+    This function finds the feeds a homepage links to in its <head>, using the soup we already
+    have, so discovering feeds never costs an extra fetch.
+    """
+    feeds = []
+    for link in soup.find_all("link", rel="alternate"):
+        if link.get("type") in FEED_TYPES and link.get("href"):
+            feeds.append(urljoin(market["url"], link["href"]))
+    return feeds
+
+
+def load_state(path=FEEDS_STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=FEEDS_STATE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # We write a new file and swap it in, so the other run never reads half of one.
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def save_discovered_feeds(report, markets, path=DISCOVERED_FEEDS_PATH):
+    """
+    This function stores the feeds the homepage scrapes found, so the feed collector can use them.
+    """
+    discovered = load_state(path)
+    for record in report.records:
+        if record["stage"] == "feeds_discovered" and record["market"] in markets:
+            discovered[markets[record["market"]]["slug"]] = sorted(set(record["feeds"]))
+    save_state(discovered, path)
+
+
+def _timestamp(parsed):
+    if not parsed:
+        return None
+    return datetime.fromtimestamp(calendar.timegm(parsed), timezone.utc).isoformat()
+
+
+def fetch_feed(url, validators, rate_limiter, report, headers=None):
+    """
+    This function fetches a feed with a conditional GET. It returns None if the feed hasn't changed.
+    """
+    headers = dict(headers or {})
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("modified"):
+        headers["If-Modified-Since"] = validators["modified"]
+
+    with rate_limiter.limit(url):
+        with report.stage("feed_fetch", url=url) as stage:
+            response = requests.get(url, headers=headers, timeout=FEED_TIMEOUT)
+            stage["status"] = response.status_code
+            stage["bytes"] = len(response.content)
+
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    validators["etag"] = response.headers.get("ETag")
+    validators["modified"] = response.headers.get("Last-Modified")
+
+    with report.stage("feed_parse"):
+        return feedparser.parse(response.content)
+
+
+def collect_market(
+    market, market_state, discovered, rate_limiter, report, data_dir, headers
+):
+    """
+    This function collects the new entries of a market's feeds, in publish order.
+    """
+    report.start_market(market["name"])
+    # Older states kept the discovered feeds with the rest, which we drop now that they have their own file.
+    feed_urls = (
+        list(market.get("feeds", [])) + discovered + market_state.pop("discovered", [])
+    )
+    validators = market_state.setdefault("validators", {})
+    seen = market_state.setdefault("seen", [])
+    seen_set = set(seen)
+    fetched_at = datetime.now(timezone.utc).isoformat()
+
+    new_entries = []
+    for feed_url in dict.fromkeys(feed_urls):
+        try:
+            # Discovered feeds can live anywhere (FeedBurner, a CDN), which don't get our access token.
+            parsed = fetch_feed(
+                feed_url,
+                validators.setdefault(feed_url, {}),
+                rate_limiter,
+                report,
+                headers_for(market, feed_url, headers),
+            )
+        except Exception as e:
+            print(f"🤦‍♂️ Couldn't fetch {feed_url}: {e!r}")
+            report.record("feed_failed", error=repr(e), url=feed_url)
+            continue
+        if parsed is None:
+            continue
+
+        for position, entry in enumerate(parsed.entries, start=1):
+            if not entry.get("link"):
+                continue
+            entry_id = entry.get("id") or entry["link"]
+            if entry_id in seen_set:
+                continue
+            seen_set.add(entry_id)
+            seen.append(entry_id)
+            new_entries.append(
+                {
+                    "market": market["name"],
+                    "feed": feed_url,
+                    "position": position,
+                    "title": entry.get("title"),
+                    "url": canonicalize(market, entry["link"]),
+                    "published": _timestamp(entry.get("published_parsed")),
+                    "updated": _timestamp(entry.get("updated_parsed")),
+                    "fetched_at": fetched_at,
+                }
+            )
+    del seen[:-SEEN_ENTRIES]
+
+    # Oldest first, so the file reads in publish order.
+    new_entries.sort(key=lambda entry: entry["published"] or entry["fetched_at"])
+    if new_entries:
+        directory = os.path.join(data_dir, market["slug"])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{fetched_at[:10]}.jsonl")
+        with _lock, open(path, "a") as f:
+            for entry in new_entries:
+                f.write(json.dumps(entry) + "\n")
+
+    report.record("feed_entries", entries=len(new_entries))
+    print(f"📡 {market['name']}: {len(new_entries)} new feed entries")
+    return new_entries
+
+
+def collect_feeds(
+    markets,
+    rate_limiter,
+    report,
+    headers=None,
+    workers=4,
+    state_path=FEEDS_STATE_PATH,
+    data_dir=FEEDS_DATA_DIR,
+    discovered_path=DISCOVERED_FEEDS_PATH,
+):
+    """
+    This function collects every market's feeds at once and saves the state for the next run.
+    """
+    state = load_state(state_path)
+    discovered = load_state(discovered_path)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(
+            executor.map(
+                lambda market: collect_market(
+                    market,
+                    state.setdefault(market["slug"], {}),
+                    discovered.get(market["slug"], []),
+                    rate_limiter,
+                    report,
+                    data_dir,
+                    headers,
+                ),
+                markets.values(),
+            )
+        )
+    save_state(state, state_path)
@@ -0,0 +1,237 @@
+import json
+import os
+import time
+
+# The textfile a node-exporter textfile collector picks up, and the state we keep between runs.
+# Prometheus expects counters and histograms to keep going up, so we carry them over from run to run.
+METRICS_TEXTFILE = os.environ.get(
+    "METRICS_TEXTFILE", os.path.join("store", "hp_tracker.prom")
+)
+METRICS_STATE_PATH = os.environ.get(
+    "METRICS_STATE_PATH", os.path.join("store", "metrics.json")
+)
+
+# Histograms we build out of the run report's stages: stage -> (metric, help, buckets)
+HISTOGRAMS = {
+    "fetch": (
+        "hp_tracker_fetch_duration_seconds",
+        "Time spent fetching a market's homepage.",
+        [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+    ),
+    "parse": (
+        "hp_tracker_parse_duration_seconds",
+        "Time spent parsing a market's homepage.",
+        [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    ),
+}
+
+# Counters we add up from fields on the run report's stages: (stage, field) -> (metric, help)
+FIELD_COUNTERS = {
+    ("fetch", "bytes"): (
+        "hp_tracker_downloaded_bytes_total",
+        "Bytes downloaded from a market's homepage.",
+    ),
+    ("sheets_write", "rows"): (
+        "hp_tracker_rows_written_total",
+        "Rows written to a market's spreadsheet.",
+    ),
+}
+
+# Counters of how many times a stage shows up in the run report: stage -> (metric, help)
+STAGE_COUNTERS = {
+    "failed": (
+        "hp_tracker_failed_captures_total",
+        "Captures that failed with an error.",
+    ),
+    "timed_out": (
+        "hp_tracker_timed_out_captures_total",
+        "Captures that were cut off by the market's or the run's deadline.",
+    ),
+}
+
+# Counters that come straight from the run report's counters: name -> (metric, help)
+REPORT_COUNTERS = {
+    "api_calls": (
+        "hp_tracker_sheets_api_calls_total",
+        "Calls made to the Google Sheets API.",
+    ),
+    "api_errors": (
+        "hp_tracker_sheets_api_errors_total",
+        "Calls to the Google Sheets API that failed.",
+    ),
+    "retries": (
+        "hp_tracker_retries_total",
+        "Retries made by api_call_handler.",
+    ),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def load_state(path=METRICS_STATE_PATH):
+    if not os.path.exists(path):
+        return {
+            "histograms": {},
+            "counters": {},
+            "last_success": {},
+            "selectors": {},
+            "drift": {},
+        }
+    with open(path) as f:
+        state = json.load(f)
+    state.setdefault("selectors", {})
+    state.setdefault("drift", {})
+    return state
+
+
+def update_state(state, report):
+    """
+    This function adds a run report's stages and counters on top of the state from earlier runs.
+    """
+    # The zone gauges only describe the latest run that scraped a market, so we start over for every
+    # market this one scraped. A feeds run doesn't scrape anything, so it leaves them as they were.
+    for market in {
+        record["market"] for record in report.records if record["stage"] == "zone"
+    }:
+        state["selectors"].pop(market, None)
+        state["drift"].pop(market, None)
+
+    for record in report.records:
+        market = record["market"]
+        if market is None:
+            continue
+
+        if record["stage"] in HISTOGRAMS:
+            metric, _, buckets = HISTOGRAMS[record["stage"]]
+            histogram = state["histograms"].setdefault(metric, {}).setdefault(
+                market, {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            )
+            for i, bound in enumerate(buckets):
+                if record["seconds"] <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += record["seconds"]
+            histogram["count"] += 1
+
+        for (stage, field), (metric, _) in FIELD_COUNTERS.items():
+            if record["stage"] == stage and field in record:
+                counters = state["counters"].setdefault(metric, {})
+                counters[market] = counters.get(market, 0) + record[field]
+
+        if record["stage"] in STAGE_COUNTERS:
+            counters = state["counters"].setdefault(STAGE_COUNTERS[record["stage"]][0], {})
+            counters[market] = counters.get(market, 0) + 1
+
+        if record["stage"] == "captured":
+            state["last_success"][market] = time.time()
+
+        if record["stage"] == "zone" and "matched" in record:
+            state["selectors"].setdefault(market, {})[record["zone"]] = record["matched"]
+
+        if record["stage"] == "drift":
+            state["drift"].setdefault(market, {})[record["zone"]] = 1
+
+    for (market, name), value in report.counters.items():
+        if market is None or name not in REPORT_COUNTERS:
+            continue
+        counters = state["counters"].setdefault(REPORT_COUNTERS[name][0], {})
+        counters[market] = counters.get(market, 0) + value
+
+    return state
+
+
+def render(state, now=None):
+    """
+    This function turns the state into the Prometheus text exposition format.
+    """
+    now = now or time.time()
+    lines = []
+
+    for _, (metric, help_text, buckets) in sorted(HISTOGRAMS.items()):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for market, histogram in sorted(state["histograms"].get(metric, {}).items()):
+            label = f'market="{_escape(market)}"'
+            for bound, count in zip(buckets, histogram["buckets"]):
+                lines.append(f'{metric}_bucket{{{label},le="{_format(bound)}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{metric}_sum{{{label}}} {histogram['sum']}")
+            lines.append(f"{metric}_count{{{label}}} {histogram['count']}")
+
+    for metric, help_text in sorted(
+        list(FIELD_COUNTERS.values())
+        + list(STAGE_COUNTERS.values())
+        + list(REPORT_COUNTERS.values())
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for market, value in sorted(state["counters"].get(metric, {}).items()):
+            lines.append(f'{metric}{{market="{_escape(market)}"}} {value}')
+
+    lines.append(
+        "# HELP hp_tracker_last_success_timestamp_seconds When a market was last captured successfully."
+    )
+    lines.append("# TYPE hp_tracker_last_success_timestamp_seconds gauge")
+    for market, timestamp in sorted(state["last_success"].items()):
+        lines.append(
+            f'hp_tracker_last_success_timestamp_seconds{{market="{_escape(market)}"}} {timestamp}'
+        )
+
+    lines.append(
+        "# HELP hp_tracker_seconds_since_last_success Seconds since a market was last captured successfully."
+    )
+    lines.append("# TYPE hp_tracker_seconds_since_last_success gauge")
+    for market, timestamp in sorted(state["last_success"].items()):
+        lines.append(
+            f'hp_tracker_seconds_since_last_success{{market="{_escape(market)}"}} {round(now - timestamp, 3)}'
+        )
+
+    lines.append(
+        "# HELP hp_tracker_selector_matches Elements a zone's selector matched on the latest run."
+    )
+    lines.append("# TYPE hp_tracker_selector_matches gauge")
+    for market, zones in sorted(state["selectors"].items()):
+        for zone, matched in sorted(zones.items()):
+            lines.append(
+                f'hp_tracker_selector_matches{{market="{_escape(market)}",zone="{zone}"}} {matched}'
+            )
+
+    lines.append(
+        "# HELP hp_tracker_layout_drift Whether a zone drifted from its baseline on the latest run."
+    )
+    lines.append("# TYPE hp_tracker_layout_drift gauge")
+    for market, zones in sorted(state["selectors"].items()):
+        for zone in sorted(zones):
+            drifted = state["drift"].get(market, {}).get(zone, 0)
+            lines.append(
+                f'hp_tracker_layout_drift{{market="{_escape(market)}",zone="{zone}"}} {drifted}'
+            )
+
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomically(path, content):
+    # The textfile collector might read the file while we write it, so we write a temporary file and swap it in.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        f.write(content)
+    os.replace(temporary_path, path)
+
+
+def write_metrics(report, textfile=METRICS_TEXTFILE, state_path=METRICS_STATE_PATH):
+    """
+    This function updates the metrics with a run report and writes the Prometheus textfile.
+    """
+    state = update_state(load_state(state_path), report)
+    _write_atomically(state_path, json.dumps(state, indent=2, sort_keys=True))
+    _write_atomically(textfile, render(state))
@@ -0,0 +1,284 @@
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytz
+from dateutil import parser as dateparser
+from gspread.utils import rowcol_to_a1
+
+import store
+from archive import ARCHIVE_DIR
+from archive import SCHEMA as ARCHIVE_SCHEMA
+from archive import _write, partition_dir, snapshot_table
+from snapshot import Snapshot
+
+# How many rows of a worksheet we read per request. A page is all we ever hold of a sheet.
+PAGE_ROWS = int(os.environ.get("MIGRATE_PAGE_ROWS", 1000))
+
+# New captures are inserted at the top of the sheets while we read, which pushes everything down a row.
+# We measure a sheet once, and read this many rows past the bottom of every page, so a row pushed out
+# of its page (by up to a day of hourly captures) isn't missed. The overlap is deduplicated.
+SHIFT_MARGIN = 24
+
+LOGS = ["Headline log", "URL log", "Tab order log"]
+
+# The rows of the sheets, as they come, deduplicated on their date and time. When the clocks fall back,
+# an hour comes up twice with the same date and time, so "fold" says which one a row is (0 for the first).
+# The checkpoint of a worksheet is how many rows from the bottom (the oldest) we've stored,
+# which doesn't move when new captures are inserted at the top.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    market TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    fold INTEGER NOT NULL DEFAULT 0,
+    captured_at TEXT,
+    cells TEXT NOT NULL,
+    PRIMARY KEY (market, sheet, date, time, fold)
+);
+CREATE INDEX IF NOT EXISTS sheet_rows_captured_at ON sheet_rows (market, sheet, captured_at);
+CREATE TABLE IF NOT EXISTS migration_checkpoints (
+    market TEXT NOT NULL,
+    sheet TEXT NOT NULL,
+    rows_done INTEGER NOT NULL,
+    PRIMARY KEY (market, sheet)
+);
+"""
+
+COLLECTION_ID = re.compile(r"[?&]id=(\d+)")
+
+
+def captured_at(date, time, tz, fold=0):
+    """
+    This function turns a row's date and time (in the market's timezone) into a UTC timestamp.
+    The fold picks the first or second of an hour that comes up twice when the clocks fall back.
+    Example input: 2024-03-05, 1:00 PM, US/Central
+    Example output: 2024-03-05T19:00:00+00:00
+    """
+    try:
+        local = datetime.strptime(f"{date} {time}", "%Y-%m-%d %I:%M %p")
+    except ValueError:
+        # The oldest rows don't all use the same format.
+        try:
+            local = dateparser.parse(f"{date} {time}")
+        except (ValueError, OverflowError):
+            return None
+    return tz.localize(local, is_dst=not fold).astimezone(timezone.utc).isoformat()
+
+
+def migrate_worksheet(
+    market, worksheet, call, path=store.STORE_PATH, page_rows=PAGE_ROWS
+):
+    """
+    This function copies a worksheet into the store a page at a time, from the bottom up,
+    picking up where the last migration left off.
+    """
+    name, tz = market["name"], pytz.timezone(market["timezone"])
+    header = call(lambda: worksheet.row_values(1))
+    stored = 0
+
+    with closing(store.connect(SCHEMA, path)) as connection:
+        row = connection.execute(
+            "SELECT rows_done FROM migration_checkpoints WHERE market = ? AND sheet = ?",
+            (name, worksheet.title),
+        ).fetchone()
+        done = row["rows_done"] if row else 0
+
+        # The sheet's size comes with its metadata, so measuring it doesn't read any rows.
+        last = worksheet.row_count
+        while True:
+            bottom = last - done
+            if bottom < 2:
+                break
+            top = max(2, bottom - page_rows + 1)
+            end = min(bottom + SHIFT_MARGIN, last)
+            values = call(
+                lambda: worksheet.get_values(f"A{top}:{rowcol_to_a1(end, len(header))}")
+            )
+
+            # A row is the second of a repeated hour if the row below it (the capture before) has the same
+            # date and time, so we go from the bottom up. The last row we read doesn't have the row below it,
+            # unless it's the end of the sheet (or the rows after it are empty, which the API leaves off).
+            # It's one the page before stored anyway, so it's skipped.
+            if end < last and len(values) == end - top + 1:
+                values = values[:-1]
+            rows, below, fold = [], None, 0
+            for cells in reversed(values):
+                record = dict(zip(header, cells))
+                date, time = record.pop("Date", ""), record.pop("Time", "")
+                # Rows past the end of the logs are empty, and skipped.
+                if not date or not time:
+                    below = None
+                    continue
+                fold = fold + 1 if below == (date, time) else 0
+                below = (date, time)
+                rows.append(
+                    (
+                        name,
+                        worksheet.title,
+                        date,
+                        time,
+                        fold,
+                        captured_at(date, time, tz, fold),
+                        json.dumps(record, ensure_ascii=False),
+                    )
+                )
+
+            # The page and the checkpoint are stored together, so a migration that's cut off resumes cleanly.
+            with connection:
+                stored += connection.executemany(
+                    """
+                    INSERT OR IGNORE INTO sheet_rows (
+                        market, sheet, date, time, fold, captured_at, cells
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                ).rowcount
+                done += bottom - top + 1
+                connection.execute(
+                    """
+                    INSERT OR REPLACE INTO migration_checkpoints (market, sheet, rows_done)
+                    VALUES (?, ?, ?)
+                    """,
+                    (name, worksheet.title, done),
+                )
+            print(f"📄 {name} {worksheet.title}: {done} of {last - 1} rows")
+    return stored
+
+
+def migrate_market(
+    gc, market, call, report, path=store.STORE_PATH, page_rows=PAGE_ROWS
+):
+    report.start_market(market["name"])
+    spreadsheet = call(lambda: gc.open_by_url(market["spreadsheet"]))
+    stored = 0
+    for worksheet in call(spreadsheet.worksheets):
+        if worksheet.title in LOGS:
+            with report.stage("migrate", sheet=worksheet.title) as stage:
+                stage["rows"] = migrate_worksheet(market, worksheet, call, path, page_rows)
+                stored += stage["rows"]
+    return stored
+
+
+def migrate(
+    gc, markets, call, report, workers=4, path=store.STORE_PATH, page_rows=PAGE_ROWS
+):
+    """
+    This function migrates every market's logs into the store, several markets at once.
+    The Sheets API's rate limit (in markets.json) applies to all of them together.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            name: executor.submit(
+                migrate_market, gc, market, call, report, path, page_rows
+            )
+            for name, market in markets.items()
+        }
+    for name, future in futures.items():
+        try:
+            print(f"✅ {name}: {future.result()} new rows")
+        except Exception as e:
+            print(f"💥 Couldn't migrate {name}, run it again to resume: {e!r}")
+
+
+def migrated_snapshots(market, path=store.STORE_PATH):
+    """
+    This function yields a market's migrated captures as Snapshots, oldest first, joining the three logs
+    on their date and time. It reads from the store as it goes.
+    """
+    with closing(store.connect(SCHEMA, path)) as connection:
+        captures = connection.execute(
+            """
+            SELECT headlines.date, headlines.time, headlines.captured_at,
+                headlines.cells AS headlines,
+                urls.cells AS urls,
+                collections.cells AS collections
+            FROM sheet_rows AS headlines
+            LEFT JOIN sheet_rows AS urls ON urls.market = headlines.market
+                AND urls.sheet = 'URL log'
+                AND urls.date = headlines.date AND urls.time = headlines.time
+                AND urls.fold = headlines.fold
+            LEFT JOIN sheet_rows AS collections ON collections.market = headlines.market
+                AND collections.sheet = 'Tab order log'
+                AND collections.date = headlines.date AND collections.time = headlines.time
+                AND collections.fold = headlines.fold
+            WHERE headlines.market = ? AND headlines.sheet = 'Headline log'
+                AND headlines.captured_at IS NOT NULL
+            ORDER BY headlines.captured_at
+            """,
+            (market["name"],),
+        )
+        for capture in captures:
+            headlines = json.loads(capture["headlines"])
+            urls = json.loads(capture["urls"] or "{}")
+            collections = json.loads(capture["collections"] or "{}")
+            snapshot = Snapshot(
+                market["name"], capture["date"], capture["time"], capture["captured_at"]
+            )
+            ids = []
+            for slot in headlines:
+                match = COLLECTION_ID.search(str(collections.get(slot) or ""))
+                ids.append(int(match.group(1)) if match else 0)
+            snapshot.add_zone(
+                list(headlines),
+                [str(headlines[slot]) or None for slot in headlines],
+                [str(urls.get(slot) or "") or None for slot in headlines],
+                ids,
+            )
+            yield snapshot
+
+
+def _archived_captures(directory):
+    """
+    This function returns the date and time of every capture already in a month of the archive.
+    """
+    if not os.path.isdir(directory):
+        return set()
+    table = pq.read_table(directory, columns=["date", "time"], schema=ARCHIVE_SCHEMA)
+    return set(zip(table["date"].to_pylist(), table["time"].to_pylist()))
+
+
+def export_archive(market, path=store.STORE_PATH, archive_dir=ARCHIVE_DIR):
+    """
+    This function writes a market's migrated captures into the Parquet archive, a file per month.
+    Captures the archive already has (the ones we logged ourselves) are skipped.
+    """
+    exported = 0
+
+    def flush(month, tables):
+        directory = partition_dir(market["slug"], month, archive_dir)
+        archived = _archived_captures(directory)
+        tables = [
+            table
+            for table in tables
+            if (table["date"][0].as_py(), table["time"][0].as_py()) not in archived
+        ]
+        if not tables:
+            return 0
+        os.makedirs(directory, exist_ok=True)
+        # The file is named after its first capture, like the archive's own, so exporting more later adds a file.
+        first = tables[0]["captured_at"][0].as_py()
+        _write(
+            pa.concat_tables(tables).unify_dictionaries().combine_chunks(),
+            os.path.join(directory, f"part-{first:%Y%m%dT%H%M%S}-migrated.parquet"),
+        )
+        return len(tables)
+
+    # We hold a month of captures at a time.
+    month, tables = None, []
+    for snapshot in migrated_snapshots(market, path):
+        when = datetime.fromisoformat(snapshot.captured_at)
+        if month and (when.year, when.month) != (month.year, month.month):
+            exported += flush(month, tables)
+            tables = []
+        month = when
+        tables.append(snapshot_table(snapshot))
+    if tables:
+        exported += flush(month, tables)
+    return exported
@@ -0,0 +1,198 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Which URL held every slot at every hour, as a matrix of URL IDs per market:
+# store/occupancy/<market>/matrix.int32 (a row per hour, a column per slot), urls.txt (line N is URL ID N)
+# and meta.json (the slots, in column order, and the hour of row 0).
+OCCUPANCY_DIR = os.environ.get("OCCUPANCY_DIR", os.path.join("store", "occupancy"))
+
+# Hours are counted from here. A matrix starts at the hour of its market's first capture.
+EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+# A slot that was empty when we captured it, and an hour we didn't capture at all.
+EMPTY = 0
+MISSING = -1
+
+
+def hour_number(when):
+    """
+    This function returns the number of an hour (a datetime or an ISO timestamp), counted from EPOCH.
+    Example input: 2020-01-02T01:30:00+00:00
+    Example output: 25
+    """
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int((when - EPOCH).total_seconds() // 3600)
+
+
+def hour_time(number):
+    return EPOCH + timedelta(hours=int(number))
+
+
+class Occupancy:
+    """
+    This class is a market's occupancy matrix. The matrix is memory mapped, so queries only read the
+    hours they look at, however many years it holds.
+    """
+
+    def __init__(self, market_slug, occupancy_dir=OCCUPANCY_DIR):
+        self.directory = os.path.join(occupancy_dir, market_slug)
+        self.matrix_path = os.path.join(self.directory, "matrix.int32")
+        self.urls_path = os.path.join(self.directory, "urls.txt")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+
+        self.slots = []
+        self.origin = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            self.slots = meta["slots"]
+            self.origin = meta["origin"]
+
+        self.urls = [None]
+        if os.path.exists(self.urls_path):
+            with open(self.urls_path) as f:
+                self.urls += f.read().splitlines()
+        self.url_ids = {url: i for i, url in enumerate(self.urls) if url}
+
+    def __len__(self):
+        if not self.slots or not os.path.exists(self.matrix_path):
+            return 0
+        return os.path.getsize(self.matrix_path) // (4 * len(self.slots))
+
+    def matrix(self, mode="r"):
+        if not len(self):
+            return np.full((0, len(self.slots)), MISSING, dtype=np.int32)
+        return np.memmap(
+            self.matrix_path, dtype=np.int32, mode=mode, shape=(len(self), len(self.slots))
+        )
+
+    def _save_meta(self):
+        with open(self.meta_path, "w") as f:
+            json.dump({"origin": self.origin, "slots": self.slots}, f, indent=2)
+
+    def _add_slots(self, slots):
+        # A new slot is a new column, so the matrix is rewritten. That only happens when a layout changes.
+        old = np.array(self.matrix())
+        self.slots = self.slots + [slot for slot in slots if slot not in self.slots]
+        new = np.full((len(old), len(self.slots)), MISSING, dtype=np.int32)
+        new[:, : old.shape[1]] = old
+        new.tofile(self.matrix_path)
+        self._save_meta()
+
+    def _url_id(self, url, new_urls):
+        if not url:
+            return EMPTY
+        if url not in self.url_ids:
+            self.url_ids[url] = len(self.urls)
+            self.urls.append(url)
+            new_urls.append(url)
+        return self.url_ids[url]
+
+    def add(self, snapshot):
+        """
+        This function writes a capture into its hour's row. Hours we skipped stay MISSING.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        hour = hour_number(snapshot.captured_at)
+        if not os.path.exists(self.meta_path):
+            self.origin = hour
+            self.slots = list(snapshot.slots)
+            self._save_meta()
+        elif any(slot not in self.slots for slot in snapshot.slots):
+            self._add_slots(snapshot.slots)
+
+        row = hour - self.origin
+        if row < 0:
+            raise ValueError(
+                f"Can't store a capture from before {hour_time(self.origin):%Y-%m-%d %H:00}"
+            )
+
+        # We grow the file up to this hour, filling the hours in between as missing.
+        if row >= len(self):
+            filler = np.full((row + 1 - len(self), len(self.slots)), MISSING, dtype=np.int32)
+            with open(self.matrix_path, "ab") as f:
+                f.write(filler.tobytes())
+
+        new_urls = []
+        values = np.full(len(self.slots), EMPTY, dtype=np.int32)
+        for slot, url in zip(snapshot.slots, snapshot.urls):
+            values[self.slots.index(slot)] = self._url_id(url, new_urls)
+
+        if new_urls:
+            with open(self.urls_path, "a") as f:
+                f.write("".join(f"{url}\n" for url in new_urls))
+
+        matrix = self.matrix("r+")
+        matrix[row] = values
+        matrix.flush()
+        return row
+
+    def column(self, slot, since=None, until=None):
+        """
+        This function returns the hours and URL IDs of a slot between two times (as a view, nothing is copied).
+        """
+        start = max(hour_number(since) - self.origin, 0) if since else 0
+        end = min(max(hour_number(until) - self.origin, 0), len(self)) if until else len(self)
+        start = min(start, end)
+        hours = np.arange(start, end) + (self.origin or 0)
+        return hours, self.matrix()[start:end, self.slots.index(slot)]
+
+    def holders(self, slot, since=None, until=None):
+        """
+        This function returns who held a slot, as runs of consecutive captures:
+        (URL, first hour, last hour, hours held). Hours we didn't capture are skipped.
+        """
+        hours, ids = self.column(slot, since, until)
+        captured = ids != MISSING
+        hours, ids = hours[captured], ids[captured]
+        if not len(ids):
+            return []
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1])
+        ends = np.concatenate([starts[1:] - 1, [len(ids) - 1]])
+        return [
+            (
+                self.urls[ids[start]],
+                hour_time(hours[start]),
+                hour_time(hours[end]),
+                int(end - start + 1),
+            )
+            for start, end in zip(starts, ends)
+        ]
+
+    def turnover(self, slot, since=None, until=None):
+        """
+        This function returns how often a slot changed hands from one captured hour to the next (0 to 1).
+        """
+        _, ids = self.column(slot, since, until)
+        consecutive = (ids[1:] != MISSING) & (ids[:-1] != MISSING)
+        if not consecutive.any():
+            return None
+        return float(((ids[1:] != ids[:-1]) & consecutive).sum() / consecutive.sum())
+
+
+def update_occupancy(market, snapshot, occupancy_dir=OCCUPANCY_DIR):
+    return Occupancy(market["slug"], occupancy_dir).add(snapshot)
+
+
+def print_occupancy(market, slot, since=None, until=None, occupancy_dir=OCCUPANCY_DIR):
+    occupancy = Occupancy(market["slug"], occupancy_dir)
+    if slot not in occupancy.slots:
+        print(
+            f"🤷 No {slot} slot for {market['name']}. "
+            f"Its slots are: {', '.join(occupancy.slots)}"
+        )
+        return
+    for url, first, last, hours in occupancy.holders(slot, since, until):
+        print(
+            f"{first:%Y-%m-%d %H:00} → {last:%Y-%m-%d %H:00} UTC ({hours}h)  "
+            f"{url or '(empty)'}"
+        )
+    turnover = occupancy.turnover(slot, since, until)
+    if turnover is not None:
+        print(f"🔄 {slot} changed hands in {turnover:.0%} of consecutive hours")
@@ -0,0 +1,152 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from registry import slugify
+
+# How many allocation sites we keep for each stage, and how many functions we print per market.
+TOP_ALLOCATIONS = 10
+TOP_FUNCTIONS = 40
+
+# A stage's own peak needs tracemalloc.reset_peak, which only exists from Python 3.9 on.
+# Before that the only peak there is is the whole run's, which says nothing about a stage, so we leave it out.
+STAGE_PEAKS = hasattr(tracemalloc, "reset_peak")
+
+
+class Profiler:
+    """
+    This class wraps a run in cProfile and/or tracemalloc and writes what it finds to a directory.
+
+    With cProfile on, every market gets its own .pstats file (plus a plain text version sorted by
+    cumulative time). With tracemalloc on, we report the peak memory and the top allocation sites
+    of every stage of every market.
+    """
+
+    def __init__(self, profile_dir=None, trace_malloc_dir=None):
+        self.profile_dir = profile_dir
+        self.trace_malloc_dir = trace_malloc_dir
+        self.stages = []
+        # Markets are logged on several threads at once, so every thread keeps its own stack of snapshots.
+        self._local = threading.local()
+
+    @property
+    def _frames(self):
+        if not hasattr(self._local, "frames"):
+            self._local.frames = []
+        return self._local.frames
+
+    def start(self):
+        if self.trace_malloc_dir and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+
+    @contextmanager
+    def market(self, market):
+        """
+        This function profiles everything that happens for a market and dumps the stats.
+        """
+        if not self.profile_dir:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{slugify(market)}.pstats")
+            profile.dump_stats(path)
+
+            # We also write a text version, which is what we actually diff between releases.
+            stream = io.StringIO()
+            stats = pstats.Stats(profile, stream=stream)
+            stats.strip_dirs().sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            with open(path.replace(".pstats", ".txt"), "w") as f:
+                f.write(stream.getvalue())
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+
+    # The two functions below are called by the run report every time a stage starts and ends.
+
+    # A nested stage resets tracemalloc's peak when it starts, so every stage keeps the highest peak
+    # it saw before that and takes its children's peaks when they finish. That way an outer stage
+    # like extract reports its own peak, dns, fetch and parse included.
+
+    def stage_started(self, name):
+        if not tracemalloc.is_tracing():
+            return
+        frames = self._frames
+        if STAGE_PEAKS and frames:
+            _, peak = tracemalloc.get_traced_memory()
+            frames[-1]["peak"] = max(frames[-1]["peak"], peak)
+        frames.append({"snapshot": self._snapshot(), "peak": 0})
+        # The peak is reset after the snapshot, so taking it doesn't count against the stage.
+        if STAGE_PEAKS:
+            tracemalloc.reset_peak()
+
+    def stage_finished(self, market, name):
+        if not tracemalloc.is_tracing() or not self._frames:
+            return {}
+        frame = self._frames.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(frame["peak"], peak) if STAGE_PEAKS else None
+        if peak is not None and self._frames:
+            self._frames[-1]["peak"] = max(self._frames[-1]["peak"], peak)
+        top = self._snapshot().compare_to(frame["snapshot"], "lineno")[:TOP_ALLOCATIONS]
+        self.stages.append(
+            {
+                "market": market,
+                "stage": name,
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [
+                    {
+                        "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        "size_diff": stat.size_diff,
+                        "count_diff": stat.count_diff,
+                    }
+                    for stat in top
+                ],
+            }
+        )
+        return {"peak_bytes": peak} if peak is not None else {}
+
+    def finish(self):
+        """
+        This function writes the tracemalloc report, as JSON and as a table we can read.
+        """
+        if not self.trace_malloc_dir:
+            return
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        os.makedirs(self.trace_malloc_dir, exist_ok=True)
+        with open(os.path.join(self.trace_malloc_dir, "tracemalloc.json"), "w") as f:
+            json.dump(self.stages, f, indent=2)
+
+        with open(os.path.join(self.trace_malloc_dir, "tracemalloc.txt"), "w") as f:
+            if not STAGE_PEAKS:
+                f.write("Stage peaks need Python 3.9 or later, so there are only allocation sites.\n")
+            for stage in self.stages:
+                peak = stage["peak_bytes"]
+                f.write(
+                    f"{stage['market']} / {stage['stage']}:"
+                    + (f" peak {peak / 1024 / 1024:.1f} MiB\n" if peak is not None else "\n")
+                )
+                for allocation in stage["top_allocations"]:
+                    f.write(
+                        f"    {allocation['size_diff'] / 1024:>10.1f} KiB  {allocation['site']}\n"
+                    )
@@ -0,0 +1,103 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# What we allow a host that isn't listed in the rate limits of markets.json.
+DEFAULT_LIMITS = {"requests_per_minute": 30, "concurrency": 2, "burst": 2}
+
+
+class TokenBucket:
+    """
+    This class hands out tokens at a steady rate. A request takes a token, and if there
+    aren't any left it waits exactly as long as it takes for the next one to come in.
+    """
+
+    def __init__(self, requests_per_minute, burst):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        This function takes a token, waiting for one if we have to, and returns how long we waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostLimiter:
+    """
+    This class keeps a host within its requests per minute and its number of requests at once.
+    """
+
+    def __init__(self, requests_per_minute, concurrency, burst=1):
+        self.bucket = TokenBucket(requests_per_minute, burst)
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+    @contextmanager
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            yield self.bucket.take()
+        finally:
+            self.slots.release()
+
+
+class RateLimiter:
+    """
+    This class gives every host its own limiter. A host matches the most specific entry in the
+    config, so "expressnews.com" covers www.expressnews.com and any other subdomain.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.default = dict(DEFAULT_LIMITS, **config.get("default", {}))
+        self.hosts = config.get("hosts", {})
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def _origin(self, host):
+        # Find the longest configured domain that the host belongs to.
+        matches = [
+            domain
+            for domain in self.hosts
+            if host == domain or host.endswith(f".{domain}")
+        ]
+        return max(matches, key=len) if matches else host
+
+    def for_host(self, host):
+        origin = self._origin(host)
+        with self.lock:
+            if origin not in self.limiters:
+                limits = dict(self.default, **self.hosts.get(origin, {}))
+                self.limiters[origin] = HostLimiter(
+                    limits["requests_per_minute"],
+                    limits["concurrency"],
+                    limits.get("burst", 1),
+                )
+            return self.limiters[origin]
+
+    @contextmanager
+    def limit(self, url_or_host):
+        """
+        This function waits until we're allowed to send a request to a URL (or a host) and
+        holds one of its concurrency slots while the request runs. It yields how long we waited.
+        """
+        host = urlsplit(url_or_host).hostname or url_or_host
+        with self.for_host(host).acquire() as waited:
+            yield waited
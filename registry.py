@@ -0,0 +1,103 @@
+import json
+import os
+import re
+import zlib
+from collections import OrderedDict
+
+# The markets we track and the layout templates they share.
+MARKETS_PATH = os.environ.get("MARKETS_PATH", "markets.json")
+
+# The zones of a homepage, in the order their columns appear in the logs.
+ZONE_ORDER = ["breaking", "just_in", "four_pack", "centerpiece", "top_headlines"]
+
+
+def slugify(name):
+    """
+    This function turns a market name into something we can use in file names.
+    Example input: Connecticut Insider
+    Example output: connecticut-insider
+    """
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def slot_names(zone, slots):
+    """
+    This function returns the column names of a zone's slots.
+    Example input: centerpiece, 3
+    Example output: ["CP", "Tab 2", "Tab 3"]
+    """
+    if zone == "breaking":
+        return [f"Breaking {i}" for i in range(1, slots + 1)]
+    if zone == "just_in":
+        return ["Just In"]
+    if zone == "four_pack":
+        return [f"Trending {i}" for i in range(1, slots + 1)]
+    if zone == "centerpiece":
+        return ["CP"] + [f"Tab {i}" for i in range(2, slots + 1)]
+    if zone == "top_headlines":
+        return [f"Top {i}" for i in range(1, slots + 1)]
+    raise ValueError(f"Unknown zone: {zone}")
+
+
+def load_registry(path=MARKETS_PATH):
+    with open(path) as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def load_rate_limits(path=MARKETS_PATH):
+    """
+    This function returns the requests per minute and concurrency we allow every host.
+    """
+    return load_registry(path).get("rate_limits", {})
+
+
+def load_markets(path=MARKETS_PATH):
+    """
+    This function reads the market registry and returns a dictionary of markets, keyed by name.
+    Every market gets its template's zones (on top of the zones all templates share) and a slug.
+    """
+    registry = load_registry(path)
+
+    markets = OrderedDict()
+    for market in registry["markets"]:
+        template = registry["templates"][market["template"]]
+
+        zones = OrderedDict(registry.get("common_zones", {}))
+        zones.update(template["zones"])
+        zones.update(market.get("zones", {}))
+
+        market = OrderedDict(market)
+        market["slug"] = slugify(market["name"])
+        market["zones"] = OrderedDict(
+            (zone, zones[zone]) for zone in ZONE_ORDER if zone in zones
+        )
+        market.setdefault("tracking_params", [])
+        market.setdefault("strip_from_urls", [])
+        market.setdefault("token_domains", registry.get("token_domains", []))
+        markets[market["name"]] = market
+    return markets
+
+
+def parse_shard(shard):
+    """
+    This function reads a shard like "2/4" and returns (2, 4).
+    """
+    index, count = (int(part) for part in shard.split("/"))
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard {shard} is out of range, it should look like 1/{count}")
+    return index, count
+
+
+def select_shard(markets, shard):
+    """
+    This function keeps the markets that belong to a shard. A market always lands in the same
+    shard (we hash its name), so adding a market doesn't reshuffle all the others.
+    """
+    if not shard:
+        return markets
+    index, count = parse_shard(shard)
+    return OrderedDict(
+        (name, market)
+        for name, market in markets.items()
+        if zlib.crc32(market["slug"].encode()) % count == index - 1
+    )
@@ -0,0 +1,184 @@
+from contextlib import closing
+
+import store
+from analytics import BREAKING_ZONES
+from drift import zone_for_column
+from dwell import CAPTURE_HOURS
+
+# Small tables for dashboards, kept up to date on every capture so reading them never scans the logs.
+# Days and hours are in the market's timezone, like the spreadsheets.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    market TEXT NOT NULL,
+    day TEXT NOT NULL,
+    captures INTEGER NOT NULL DEFAULT 0,
+    distinct_stories INTEGER NOT NULL DEFAULT 0,
+    slot_changes INTEGER NOT NULL DEFAULT 0,
+    breaking_hours REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (market, day)
+);
+CREATE TABLE IF NOT EXISTS hourly_rollups (
+    market TEXT NOT NULL,
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    filled_slots INTEGER NOT NULL,
+    slot_changes INTEGER NOT NULL,
+    breaking INTEGER NOT NULL,
+    PRIMARY KEY (market, day, hour)
+);
+CREATE TABLE IF NOT EXISTS daily_story_hours (
+    market TEXT NOT NULL,
+    day TEXT NOT NULL,
+    url TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (market, day, url)
+);
+CREATE INDEX IF NOT EXISTS daily_story_hours_top ON daily_story_hours (market, day, hours);
+CREATE TABLE IF NOT EXISTS rollup_last_capture (
+    market TEXT NOT NULL,
+    slot TEXT NOT NULL,
+    url TEXT,
+    PRIMARY KEY (market, slot)
+);
+"""
+
+
+def _hour(time):
+    """
+    This function returns the hour of a time in the logs' format.
+    Example input: 1:00 PM
+    Example output: 13
+    """
+    clock, meridiem = time.split()
+    return int(clock.split(":")[0]) % 12 + (12 if meridiem.upper() == "PM" else 0)
+
+
+def update_rollups(market, snapshot, path=store.STORE_PATH):
+    """
+    This function adds a capture to the rollups. It only touches the capture's day, hour and stories.
+    """
+    name = market["name"]
+    urls = dict(zip(snapshot.slots, snapshot.urls))
+    breaking = any(
+        url for slot, url in urls.items() if zone_for_column(slot) in BREAKING_ZONES
+    )
+
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        # A slot changed if it doesn't hold what it held in the market's last capture.
+        last = {
+            row["slot"]: row["url"]
+            for row in connection.execute(
+                "SELECT slot, url FROM rollup_last_capture WHERE market = ?", (name,)
+            )
+        }
+        slot_changes = sum(
+            1 for slot, url in urls.items() if slot in last and last[slot] != url
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO rollup_last_capture (market, slot, url) VALUES (?, ?, ?)",
+            [(name, slot, url) for slot, url in urls.items()],
+        )
+
+        new_stories = 0
+        for url in dict.fromkeys(url for url in urls.values() if url):
+            # A story's first capture of the day is one more distinct story for the day.
+            new_stories += connection.execute(
+                """
+                INSERT OR IGNORE INTO daily_story_hours (market, day, url, hours)
+                VALUES (?, ?, ?, 0)
+                """,
+                (name, snapshot.date, url),
+            ).rowcount
+            connection.execute(
+                """
+                UPDATE daily_story_hours SET hours = hours + ?
+                WHERE market = ? AND day = ? AND url = ?
+                """,
+                (CAPTURE_HOURS, name, snapshot.date, url),
+            )
+
+        connection.execute(
+            """
+            INSERT INTO daily_rollups (market, day) VALUES (?, ?)
+            ON CONFLICT (market, day) DO NOTHING
+            """,
+            (name, snapshot.date),
+        )
+        connection.execute(
+            """
+            UPDATE daily_rollups SET
+                captures = captures + 1,
+                distinct_stories = distinct_stories + ?,
+                slot_changes = slot_changes + ?,
+                breaking_hours = breaking_hours + ?
+            WHERE market = ? AND day = ?
+            """,
+            (
+                new_stories,
+                slot_changes,
+                CAPTURE_HOURS if breaking else 0,
+                name,
+                snapshot.date,
+            ),
+        )
+        connection.execute(
+            """
+            INSERT OR REPLACE INTO hourly_rollups (
+                market, day, hour, filled_slots, slot_changes, breaking
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                name,
+                snapshot.date,
+                _hour(snapshot.time),
+                sum(1 for url in urls.values() if url),
+                slot_changes,
+                int(breaking),
+            ),
+        )
+
+
+def daily_rollups(market, since=None, path=store.STORE_PATH):
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                "SELECT * FROM daily_rollups WHERE market = ? AND day >= ? ORDER BY day",
+                (market, since or ""),
+            )
+        ]
+
+
+def top_stories(market, day, limit=5, path=store.STORE_PATH):
+    """
+    This function returns the URLs that spent the most hours on a market's homepage on a day.
+    """
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                """
+                SELECT url, hours FROM daily_story_hours
+                WHERE market = ? AND day = ?
+                ORDER BY hours DESC
+                LIMIT ?
+                """,
+                (market, day, limit),
+            )
+        ]
+
+
+def print_rollups(market, since=None, path=store.STORE_PATH):
+    rows = daily_rollups(market, since, path)
+    if not rows:
+        print(f"🤷 No rollups for {market} yet")
+        return
+    print(f"{'Day':<12}{'Captures':>10}{'Stories':>10}{'Changes':>10}{'Breaking h':>12}")
+    for row in rows:
+        print(
+            f"{row['day']:<12}{row['captures']:>10}{row['distinct_stories']:>10}"
+            f"{row['slot_changes']:>10}{row['breaking_hours']:>12g}"
+        )
+    print(f"\n🏆 Longest on the homepage on {rows[-1]['day']}:")
+    for story in top_stories(market, rows[-1]["day"], path=path):
+        print(f"   {story['hours']:g}h  {story['url']}")
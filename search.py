@@ -0,0 +1,90 @@
+import sqlite3
+from contextlib import closing
+
+import store
+
+# Every headline we capture, once per capture. Only the headline is searchable; the rest are filters.
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS headlines USING fts5(
+    headline,
+    market UNINDEXED,
+    captured_at UNINDEXED,
+    slot UNINDEXED,
+    url UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+
+def index_headlines(market, slots, captured_at, path=store.STORE_PATH):
+    """
+    This function adds the headlines of a capture to the search index.
+    """
+    rows = [
+        (item["headline"], market["name"], captured_at, slot, item["url"])
+        for slot, item in slots.items()
+        if item["headline"]
+    ]
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        connection.executemany(
+            "INSERT INTO headlines (headline, market, captured_at, slot, url) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+    return len(rows)
+
+
+def search_headlines(
+    query, market=None, slot=None, since=None, until=None, limit=50, path=store.STORE_PATH
+):
+    """
+    This function finds the stories whose headlines match a full-text query, newest first.
+    A story that sat on the homepage for a while comes back once, with when it was first and last
+    seen, how many captures it was in and in which slots.
+    Example input: "spurs AND wembanyama", market="San Antonio", since="2024-01-01"
+    """
+    where = ["headlines MATCH ?"]
+    params = [query]
+    for condition, value in [
+        ("market = ?", market),
+        ("slot = ?", slot),
+        ("captured_at >= ?", since),
+        ("captured_at < ?", until),
+    ]:
+        if value:
+            where.append(condition)
+            params.append(value)
+    params.append(limit)
+
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                f"""
+                SELECT market, url, MAX(headline) AS headline, MIN(captured_at) AS first_seen,
+                       MAX(captured_at) AS last_seen, COUNT(*) AS captures,
+                       GROUP_CONCAT(DISTINCT slot) AS slots
+                FROM headlines
+                WHERE {" AND ".join(where)}
+                GROUP BY market, url
+                ORDER BY last_seen DESC
+                LIMIT ?
+                """,
+                params,
+            )
+        ]
+
+
+def print_search(query, **filters):
+    try:
+        results = search_headlines(query, **filters)
+    except sqlite3.OperationalError as e:
+        print(f"🤦‍♂️ Couldn't search for {query!r}: {e}")
+        return
+    if not results:
+        print(f"🤷 No headlines match {query!r}")
+        return
+    for result in results:
+        print(f"📰 {result['headline']}")
+        print(f"   {result['market']} · {result['slots']} · {result['captures']} captures")
+        print(f"   {result['first_seen']} → {result['last_seen']}")
+        print(f"   {result['url']}")
@@ -0,0 +1,88 @@
+from array import array
+from collections import OrderedDict
+
+import pandas as pd
+
+# Every collection in the tab order log links to its page in WCM.
+WCM_URL = "https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id="
+
+
+class Snapshot:
+    """
+    This class is one capture of a market's homepage. The date and time are stored once, the slots
+    are parallel lists, and collections are kept as integer WCM IDs (0 when a slot has none).
+    It's only turned into DataFrames or sheet rows when we write it out.
+    """
+
+    __slots__ = (
+        "market",
+        "date",
+        "time",
+        "captured_at",
+        "slots",
+        "headlines",
+        "urls",
+        "collections",
+    )
+
+    def __init__(self, market, date, time, captured_at):
+        self.market = market
+        self.date = date
+        self.time = time
+        self.captured_at = captured_at
+        self.slots = []
+        self.headlines = []
+        self.urls = []
+        self.collections = array("l")
+
+    def add_zone(self, names, headlines, urls, collection_ids):
+        self.slots.extend(names)
+        self.headlines.extend(headlines)
+        self.urls.extend(urls)
+        self.collections.extend(collection_ids)
+
+    def collection_url(self, i):
+        """
+        This function returns the WCM URL of a slot's collection, or "" if it doesn't have one.
+        Example input: 0 (a slot whose collection is 105803)
+        Example output: https://wcm.hearstnp.com/index.php?_wcmAction=business/collection&id=105803
+        """
+        return f"{WCM_URL}{self.collections[i]}" if self.collections[i] else ""
+
+    def rows(self):
+        """
+        This function returns the rows for the headline log, the URL log and the tab order log.
+        """
+        header = [("Date", self.date), ("Time", self.time)]
+        return (
+            OrderedDict(header + list(zip(self.slots, self.headlines))),
+            OrderedDict(header + list(zip(self.slots, self.urls))),
+            OrderedDict(
+                header
+                + [(slot, self.collection_url(i)) for i, slot in enumerate(self.slots)]
+            ),
+        )
+
+    def to_frames(self):
+        """
+        This function returns the one-row DataFrames the spreadsheets are updated with.
+        """
+        return tuple(pd.DataFrame(row, index=[0]) for row in self.rows())
+
+    def to_slots(self):
+        """
+        This function returns every slot with its headline, URL and collection, which is what the
+        change log and the indexes work with.
+        Example output: {"CP": {"headline": "...", "url": "https://...", "collection": "https://wcm..."}, ...}
+        """
+        return OrderedDict(
+            (
+                slot,
+                {
+                    "headline": self.headlines[i],
+                    "url": self.urls[i],
+                    "collection": self.collection_url(i) or None,
+                },
+            )
+            for i, slot in enumerate(self.slots)
+        )
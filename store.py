@@ -0,0 +1,21 @@
+import os
+import sqlite3
+
+# The SQLite database our indexes live in. It's rebuilt as we go and isn't committed (see the workflow's cache step).
+STORE_PATH = os.environ.get("STORE_PATH", os.path.join("store", "hp_tracker.sqlite"))
+
+
+def connect(schema="", path=STORE_PATH):
+    """
+    This function opens the store and makes sure the tables in schema exist.
+    Markets are logged at once, so every thread opens its own connection and waits its turn to write.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, timeout=60)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    if schema:
+        connection.executescript(schema)
+    return connection
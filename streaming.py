@@ -0,0 +1,135 @@
+import codecs
+import re
+from html.parser import HTMLParser
+
+# Elements that never get an end tag.
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+}
+
+
+def simple_selector(selector):
+    """
+    This function splits a selector made of a tag and/or classes, or returns None if it's anything fancier.
+    Example input: ul.coreHeadlineList--items
+    Example output: ("ul", {"coreHeadlineList--items"})
+    """
+    match = re.fullmatch(r"([a-z][a-z0-9]*)?((?:\.[\w-]+)*)", selector.strip())
+    if not match or not selector.strip():
+        return None
+    return match.group(1), set(match.group(2).split(".")[1:])
+
+
+class ZoneWatcher(HTMLParser):
+    """
+    This class reads a homepage as it comes in and tells us when every zone we track is in,
+    so we can stop downloading the rest of the page. A required zone is in once its container
+    has closed (or all its slots have, if it has no container) and we've seen its collection.
+    Optional zones, like the breaking news bar, sit above the required ones, so they're settled
+    when the required ones are. A zone we can't follow (a fancy selector, say) means reading the whole page.
+    """
+
+    def __init__(self, zones, encoding="utf-8"):
+        super().__init__()
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.parts = []
+        self.stack = []
+        self.zones = {}
+        for zone, config in zones.items():
+            container, item = None, None
+            if "container" in config:
+                container = simple_selector(config["container"])
+            else:
+                item = simple_selector(config["selector"])
+            collection = config.get("collection") or config.get("collections")
+            self.zones[zone] = {
+                "optional": config.get("optional", False),
+                "trackable": (container or item) is not None,
+                "container": container,
+                "item": item,
+                "slots": config["slots"],
+                "closed": 0,
+                "collection": re.compile(f"hdnce-collection-\\d+-{collection}$")
+                if collection
+                else None,
+                "collection_seen": False,
+            }
+        self.done = False
+
+    def feed_chunk(self, chunk):
+        """
+        This function parses the next chunk of the page and returns whether every zone is in.
+        """
+        text = self.decoder.decode(chunk)
+        self.parts.append(text)
+        if not self.done:
+            self.feed(text)
+            self.done = self._all_in()
+        return self.done
+
+    def text(self):
+        return "".join(self.parts) + self.decoder.decode(b"", final=True)
+
+    @staticmethod
+    def _matches(selector, tag, classes):
+        if selector is None:
+            return False
+        name, required = selector
+        return (name is None or name == tag) and required <= classes
+
+    def handle_starttag(self, tag, attrs):
+        classes = set((dict(attrs).get("class") or "").split())
+        closes = []
+        for zone, watch in self.zones.items():
+            if watch["collection"] and any(watch["collection"].match(c) for c in classes):
+                watch["collection_seen"] = True
+            # We only care about a zone's first container, like select_one.
+            if not watch["closed"] and self._matches(watch["container"], tag, classes):
+                closes.append(zone)
+            elif self._matches(watch["item"], tag, classes):
+                closes.append(zone)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, closes))
+        else:
+            for zone in closes:
+                self.zones[zone]["closed"] += 1
+
+    def handle_endtag(self, tag):
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        # An end tag closes whatever was left open inside it, like browsers do.
+        while self.stack:
+            open_tag, closes = self.stack.pop()
+            for zone in closes:
+                self.zones[zone]["closed"] += 1
+            if open_tag == tag:
+                break
+
+    def _zone_in(self, watch):
+        if not watch["trackable"]:
+            return False
+        if watch["collection"] and not watch["collection_seen"]:
+            return False
+        if watch["container"] is not None:
+            return watch["closed"] > 0
+        return watch["closed"] >= watch["slots"]
+
+    def _all_in(self):
+        required = [watch for watch in self.zones.values() if not watch["optional"]]
+        if not required or not all(self._zone_in(watch) for watch in required):
+            return False
+        # Optional zones we can't follow could be anywhere on the page.
+        return all(watch["trackable"] for watch in self.zones.values())
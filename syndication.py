@@ -0,0 +1,166 @@
+import hashlib
+import re
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import store
+from urls import canonical_id
+
+# Two markets running the same story this far apart still count as syndication.
+SYNDICATION_WINDOW = timedelta(hours=72)
+
+# Headlines shorter than this ("Live updates", "Photos") are too generic to match on.
+MIN_HEADLINE_WORDS = 4
+
+# Every key a story can be matched on (its article ID and its headline hash), and where we saw it.
+# The primary key leads with the key, so finding a story's other markets is a single index lookup.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS story_keys (
+    key TEXT NOT NULL,
+    market TEXT NOT NULL,
+    url TEXT NOT NULL,
+    headline TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    PRIMARY KEY (key, market, url)
+);
+CREATE TABLE IF NOT EXISTS syndication (
+    key TEXT NOT NULL,
+    matched_on TEXT NOT NULL,
+    market TEXT NOT NULL,
+    url TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    other_market TEXT NOT NULL,
+    other_url TEXT NOT NULL,
+    other_first_seen TEXT NOT NULL,
+    PRIMARY KEY (market, url, other_market, other_url)
+);
+CREATE INDEX IF NOT EXISTS syndication_first_seen ON syndication (first_seen);
+"""
+
+
+def article_id(url):
+    """
+    This function returns the ID Hearst gives an article, which stays the same on every site that runs it.
+    Example input: https://www.ctpost.com/news/article/some-story-18412345.php
+    Example output: 18412345
+    """
+    match = re.search(r"-(\d{5,})\.php", url or "")
+    return match.group(1) if match else None
+
+
+def normalize_headline(headline):
+    """
+    This function boils a headline down to its words, so small edits in punctuation or case don't matter.
+    Example input: "Storm knocks out power to 10,000 — again"
+    Example output: "storm knocks out power to 10000 again"
+    """
+    words = re.sub(r"[^\w\s]", "", (headline or "").lower()).split()
+    return " ".join(words)
+
+
+def story_keys(url, headline):
+    """
+    This function returns the keys we match a story on across markets.
+    """
+    keys = []
+    if article_id(url):
+        keys.append(("article_id", f"id:{article_id(url)}"))
+    else:
+        # Without an article ID, the same link on two markets is still the same story.
+        keys.append(("url", f"url:{canonical_id(url)}"))
+    normalized = normalize_headline(headline)
+    if len(normalized.split()) >= MIN_HEADLINE_WORDS:
+        digest = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+        keys.append(("headline", f"headline:{digest}"))
+    return keys
+
+
+def update_syndication(market, slots, captured_at, path=store.STORE_PATH):
+    """
+    This function adds a capture's stories to the key index and links them to the same story on
+    other markets seen within the window. Every story is a couple of index lookups, so it never
+    scans the other markets' history.
+    """
+    cutoff = (datetime.fromisoformat(captured_at) - SYNDICATION_WINDOW).isoformat()
+    stories = {}
+    for item in slots.values():
+        if item["url"]:
+            stories.setdefault(item["url"], item["headline"])
+
+    linked = 0
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        for url, headline in stories.items():
+            for matched_on, key in story_keys(url, headline):
+                connection.execute(
+                    """
+                    INSERT INTO story_keys (key, market, url, headline, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (key, market, url) DO UPDATE SET last_seen = excluded.last_seen
+                    """,
+                    (key, market["name"], url, headline, captured_at, captured_at),
+                )
+                first_seen = connection.execute(
+                    "SELECT first_seen FROM story_keys WHERE key = ? AND market = ? AND url = ?",
+                    (key, market["name"], url),
+                ).fetchone()["first_seen"]
+
+                for other in connection.execute(
+                    "SELECT market, url, first_seen FROM story_keys WHERE key = ? AND market != ? AND last_seen >= ?",
+                    (key, market["name"], cutoff),
+                ).fetchall():
+                    # We store every pair both ways, so either market can look up its syndicated stories.
+                    this = (market["name"], url, first_seen)
+                    that = (other["market"], other["url"], other["first_seen"])
+                    for row in [this + that, that + this]:
+                        linked += connection.execute(
+                            """
+                            INSERT OR IGNORE INTO syndication (
+                                key, matched_on, market, url, first_seen, other_market, other_url, other_first_seen
+                            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            """,
+                            (key, matched_on) + row,
+                        ).rowcount
+    return linked
+
+
+def syndicated_stories(market=None, since=None, limit=50, path=store.STORE_PATH):
+    """
+    This function returns the stories that ran on more than one market, newest first.
+    """
+    where, params = [], []
+    if market:
+        where.append("market = ?")
+        params.append(market)
+    if since:
+        where.append("first_seen >= ?")
+        params.append(since)
+    params.append(limit)
+
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                f"""
+                SELECT * FROM syndication
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY first_seen DESC
+                LIMIT ?
+                """,
+                params,
+            )
+        ]
+
+
+def print_syndication(**filters):
+    results = syndicated_stories(**filters)
+    if not results:
+        print("🤷 No syndicated stories yet")
+        return
+    for result in results:
+        print(
+            f"🔗 {result['market']} ({result['first_seen']}) → "
+            f"{result['other_market']} ({result['other_first_seen']}), by {result['matched_on']}"
+        )
+        print(f"   {result['url']}")
+        print(f"   {result['other_url']}")
@@ -0,0 +1,220 @@
+import json
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from registry import load_registry, slot_names, slugify
+
+# A stand-in for the Hearst homepages, so we can load test the scraper without touching the real sites.
+# Every synthetic market gets a homepage built from its template's zones in markets.json, with the same
+# markup the selectors look for, and stories that rotate from hour to hour like the real ones.
+
+WORDS = (
+    "city council budget storm power school board police fire housing water "
+    "election county state bay area texas houston san antonio connecticut albany "
+    "report crash court mayor vote plan new says after could will over first"
+).split()
+
+
+def _element(selector):
+    """
+    This function splits a simple selector into its tag, id and classes.
+    Example input: div#zoneAL
+    Example output: ("div", "zoneAL", [])
+    """
+    match = re.fullmatch(r"([a-z][a-z0-9]*)?(?:#([\w-]+))?((?:\.[\w-]+)*)", selector)
+    return match.group(1) or "div", match.group(2), match.group(3).split(".")[1:]
+
+
+def _open(selector):
+    tag, element_id, classes = _element(selector)
+    attributes = ""
+    if element_id:
+        attributes += f' id="{element_id}"'
+    if classes:
+        attributes += f' class="{" ".join(classes)}"'
+    return f"<{tag}{attributes}>", f"</{tag}>"
+
+
+def story(market_slug, number):
+    """
+    This function returns the headline and link of a market's story number, which are always the same.
+    """
+    rng = random.Random(f"{market_slug}:{number}")
+    words = [rng.choice(WORDS) for _ in range(rng.randint(5, 12))]
+    article_id = 18000000 + number
+    return (
+        " ".join(words).capitalize(),
+        f"/{market_slug}/news/article/{'-'.join(words)}-{article_id}.php",
+    )
+
+
+def zone_html(market_slug, zone, config, hour, rng):
+    """
+    This function returns the markup of a zone of a synthetic homepage, at an hour.
+    Slots further down turn over more slowly, and optional zones aren't always there.
+    """
+    if config.get("optional") and rng.random() < 0.5:
+        return ""
+
+    tag, _, classes = _element(config["selector"])
+    container_tag = _element(config["container"])[0] if "container" in config else None
+    items = []
+    for position, _ in enumerate(slot_names(zone, config["slots"])):
+        number = (hour // (1 + position % 4)) * 100 + position
+        headline, href = story(market_slug, number)
+        if tag == "a":
+            item = f'<a class="{" ".join(classes)}" href="{href}">{headline}</a>'
+        else:
+            opening, closing = _open(config["selector"])
+            item = f'{opening}<a href="{href}">{headline}</a>{closing}'
+        if container_tag in ("ul", "ol") and tag != "li":
+            item = f"<li>{item}</li>"
+        if "collections" in config:
+            collection_id = 105800 + position
+            item = (
+                f'<div class="hide-rss-link hdnce-e '
+                f'hdnce-collection-{collection_id}-{config["collections"]}">{item}</div>'
+            )
+        items.append(item)
+
+    html = "".join(items)
+    if "container" in config:
+        opening, closing = _open(config["container"])
+        html = f"{opening}{html}{closing}"
+    if "collection" in config:
+        html = f'<div class="hdnce-collection-105799-{config["collection"]}">{html}</div>'
+    if "collection_container" in config:
+        opening, closing = _open(config["collection_container"])
+        html = f"{opening}{html}{closing}"
+    return html
+
+
+@lru_cache(maxsize=16)
+def filler(size):
+    """
+    This function returns the rest of a homepage (everything below the zones), about size bytes of it.
+    """
+    paragraph = '<div class="teaser"><p>' + " ".join(WORDS) + "</p></div>\n"
+    return paragraph * max(size // len(paragraph), 0)
+
+
+def homepage(market, hour, size):
+    """
+    This function returns a market's synthetic homepage at an hour, padded to about size bytes.
+    """
+    rng = random.Random(f"{market['slug']}:{hour}")
+    zones = "".join(
+        zone_html(market["slug"], zone, config, hour, rng)
+        for zone, config in market["zones"].items()
+    )
+    head = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f"<title>{market['paper']}</title></head>"
+        f"<body><header>{market['paper']}</header><main>"
+    )
+    return f"{head}{zones}{filler(size - len(head) - len(zones))}</main></body></html>"
+
+
+def synthetic_registry(count, base_url, source_path=None):
+    """
+    This function returns a market registry (like markets.json) with count synthetic markets,
+    taking turns on the real templates, served from base_url.
+    """
+    source = load_registry(source_path) if source_path else load_registry()
+    templates = list(source["templates"])
+    markets = []
+    for i in range(count):
+        name = f"Synthetic {i + 1}"
+        markets.append(
+            {
+                "name": name,
+                "paper": f"The Synthetic {i + 1} Times",
+                "url": f"{base_url}/{slugify(name)}",
+                "timezone": "US/Pacific",
+                "spreadsheet": "",
+                "template": templates[i % len(templates)],
+            }
+        )
+    return {
+        # The stand-in can take anything we throw at it, so it's the scraper we measure, not the limiter.
+        "rate_limits": {
+            "hosts": {
+                "127.0.0.1": {
+                    "requests_per_minute": 600000,
+                    "concurrency": 1000,
+                    "burst": 1000,
+                }
+            }
+        },
+        "common_zones": source.get("common_zones", {}),
+        "templates": source["templates"],
+        "markets": markets,
+    }
+
+
+def write_registry(registry, path):
+    with open(path, "w") as f:
+        json.dump(registry, f, indent=2)
+
+
+class SyntheticServer(ThreadingHTTPServer):
+    """
+    This class serves the synthetic markets' homepages at /<market slug>, with a latency
+    (give or take half of it) and a share of requests that fail with a 503.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, size=500_000, latency=0.0, error_rate=0.0):
+        super().__init__(("127.0.0.1", port), SyntheticHandler)
+        self.markets = {}
+        self.size = size
+        self.latency = latency
+        self.error_rate = error_rate
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def add_markets(self, markets):
+        """
+        This function takes the markets (as load_markets returns them) to serve.
+        """
+        self.markets.update((market["slug"], market) for market in markets.values())
+
+    def start(self):
+        """
+        This function serves in a background thread, for benchmarks.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class SyntheticHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency * random.uniform(0.5, 1.5))
+
+        market = server.markets.get(self.path.strip("/").split("/")[0])
+        if market is None:
+            self.send_error(404)
+            return
+        if random.random() < server.error_rate:
+            self.send_error(503)
+            return
+
+        body = homepage(market, int(time.time() // 3600), server.size).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # A load test would drown the terminal otherwise.
+        pass
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Where the JSON lines for every run are appended. Each line is one stage of one market.
+RUN_REPORT_PATH = os.environ.get(
+    "RUN_REPORT_PATH", os.path.join("store", "run_report.jsonl")
+)
+
+# The stages we show in the summary table, in the order they happen during a run.
+SUMMARY_STAGES = ["dns", "fetch", "parse", "extract", "sheets_read", "sheets_write"]
+
+
+class RunReport:
+    """
+    This class collects the timings and counters for a single run of the tracker.
+    """
+
+    def __init__(self):
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.records = []
+        self.counters = defaultdict(int)
+        # Anything that wants to hear about stages starting and ending (like the profiler).
+        self.listeners = []
+        # How many stages every market has going, so we know who's still running when the report is written.
+        self._open = defaultdict(int)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def start_market(self, market):
+        """
+        This function sets the market that the stages recorded on this thread belong to.
+        """
+        self._local.market = market
+
+    @property
+    def current_market(self):
+        return getattr(self._local, "market", None)
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        This function times a stage of the current market. Stages can be nested, and the time
+        spent in a nested stage is not counted twice: an "extract" stage that calls getSoup
+        only reports the time spent extracting, not the time spent fetching and parsing.
+
+        The caller gets a dictionary back that it can add extra fields to (bytes, rows...).
+        """
+        stack = self._stack()
+        frame = {"children": 0.0}
+        stack.append(frame)
+        market = self.current_market
+        with self._lock:
+            self._open[market] += 1
+        for listener in self.listeners:
+            listener.stage_started(name)
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1]["children"] += elapsed
+            with self._lock:
+                self._open[market] -= 1
+            for listener in self.listeners:
+                fields.update(listener.stage_finished(self.current_market, name))
+            self.record(name, seconds=round(elapsed - frame["children"], 6), **fields)
+
+    def record(self, stage, market=None, **fields):
+        """
+        This function stores a single record for a market (the current market by default).
+        """
+        record = OrderedDict(
+            [
+                ("run_id", self.run_id),
+                ("timestamp", datetime.now(timezone.utc).isoformat()),
+                ("market", market or self.current_market),
+                ("stage", stage),
+            ]
+        )
+        record.update(fields)
+        with self._lock:
+            if not self._closed:
+                self.records.append(record)
+
+    def count(self, name, amount=1):
+        """
+        This function increments a counter (retries, API calls...) for the current market.
+        """
+        with self._lock:
+            if not self._closed:
+                self.counters[(self.current_market, name)] += amount
+
+    def close(self):
+        """
+        This function stops taking records and counts, so the report can be written out while markets
+        that were cut off by the run deadline are still going in the background. What they do after
+        this is left out, which the report says in a "report_closed" record naming them.
+        """
+        with self._lock:
+            running = sorted(str(market) for market, stages in self._open.items() if stages)
+        if running:
+            self.record(
+                "report_closed",
+                market=None,
+                still_running=running,
+                note="Anything these markets did after the report was closed is left out.",
+            )
+        with self._lock:
+            self._closed = True
+
+    def _copy(self):
+        # Markets we stopped waiting for can still be recording, so we never iterate over the originals.
+        with self._lock:
+            return list(self.records), dict(self.counters)
+
+    def write_jsonl(self, path=RUN_REPORT_PATH):
+        """
+        This function appends the run's records and counters to a JSON lines file.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        records, counters = self._copy()
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            for (market, name), value in sorted(
+                counters.items(), key=lambda item: (str(item[0][0]), item[0][1])
+            ):
+                f.write(
+                    json.dumps(
+                        {
+                            "run_id": self.run_id,
+                            "market": market,
+                            "stage": "counter",
+                            "name": name,
+                            "value": value,
+                        }
+                    )
+                    + "\n"
+                )
+
+    def summary(self):
+        """
+        This function adds up the records into one row per market.
+        """
+        records, counters = self._copy()
+        rows = OrderedDict()
+        for record in records:
+            row = rows.setdefault(record["market"], defaultdict(float))
+            row[record["stage"]] += record.get("seconds", 0)
+            row["total"] += record.get("seconds", 0)
+            row["bytes"] += record.get("bytes", 0)
+        for (market, name), value in counters.items():
+            row = rows.setdefault(market, defaultdict(float))
+            row[name] += value
+        return rows
+
+    def summary_table(self):
+        """
+        This function formats the summary as a table we can print at the end of the run.
+        """
+        columns = SUMMARY_STAGES + ["total", "bytes", "retries"]
+        lines = [
+            f"{'Market':<22}" + "".join(f"{column:>14}" for column in columns)
+        ]
+        for market, row in self.summary().items():
+            cells = []
+            for column in columns:
+                if column in ("bytes", "retries"):
+                    cells.append(f"{int(row[column]):>14,}")
+                else:
+                    cells.append(f"{row[column]:>14.2f}")
+            lines.append(f"{str(market):<22}" + "".join(cells))
+        return "\n".join(lines)
+
+
+# The report for the current run. Everything in app.py records into this one.
+report = RunReport()
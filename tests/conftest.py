@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app's modules sit at the root of the repo, not in a package.
+sys.path.insert(0, ROOT)
+
+from registry import load_markets  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def markets():
+    return load_markets(os.path.join(ROOT, "markets.json"))
@@ -0,0 +1,156 @@
+import random
+import threading
+from collections import defaultdict
+from contextlib import closing
+
+import store
+from clusters import (
+    SCHEMA,
+    STOPWORDS,
+    buckets,
+    content_words,
+    signature,
+    story_cluster,
+    update_clusters,
+)
+
+MARKET = {"name": "Houston"}
+
+
+def zipf_headlines(count, seed=20231):
+    """
+    This function makes up headlines of 7 to 12 words, drawn like real ones: a few words
+    (the stopwords) are in most headlines, and most words are rare.
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted(STOPWORDS) + [f"word{i}" for i in range(5000)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    return [rng.choices(vocabulary, weights, k=rng.randint(7, 12)) for _ in range(count)]
+
+
+def test_unrelated_headlines_rarely_share_a_bucket():
+    index = defaultdict(list)
+    candidates = []
+    for i, words in enumerate(zipf_headlines(3000)):
+        found = set()
+        for key in buckets(signature(content_words(words))):
+            found.update(index[key])
+            index[key].append(i)
+        candidates.append(len(found))
+
+    # Signed with their stopwords, in 16 bands of 2, these drew about 130 each (and more every hour).
+    late = candidates[2000:]
+    assert sum(late) / len(late) < 0.001 * 3000
+
+
+def test_rewrites_share_a_bucket():
+    rng = random.Random(7)
+    found = 0
+    headlines = [list(dict.fromkeys(content_words(words))) for words in zipf_headlines(300)]
+    headlines = [words for words in headlines if len(words) >= 5]
+    for words in headlines:
+        # Rewrites that keep 60% of the words, or more.
+        kept = words[: -(len(words) // 4) or None]
+        rewrite = kept + [f"new{rng.randrange(10**6)}" for _ in range(len(words) - len(kept))]
+        assert len(set(kept)) / len(set(words) | set(rewrite)) >= 0.6
+        if set(buckets(signature(words))) & set(buckets(signature(rewrite))):
+            found += 1
+    assert found / len(headlines) >= 0.95
+
+
+def test_content_words():
+    assert content_words("the mayor says the city will vote".split()) == [
+        "mayor",
+        "city",
+        "vote",
+    ]
+    assert content_words("what it is".split()) == ["what", "it", "is"]
+
+
+def test_rewrites_and_close_headlines_share_a_cluster(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    url = "https://www.houstonchronicle.com/news/article/storm-1.php"
+    update_clusters(
+        MARKET,
+        {"Top 1": {"headline": "Storm knocks out power to 10,000 in Houston", "url": url}},
+        "2024-03-05T13:00:00+00:00",
+        path,
+    )
+    update_clusters(
+        MARKET,
+        {
+            # A rewrite on the same URL, and the same story under another URL.
+            "Top 1": {"headline": "Thousands still in the dark after storm", "url": url},
+            "Top 2": {
+                "headline": "Storm knocks out power to 12,000 in Houston",
+                "url": "https://www.houstonchronicle.com/news/article/storm-2.php",
+            },
+            "Top 3": {
+                "headline": "Astros beat Rangers in extra innings thriller",
+                "url": "https://www.houstonchronicle.com/sports/article/astros-3.php",
+            },
+        },
+        "2024-03-05T14:00:00+00:00",
+        path,
+    )
+    cluster = story_cluster(url, path)
+    assert {result["cluster"] for result in cluster} == {cluster[0]["cluster"]}
+    assert len({result["url"] for result in cluster}) == 2
+    assert len(cluster) == 3
+
+
+def test_concurrent_markets_dont_share_cluster_ids(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    rng = random.Random(42)
+    # Headlines that have no words in common, so every one is a cluster of its own.
+    words = [f"word{i}" for i in range(180 * 6)]
+    rng.shuffle(words)
+    headlines = [" ".join(words[i : i + 6]) for i in range(0, len(words), 6)]
+
+    def capture(thread):
+        for i in range(thread, len(headlines), 6):
+            update_clusters(
+                {"name": f"Market {thread}"},
+                {"Top 1": {"headline": headlines[i], "url": f"https://example.com/{i}"}},
+                "2024-03-05T13:00:00+00:00",
+                path,
+            )
+
+    threads = [threading.Thread(target=capture, args=(thread,)) for thread in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with closing(store.connect(SCHEMA, path)) as connection:
+        clusters = connection.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT cluster) FROM headline_clusters"
+        ).fetchone()
+    assert tuple(clusters) == (180, 180)
+
+
+def test_signatures_are_redone_when_their_layout_changes(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    url = "https://www.houstonchronicle.com/news/article/storm-1.php"
+    update_clusters(
+        MARKET,
+        {"Top 1": {"headline": "Storm knocks out power to 10,000 in Houston", "url": url}},
+        "2024-03-05T13:00:00+00:00",
+        path,
+    )
+    with closing(store.connect(SCHEMA, path)) as connection, connection:
+        connection.execute("UPDATE headline_clusters SET signature = x'00'")
+        connection.execute("UPDATE headline_signature_layout SET band_size = 2")
+
+    update_clusters(
+        MARKET,
+        {
+            "Top 2": {
+                "headline": "Storm knocks out power to 12,000 in Houston",
+                "url": "https://www.houstonchronicle.com/news/article/storm-2.php",
+            }
+        },
+        "2024-03-05T14:00:00+00:00",
+        path,
+    )
+    assert len({result["url"] for result in story_cluster(url, path)}) == 2
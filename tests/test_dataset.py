@@ -0,0 +1,57 @@
+from archive import load_logs, snapshot_table, write_compacted
+from dataset import append_capture, captures
+from snapshot import Snapshot
+
+MARKET = {"name": "San Antonio", "slug": "san-antonio"}
+
+
+def snapshot(captured_at, date, time, headline):
+    snapshot = Snapshot(MARKET["name"], date, time, captured_at)
+    snapshot.add_zone(
+        ["CP", "Tab 2"],
+        [headline, None],
+        ["https://www.expressnews.com/news/article/a-1.php", None],
+        [105803, 0],
+    )
+    return snapshot
+
+
+def test_captures_come_back_as_they_were_written(tmp_path):
+    written = [
+        snapshot("2024-03-01T05:00:00+00:00", "2024-02-29", "11:00 PM", "Late one"),
+        snapshot("2024-03-01T06:00:00+00:00", "2024-03-01", "12:00 AM", "Early one"),
+        snapshot("2024-03-01T07:00:00+00:00", "2024-03-01", "1:00 AM", "Another"),
+    ]
+    for capture in written:
+        append_capture(MARKET, capture, str(tmp_path))
+
+    read = list(captures(MARKET, str(tmp_path)))
+    assert [capture.captured_at for capture in read] == [
+        capture.captured_at for capture in written
+    ]
+    for a, b in zip(read, written):
+        assert (a.date, a.time, a.slots, a.headlines, a.urls, list(a.collections)) == (
+            b.date,
+            b.time,
+            b.slots,
+            b.headlines,
+            b.urls,
+            list(b.collections),
+        )
+
+
+def test_a_rebuilt_month_loads_like_a_compacted_one(tmp_path):
+    tables = [
+        snapshot_table(
+            snapshot(
+                f"2024-03-0{day}T12:00:00+00:00", f"2024-03-0{day}", "7:00 AM", f"Day {day}"
+            )
+        )
+        for day in range(1, 4)
+    ]
+    directory = write_compacted(MARKET["slug"], tables, str(tmp_path))
+    assert directory.endswith("month=03")
+
+    logs = load_logs("san-antonio", str(tmp_path))
+    assert len(logs) == 6
+    assert list(logs["headline"].dropna()) == ["Day 1", "Day 2", "Day 3"]
@@ -0,0 +1,71 @@
+import feeds
+from feeds import collect_feeds, load_state, save_discovered_feeds
+from ratelimit import RateLimiter
+from telemetry import RunReport
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0"><channel><title>News</title>
+<item><title>A story</title><link>https://www.ctpost.com/news/article/a-story-1.php</link>
+<guid>a-story-1</guid><pubDate>Tue, 05 Mar 2024 13:00:00 GMT</pubDate></item>
+</channel></rss>"""
+
+
+class Response:
+    status_code = 200
+    content = RSS
+    headers = {"ETag": '"1"'}
+
+    def raise_for_status(self):
+        pass
+
+
+def collect(monkeypatch, tmp_path, market, requests):
+    def get(url, headers=None, timeout=None):
+        requests.append((url, headers))
+        return Response()
+
+    monkeypatch.setattr(feeds.requests, "get", get)
+    collect_feeds(
+        {market["name"]: market},
+        RateLimiter(),
+        RunReport(),
+        headers={"x-px-access-token": "secret"},
+        state_path=str(tmp_path / "feeds.json"),
+        data_dir=str(tmp_path / "data"),
+        discovered_path=str(tmp_path / "feeds_discovered.json"),
+    )
+
+
+def test_the_token_only_goes_to_feeds_on_our_sites(monkeypatch, tmp_path, markets):
+    market = dict(markets["Connecticut Post"], feeds=["https://www.ctpost.com/rss/feed/news"])
+    (tmp_path / "feeds_discovered.json").write_text(
+        '{"connecticut-post": ["https://feeds.feedburner.com/ctpost"]}'
+    )
+    requests = []
+    collect(monkeypatch, tmp_path, market, requests)
+    assert dict(requests) == {
+        "https://www.ctpost.com/rss/feed/news": {"x-px-access-token": "secret"},
+        "https://feeds.feedburner.com/ctpost": {},
+    }
+
+
+def test_discovering_feeds_leaves_the_collector_state_alone(monkeypatch, tmp_path, markets):
+    market = dict(markets["Connecticut Post"], feeds=["https://www.ctpost.com/rss/feed/news"])
+    collect(monkeypatch, tmp_path, market, [])
+    state = load_state(str(tmp_path / "feeds.json"))
+    assert state["connecticut-post"]["seen"] == ["a-story-1"]
+
+    # A homepage scrape that finishes while the collector runs doesn't touch its file.
+    report = RunReport()
+    report.record(
+        "feeds_discovered",
+        market="Connecticut Post",
+        feeds=["https://www.ctpost.com/rss/feed/local"],
+    )
+    save_discovered_feeds(
+        report, {"Connecticut Post": market}, str(tmp_path / "feeds_discovered.json")
+    )
+    assert load_state(str(tmp_path / "feeds.json")) == state
+    assert load_state(str(tmp_path / "feeds_discovered.json")) == {
+        "connecticut-post": ["https://www.ctpost.com/rss/feed/local"]
+    }
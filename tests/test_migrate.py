@@ -0,0 +1,183 @@
+import json
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytz
+from gspread.utils import a1_to_rowcol
+
+import store
+from migrate import SCHEMA, migrate_worksheet, migrated_snapshots
+
+MARKET = {"name": "Albany", "timezone": "US/Eastern"}
+HEADER = ["Date", "Time", "CP", "Top 1"]
+
+
+def capture_rows(start, hours, prefix="Headline"):
+    """
+    This function returns the rows an hourly run would have logged from start (in UTC) on,
+    newest first, like the sheets have them.
+    """
+    tz = pytz.timezone(MARKET["timezone"])
+    rows = []
+    for hour in range(hours):
+        local = (start + timedelta(hours=hour)).astimezone(tz)
+        rows.append(
+            [
+                f"{local:%Y-%m-%d}",
+                local.strftime("%I:%M %p").lstrip("0"),
+                f"{prefix} {hour}",
+                f"{prefix} {hour} too",
+            ]
+        )
+    return rows[::-1]
+
+
+class FakeWorksheet:
+    """
+    This class stands in for a gspread worksheet: a grid with a header, the logs (newest first)
+    and some empty rows at the bottom, like new sheets have.
+    """
+
+    def __init__(self, rows, title="Headline log", blank=0):
+        self.title = title
+        self.grid = [list(HEADER)] + [list(row) for row in rows] + [[]] * blank
+        self.reads = 0
+        # Something to run before every read, like a capture landing at the top of the sheet.
+        self.before_read = None
+
+    @property
+    def row_count(self):
+        return len(self.grid)
+
+    def row_values(self, row):
+        return list(self.grid[row - 1])
+
+    def get_values(self, a1):
+        if self.before_read:
+            self.before_read(self)
+        self.reads += 1
+        start, end = a1.split(":")
+        top, bottom = a1_to_rowcol(start)[0], a1_to_rowcol(end)[0]
+        values = [list(row) for row in self.grid[top - 1 : bottom]]
+        # Like the API, the empty rows at the end of a range are left off.
+        while values and not any(values[-1]):
+            values.pop()
+        return values
+
+    def insert_top(self, row):
+        self.grid.insert(1, list(row))
+
+
+def call(func):
+    return func()
+
+
+def stored(path, sheet="Headline log"):
+    with closing(store.connect(SCHEMA, path)) as connection:
+        return [
+            dict(row)
+            for row in connection.execute(
+                "SELECT * FROM sheet_rows WHERE sheet = ? ORDER BY captured_at", (sheet,)
+            )
+        ]
+
+
+START = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def headlines(rows):
+    return sorted(row[2] for row in rows)
+
+
+def stored_headlines(path):
+    return sorted(json.loads(row["cells"])["CP"] for row in stored(path))
+
+
+@pytest.mark.parametrize("page_rows", [1, 7, 50, 1000])
+def test_every_row_is_stored_once(tmp_path, page_rows):
+    path = str(tmp_path / "store.sqlite")
+    rows = capture_rows(START, 100)
+    worksheet = FakeWorksheet(rows, blank=30)
+    assert migrate_worksheet(MARKET, worksheet, call, path, page_rows) == 100
+    assert stored_headlines(path) == headlines(rows)
+    assert [row["captured_at"] for row in stored(path)] == [
+        (START + timedelta(hours=hour)).isoformat() for hour in range(100)
+    ]
+
+
+def test_rows_inserted_at_the_top_while_we_read(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    rows = capture_rows(START, 100)
+    new = iter(capture_rows(START + timedelta(hours=100), 20, prefix="New")[::-1])
+    worksheet = FakeWorksheet(rows, blank=5)
+    worksheet.before_read = lambda sheet: sheet.insert_top(next(new))
+
+    migrate_worksheet(MARKET, worksheet, call, path, page_rows=10)
+    # Every row that was there when we started is in, once. Some of the new ones may be too.
+    found = stored_headlines(path)
+    assert [headline for headline in found if not headline.startswith("New")] == headlines(rows)
+    assert len(found) == len(set(found))
+
+
+def test_resuming_after_an_interruption(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    rows = capture_rows(START, 100)
+    worksheet = FakeWorksheet(rows, blank=10)
+
+    def flaky(func):
+        if worksheet.reads == 4:
+            raise RuntimeError("Quota exceeded")
+        return func()
+
+    with pytest.raises(RuntimeError):
+        migrate_worksheet(MARKET, worksheet, flaky, path, page_rows=10)
+    assert 0 < len(stored(path)) < 100
+
+    # A few captures come in before we run it again.
+    for row in capture_rows(START + timedelta(hours=100), 3, prefix="New")[::-1]:
+        worksheet.insert_top(row)
+    reads = worksheet.reads
+    migrate_worksheet(MARKET, worksheet, call, path, page_rows=10)
+
+    found = stored_headlines(path)
+    assert [headline for headline in found if not headline.startswith("New")] == headlines(rows)
+    assert len(found) == 103
+    # It picked up from its checkpoint, rather than reading the whole sheet again.
+    assert worksheet.reads - reads < 12
+
+
+@pytest.mark.parametrize("page_rows", [1, 2, 3, 5, 1000])
+def test_the_hour_that_comes_up_twice_when_the_clocks_fall_back(tmp_path, page_rows):
+    path = str(tmp_path / "store.sqlite")
+    # 10 PM on Saturday to 5 AM on Sunday, with 1 AM twice.
+    start = datetime(2023, 11, 5, 2, tzinfo=timezone.utc)
+    rows = capture_rows(start, 8)
+    assert [row[1] for row in rows].count("1:00 AM") == 2
+
+    migrate_worksheet(MARKET, FakeWorksheet(rows), call, path, page_rows)
+    assert [row["captured_at"] for row in stored(path)] == [
+        (start + timedelta(hours=hour)).isoformat() for hour in range(8)
+    ]
+    assert [row["fold"] for row in stored(path)] == [0, 0, 0, 0, 1, 0, 0, 0]
+
+
+def test_migrated_snapshots_join_the_logs_on_the_right_hour(tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    start = datetime(2023, 11, 5, 2, tzinfo=timezone.utc)
+    market = dict(MARKET, slug="albany")
+    migrate_worksheet(market, FakeWorksheet(capture_rows(start, 8)), call, path, 3)
+    migrate_worksheet(
+        market,
+        FakeWorksheet(capture_rows(start, 8, prefix="https://www.timesunion.com/"), "URL log"),
+        call,
+        path,
+        3,
+    )
+
+    snapshots = list(migrated_snapshots(market, path))
+    assert len(snapshots) == 8
+    for hour, snapshot in enumerate(snapshots):
+        assert snapshot.captured_at == (start + timedelta(hours=hour)).isoformat()
+        assert snapshot.headlines[0] == f"Headline {hour}"
+        assert snapshot.urls[0] == f"https://www.timesunion.com/ {hour}"
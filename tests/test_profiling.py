@@ -0,0 +1,56 @@
+import tracemalloc
+
+import pytest
+
+from profiling import STAGE_PEAKS, Profiler
+from telemetry import RunReport
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    profiler = Profiler(trace_malloc_dir=str(tmp_path))
+    report = RunReport()
+    report.listeners.append(profiler)
+    report.start_market("Houston")
+    profiler.start()
+    try:
+        yield profiler, report
+    finally:
+        profiler.finish()
+
+
+def peaks(report):
+    return {record["stage"]: record.get("peak_bytes") for record in report.records}
+
+
+@pytest.mark.skipif(not STAGE_PEAKS, reason="Stage peaks need Python 3.9 or later")
+def test_an_outer_stage_reports_its_own_peak(profiled):
+    profiler, report = profiled
+    baseline = tracemalloc.get_traced_memory()[0]
+    with report.stage("extract"):
+        with report.stage("fetch"):
+            page = bytearray(8 * MB)
+            del page
+        with report.stage("parse"):
+            soup = bytearray(2 * MB)
+            del soup
+        rows = bytearray(1 * MB)
+        del rows
+
+    found = peaks(report)
+    # The outer stage's peak includes what its children used, not just what came after the last one.
+    assert found["extract"] - baseline >= 8 * MB
+    assert found["fetch"] - baseline >= 8 * MB
+    assert 2 * MB <= found["parse"] - baseline < 8 * MB
+
+
+@pytest.mark.skipif(STAGE_PEAKS, reason="Stage peaks are there from Python 3.9 on")
+def test_no_stage_peaks_before_python_39(profiled, tmp_path):
+    profiler, report = profiled
+    with report.stage("fetch"):
+        bytearray(MB)
+    assert peaks(report) == {"fetch": None}
+    profiler.finish()
+    assert "need Python 3.9" in (tmp_path / "tracemalloc.txt").read_text()
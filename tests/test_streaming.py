@@ -0,0 +1,115 @@
+from streaming import ZoneWatcher, simple_selector
+from synthetic import homepage
+
+ZONES = {
+    "top": {
+        "selector": "a.top--headline",
+        "container": "ul.top--list",
+        "slots": 2,
+        "collection": "top_stories",
+    },
+    "four_pack": {"selector": "a.pack--headline", "slots": 2},
+    "breaking": {"selector": "a.breaking--headline", "slots": 1, "optional": True},
+}
+
+TOP = (
+    '<div class="hdnce-collection-105799-top_stories">'
+    '<ul class="top--list">'
+    '<li><a class="top--headline" href="/a.php">A</a></li>'
+    '<li><a class="top--headline" href="/b.php">B</a></li>'
+    "</ul></div>"
+)
+PACK = (
+    '<a class="pack--headline" href="/c.php">C</a>'
+    '<a class="pack--headline" href="/d.php">D</a>'
+)
+REST = '<div class="teaser"><p>The rest of the page</p></div></main></body></html>'
+
+
+def watch(zones, *chunks):
+    """
+    This function feeds a page to a watcher a chunk at a time, and returns the watcher and
+    whether it was done after each chunk.
+    """
+    watcher = ZoneWatcher(zones)
+    return watcher, [watcher.feed_chunk(chunk.encode()) for chunk in chunks]
+
+
+def test_simple_selector():
+    assert simple_selector("ul.coreHeadlineList--items") == (
+        "ul",
+        {"coreHeadlineList--items"},
+    )
+    assert simple_selector(".a.b") == (None, {"a", "b"})
+    assert simple_selector("div#zoneAL") is None
+    assert simple_selector("div > a") is None
+
+
+def test_done_once_the_required_zones_are_in():
+    _, done = watch(ZONES, "<html><body><main>", TOP, PACK, REST)
+    assert done == [False, False, True, True]
+
+
+def test_not_done_before_the_last_slot_closes():
+    _, done = watch(ZONES, TOP + '<a class="pack--headline" href="/c.php">C</a>', REST)
+    assert done == [False, False]
+
+
+def test_not_done_while_the_container_is_open():
+    _, done = watch(ZONES, PACK + TOP[:-11], "</ul></div>", REST)
+    assert done == [False, True, True]
+
+
+def test_not_done_without_the_collection():
+    page = TOP.replace("hdnce-collection-105799-top_stories", "somethingElse")
+    _, done = watch(ZONES, page, PACK, REST)
+    assert done == [False, False, False]
+
+
+def test_unclosed_items_are_closed_by_their_parent():
+    # Browsers (and BeautifulSoup) close an open <li> when its list ends, and so do we.
+    page = TOP.replace("</a></li>", "</a>")
+    _, done = watch(ZONES, page, PACK)
+    assert done == [False, True]
+
+
+def test_optional_zones_dont_hold_us_up():
+    _, done = watch(ZONES, TOP, PACK)
+    assert done == [False, True]
+
+
+def test_an_untrackable_zone_means_reading_the_whole_page():
+    zones = dict(ZONES, breaking=dict(ZONES["breaking"], selector="div#zoneAL > a"))
+    _, done = watch(zones, TOP, PACK, REST)
+    assert done == [False, False, False]
+
+    zones = dict(ZONES, four_pack=dict(ZONES["four_pack"], selector="div#zoneAL > a"))
+    _, done = watch(zones, TOP, PACK, REST)
+    assert done == [False, False, False]
+
+
+def test_text_keeps_every_byte_read():
+    page = f"<main>{TOP}<p>Café — naïve</p>{PACK}{REST}".encode()
+    # Chunks that split multibyte characters in two.
+    cut = page.index("é".encode()) + 1
+    watcher = ZoneWatcher(ZONES)
+    for chunk in [page[:cut], page[cut : cut + 9], page[cut + 9 :]]:
+        watcher.feed_chunk(chunk)
+    assert watcher.text() == page.decode()
+
+
+def test_stops_early_on_a_real_template(markets):
+    market = dict(markets["Houston"], slug="houston")
+    zones = {
+        zone: config for zone, config in market["zones"].items() if not config.get("optional")
+    }
+    page = homepage(dict(market, zones=zones), hour=0, size=200_000).encode()
+
+    watcher = ZoneWatcher(market["zones"])
+    read = 0
+    for start in range(0, len(page), 4096):
+        read += 4096
+        if watcher.feed_chunk(page[start : start + 4096]):
+            break
+    assert watcher.done
+    assert read < len(page) // 2
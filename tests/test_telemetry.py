@@ -0,0 +1,51 @@
+import threading
+
+from telemetry import RunReport
+
+
+def test_writing_while_markets_are_still_recording(tmp_path):
+    report = RunReport()
+    stop = threading.Event()
+    started = threading.Event()
+
+    def straggler():
+        report.start_market("Houston")
+        with report.stage("fetch"):
+            started.set()
+            i = 0
+            while not stop.is_set() and i < 50_000:
+                # A new counter every time, which is what used to break the iteration.
+                report.count(f"retries_{i}")
+                if i % 100 == 0:
+                    report.record("chunk", bytes=i)
+                i += 1
+            stop.wait()
+
+    thread = threading.Thread(target=straggler)
+    thread.start()
+    started.wait()
+    try:
+        for _ in range(5):
+            report.write_jsonl(str(tmp_path / "run_report.jsonl"))
+            report.summary()
+        report.close()
+        records = len(report.records)
+        counters = len(report.counters)
+    finally:
+        stop.set()
+        thread.join()
+
+    # Nothing the straggler did after the report was closed made it in.
+    assert len(report.records) == records
+    assert len(report.counters) == counters
+    closed = [record for record in report.records if record["stage"] == "report_closed"]
+    assert closed[0]["still_running"] == ["Houston"]
+
+
+def test_a_finished_run_closes_quietly():
+    report = RunReport()
+    report.start_market("Houston")
+    with report.stage("fetch"):
+        pass
+    report.close()
+    assert [record["stage"] for record in report.records] == ["fetch"]
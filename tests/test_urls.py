@@ -0,0 +1,129 @@
+import pytest
+
+from urls import canonical_id, canonicalize, canonicalize_all, headers_for, trusted
+
+ARTICLE = "/news/article/some-story-18412345.php"
+
+
+def test_relative_links_are_made_absolute(markets):
+    assert (
+        canonicalize(markets["Connecticut Post"], ARTICLE)
+        == f"https://www.ctpost.com{ARTICLE}"
+    )
+
+
+def test_absolute_links_to_the_same_site_are_kept(markets):
+    # We used to glue the homepage's address onto every link, which doubled it on absolute ones.
+    assert (
+        canonicalize(markets["Connecticut Post"], f"https://www.ctpost.com{ARTICLE}")
+        == f"https://www.ctpost.com{ARTICLE}"
+    )
+
+
+def test_doubled_prefix_is_collapsed(markets):
+    assert (
+        canonicalize(
+            markets["Connecticut Post"],
+            f"https://www.ctpost.comhttps://www.ctpost.com{ARTICLE}",
+        )
+        == f"https://www.ctpost.com{ARTICLE}"
+    )
+
+
+def test_absolute_links_to_other_hosts_are_kept(markets):
+    # The CT markets link to each other's stories.
+    assert (
+        canonicalize(markets["Connecticut Post"], f"https://www.ctinsider.com{ARTICLE}")
+        == f"https://www.ctinsider.com{ARTICLE}"
+    )
+    assert (
+        canonicalize(markets["Houston"], "https://www.nytimes.com/2024/03/05/us/story.html")
+        == "https://www.nytimes.com/2024/03/05/us/story.html"
+    )
+
+
+@pytest.mark.parametrize(
+    "ipid", ["Times-Union-HP-spotlight", "Times-Union-HP-latest-news", "Times-Union-HP-*"]
+)
+def test_albany_ipid_is_stripped(markets, ipid):
+    assert (
+        canonicalize(markets["Albany"], f"{ARTICLE}?IPID={ipid}")
+        == f"https://www.timesunion.com{ARTICLE}"
+    )
+
+
+@pytest.mark.parametrize("src", ["ctipdensecp", "rdctppromostrip"])
+@pytest.mark.parametrize("market", ["Connecticut Post", "Connecticut Insider"])
+def test_ct_src_is_stripped(markets, market, src):
+    url = canonicalize(markets[market], f"{ARTICLE}?src={src}")
+    assert url == f"{markets[market]['url']}{ARTICLE}"
+
+
+def test_tracking_params_are_per_market(markets):
+    # Only Albany tracks clicks with IPID, so it means something anywhere else.
+    assert (
+        canonicalize(markets["Houston"], f"{ARTICLE}?IPID=Times-Union-HP-spotlight")
+        == f"https://www.houstonchronicle.com{ARTICLE}?IPID=Times-Union-HP-spotlight"
+    )
+
+
+def test_utm_params_and_fragments_are_dropped_everywhere(markets):
+    assert (
+        canonicalize(
+            markets["San Francisco"], f"{ARTICLE}?utm_source=hp&utm_medium=web#comments"
+        )
+        == f"https://www.sfchronicle.com{ARTICLE}"
+    )
+
+
+def test_other_query_params_are_kept_as_they_were(markets):
+    assert (
+        canonicalize(markets["Albany"], "/search/?action=search&q=a%20b&IPID=x")
+        == "https://www.timesunion.com/search/?action=search&q=a+b"
+    )
+    assert (
+        canonicalize(markets["Albany"], "/search/?action=search&q=a%20b")
+        == "https://www.timesunion.com/search/?action=search&q=a%20b"
+    )
+
+
+def test_scheme_and_host_are_lowercased(markets):
+    assert (
+        canonicalize(markets["Houston"], f"HTTPS://WWW.HoustonChronicle.com{ARTICLE}")
+        == f"https://www.houstonchronicle.com{ARTICLE}"
+    )
+
+
+def test_missing_links(markets):
+    assert canonicalize(markets["Houston"], None) is None
+    assert canonicalize_all(markets["Houston"], [ARTICLE, None]) == [
+        f"https://www.houstonchronicle.com{ARTICLE}",
+        None,
+    ]
+    assert canonical_id(None) is None
+
+
+def test_canonical_id_is_stable(markets):
+    albany = markets["Albany"]
+    url = canonicalize(albany, f"{ARTICLE}?IPID=Times-Union-HP-spotlight")
+    assert canonical_id(url) == canonical_id(canonicalize(albany, f"{ARTICLE}#top"))
+    assert len(canonical_id(url)) == 16
+
+
+def test_the_token_only_goes_to_hearst_sites(markets):
+    token = {"x-px-access-token": "secret"}
+    ctpost = markets["Connecticut Post"]
+    assert headers_for(ctpost, f"https://www.ctpost.com{ARTICLE}", token) == token
+    # The CT markets link to each other's stories.
+    assert headers_for(ctpost, f"https://www.ctinsider.com{ARTICLE}", token) == token
+    assert headers_for(ctpost, "https://www.nytimes.com/2024/03/05/us/story.html", token) == {}
+    # A host that only ends like one of ours isn't ours.
+    assert headers_for(ctpost, f"https://www.notctpost.com{ARTICLE}", token) == {}
+    assert headers_for(ctpost, f"https://ctpost.com.example.net{ARTICLE}", token) == {}
+    assert headers_for(ctpost, None, token) == {}
+
+
+def test_the_market_itself_is_always_trusted():
+    synthetic = {"url": "http://127.0.0.1:8000/synthetic-1"}
+    assert trusted(synthetic, "http://127.0.0.1:8000/synthetic-1/news/article/a.php")
+    assert not trusted(synthetic, "http://127.0.0.2/news/article/a.php")
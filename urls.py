@@ -0,0 +1,105 @@
+import hashlib
+import os
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# The same few hundred links come up every hour, so we remember this many of them.
+URL_CACHE_SIZE = int(os.environ.get("URL_CACHE_SIZE", 4096))
+
+# Query parameters that only track where a click came from, on every market.
+# Markets add their own in markets.json, under "tracking_params".
+TRACKING_PARAMS = ("utm_*",)
+
+
+def _is_tracking(key, tracking_params):
+    return any(
+        key.startswith(param[:-1]) if param.endswith("*") else key == param
+        for param in tracking_params
+    )
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def _canonicalize(base, href, tracking_params, strip_strings):
+    href = href.strip()
+    # Some links come with the homepage's address twice, which urljoin can't make sense of.
+    while href.startswith(base * 2):
+        href = href[len(base) :]
+    # Links can be relative or absolute (even to another market), which urljoin sorts out.
+    url = urljoin(base, href)
+    for tracking_string in strip_strings:
+        url = url.replace(tracking_string, "")
+
+    parts = urlsplit(url)
+    query = parts.query
+    pairs = parse_qsl(query, keep_blank_values=True)
+    kept = [(key, value) for key, value in pairs if not _is_tracking(key, tracking_params)]
+    # We only re-encode the query if we took something out of it, so the rest of it stays as it was.
+    if len(kept) != len(pairs):
+        query = urlencode(kept)
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), parts.path, query, "")
+    )
+
+
+def canonicalize(market, href):
+    """
+    This function turns a link on a market's pages into the URL we log: absolute, without its
+    fragment or tracking parameters.
+    Example input: /news/article/some-story-18412345.php?IPID=Times-Union-HP-spotlight#comments
+    Example output: https://www.timesunion.com/news/article/some-story-18412345.php
+    """
+    if not href:
+        return None
+    return _canonicalize(
+        market["url"],
+        href,
+        TRACKING_PARAMS + tuple(market.get("tracking_params", [])),
+        tuple(market.get("strip_from_urls", [])),
+    )
+
+
+def canonicalize_all(market, hrefs):
+    """
+    This function canonicalizes a batch of links, like a zone's, keeping their order.
+    """
+    return [canonicalize(market, href) for href in hrefs]
+
+
+def _domain(url):
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def trusted(market, url):
+    """
+    This function tells us whether a URL is on the market's own site (or another Hearst site in
+    markets.json's "token_domains"), which are the only hosts our access token should ever go to.
+    Example input: San Antonio, https://www.nytimes.com/2024/03/05/us/story.html
+    Example output: False
+    """
+    host = urlsplit(url or "").hostname
+    if not host:
+        return False
+    return any(
+        host == domain or host.endswith(f".{domain}")
+        for domain in [_domain(market["url"])] + list(market.get("token_domains", []))
+    )
+
+
+def headers_for(market, url, headers):
+    """
+    This function returns the headers to fetch a URL with: all of them on our own sites, none elsewhere.
+    """
+    return dict(headers or {}) if trusted(market, url) else {}
+
+
+def canonical_id(url):
+    """
+    This function returns a short ID for a canonical URL that stays the same from run to run,
+    for indexes to key on.
+    Example input: https://www.ctpost.com/news/article/some-story-18412345.php
+    Example output: 5d1c0b1f3e9a7c42
+    """
+    if not url:
+        return None
+    return hashlib.sha1(url.encode()).hexdigest()[:16]